@@ -0,0 +1,100 @@
+"""
+Benchmark document detection in correct_perspective: full resolution vs downscaled.
+
+For every image the script times find_document_corners + warpPerspective on the
+full-resolution path (detect_max_dim=None) and on the downscaled path, and reports
+how far the detected corners of the two paths are apart.
+
+Usage:
+    python -m benchmarks.bench_perspective data/Set_A data/Set_B --upscale 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from omr_core.preprocessing import DETECT_MAX_DIM, correct_perspective, find_document_corners, order_points
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _iter_images(paths, upscale):
+    for path in paths:
+        files = [path] if os.path.isfile(path) else [
+            os.path.join(path, f) for f in sorted(os.listdir(path))
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        ]
+        for img_path in files:
+            img = cv2.imread(img_path)
+            if img is None:
+                continue
+            if upscale != 1:
+                # Simulate high-resolution phone photos from the sample scans
+                img = cv2.resize(img, None, fx=upscale, fy=upscale, interpolation=cv2.INTER_CUBIC)
+            yield img_path, img
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Image files or folders")
+    parser.add_argument("--max-dim", type=int, default=DETECT_MAX_DIM, help="Detection size for the downscaled path")
+    parser.add_argument("--upscale", type=float, default=1.0, help="Resize inputs by this factor first")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image (median is reported)")
+    args = parser.parse_args(argv)
+
+    full_times, fast_times, errors = [], [], []
+    both_missing = only_one = 0
+
+    print(f"{'image':40s} {'MP':>5s} {'full ms':>8s} {'fast ms':>8s} {'corner err px':>14s}")
+    for img_path, img in _iter_images(args.paths, args.upscale):
+        full_ms = _time(lambda: correct_perspective(img, detect_max_dim=None), args.repeat) * 1000
+        fast_ms = _time(lambda: correct_perspective(img, detect_max_dim=args.max_dim), args.repeat) * 1000
+        full_times.append(full_ms)
+        fast_times.append(fast_ms)
+
+        full_pts = find_document_corners(img, None)
+        fast_pts = find_document_corners(img, args.max_dim)
+        if full_pts is None and fast_pts is None:
+            both_missing += 1
+            err = "-"
+        elif full_pts is None or fast_pts is None:
+            only_one += 1
+            err = "mismatch"
+        else:
+            dist = np.linalg.norm(order_points(full_pts) - order_points(fast_pts), axis=1).max()
+            errors.append(dist)
+            err = f"{dist:.1f}"
+
+        mp = img.shape[0] * img.shape[1] / 1e6
+        print(f"{os.path.basename(img_path)[:40]:40s} {mp:5.1f} {full_ms:8.1f} {fast_ms:8.1f} {err:>14s}")
+
+    if not full_times:
+        print("No images found.")
+        return 1
+
+    print()
+    print(f"Images: {len(full_times)}  (no document found by either path: {both_missing}, "
+          f"found by only one path: {only_one})")
+    print(f"Median latency  full: {statistics.median(full_times):.1f} ms  "
+          f"downscaled: {statistics.median(fast_times):.1f} ms  "
+          f"speed-up: {statistics.median(full_times) / statistics.median(fast_times):.1f}x")
+    if errors:
+        print(f"Corner error    median: {statistics.median(errors):.1f} px  max: {max(errors):.1f} px")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
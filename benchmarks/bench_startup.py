@@ -0,0 +1,147 @@
+"""
+Cold-start benchmark for the web process and the CLI pipeline.
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+``sys.modules``. The script reports:
+
+* time-to-first-request of ``frontend.app``: interpreter start, ``import frontend``
+  and a first ``GET /`` through the Flask test client;
+* ``python -X importtime`` profiles of ``frontend`` and ``omr_core.pipeline``, with
+  the slowest imports and any heavy libraries (pandas, matplotlib, ...) loaded
+  without being used.
+
+The run fails when the median time-to-first-request exceeds ``--target-ms`` or a
+heavy library is imported at startup.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --target-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Libraries that must only be imported when a report, a PDF key, an Excel key or a
+# sheet is actually processed
+HEAVY_MODULES = ('pandas', 'matplotlib', 'seaborn', 'pdfplumber', 'openpyxl', 'xlrd', 'cv2', 'pypdfium2')
+
+# Heavy modules allowed per entry point at import time (none: even the pipeline only
+# loads OpenCV once it evaluates a sheet)
+ALLOWED = {
+    'frontend': (),
+    'omr_core.pipeline': (),
+}
+
+_FIRST_REQUEST = """
+import json, sys, time
+start = time.perf_counter()
+import frontend
+client = frontend.app.test_client()
+status = client.get('/').status_code
+elapsed = time.perf_counter() - start
+print(json.dumps({'in_process': elapsed, 'status': status,
+                  'loaded': [m for m in %r if m in sys.modules]}))
+"""
+
+
+def _env(jobs_dir):
+    # Keep the benchmark's job database away from real jobs
+    return {**os.environ, 'OMR_JOBS_DIR': jobs_dir, 'PYTHONDONTWRITEBYTECODE': '1'}
+
+
+def time_to_first_request(runs, jobs_dir):
+    """Median wall time from interpreter launch to the first served request, in seconds."""
+    totals, in_process, loaded = [], [], set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _FIRST_REQUEST % (HEAVY_MODULES,)], cwd=ROOT,
+                             env=_env(jobs_dir), capture_output=True, text=True, check=True)
+        totals.append(time.perf_counter() - start)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if result['status'] != 200:
+            raise RuntimeError(f"GET / returned {result['status']}")
+        in_process.append(result['in_process'])
+        loaded.update(result['loaded'])
+    return {
+        'total_ms': statistics.median(totals) * 1000,
+        'import_and_request_ms': statistics.median(in_process) * 1000,
+        'heavy_loaded': sorted(loaded),
+    }
+
+
+def import_profile(module, jobs_dir, top=8):
+    """
+    Parse ``python -X importtime -c "import <module>"``.
+
+    Returns:
+        dict: total import time of the module (ms), the ``top`` slowest imports by
+        self time and the heavy libraries it pulls in.
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                         env=_env(jobs_dir), capture_output=True, text=True, check=True)
+    entries = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), int(cumulative_us), name.rstrip()))
+
+    total = next((cum for _, cum, name in entries if name.strip() == module), 0)
+    names = {name.strip() for _, _, name in entries}
+    slowest = sorted(entries, reverse=True)[:top]
+    return {
+        'total_ms': total / 1000,
+        'slowest': [{'module': name.strip(), 'self_ms': s / 1000} for s, _, name in slowest],
+        'heavy_loaded': sorted(m for m in HEAVY_MODULES if m in names),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--target-ms", type=float, default=800.0,
+                        help="Maximum median time-to-first-request of frontend.app")
+    parser.add_argument("--output", help="Write the results JSON here")
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="omr_startup_") as jobs_dir:
+        first = time_to_first_request(args.runs, jobs_dir)
+        profiles = {module: import_profile(module, jobs_dir) for module in ALLOWED}
+
+    print(f"frontend time-to-first-request  {first['total_ms']:.0f} ms "
+          f"(import + GET / {first['import_and_request_ms']:.0f} ms, target {args.target_ms:.0f} ms)")
+    if first['total_ms'] > args.target_ms:
+        failures.append(f"time-to-first-request {first['total_ms']:.0f} ms > {args.target_ms:.0f} ms")
+    if first['heavy_loaded']:
+        failures.append(f"first request loaded {', '.join(first['heavy_loaded'])}")
+
+    for module, profile in profiles.items():
+        print(f"import {module:<20s} {profile['total_ms']:.0f} ms")
+        for entry in profile['slowest']:
+            print(f"   {entry['self_ms']:7.1f} ms  {entry['module']}")
+        unexpected = [m for m in profile['heavy_loaded'] if m not in ALLOWED[module]]
+        if unexpected:
+            failures.append(f"import {module} loads {', '.join(unexpected)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'first_request': first, 'imports': profiles, 'target_ms': args.target_ms}, f, indent=2)
+
+    if failures:
+        print("❌ Startup regressions:")
+        for failure in failures:
+            print("   -", failure)
+        return 1
+    print("✅ Startup within target.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Reproducible OMR benchmarks on synthetic sheets with known answers.
+
+Measures per-sheet latency of preprocess_image and detect_bubbles, throughput of
+evaluate_answers and run_full_pipeline at several batch sizes, and detection
+accuracy against the ground truth. Every run is compared against the baseline
+committed in benchmarks/baseline.json (or the one given with --baseline) and exits
+non-zero on a regression; --save-baseline records a new one.
+
+Usage:
+    python -m benchmarks.run_benchmarks                     # compare with benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --scales 10,100,1000 --workers 4
+    python -m benchmarks.run_benchmarks --full-pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --no-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic import replicate_sheets, write_sheets
+from omr_core import evaluation
+from omr_core.preprocessing import preprocess_image
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Smaller batches are dominated by start-up costs and too noisy to flag regressions on
+MIN_COMPARE_SCALE = 100
+
+
+def _percentiles(samples):
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {'p50_ms': p50 * 1000, 'p90_ms': p90 * 1000, 'p99_ms': p99 * 1000, 'mean_ms': np.mean(samples) * 1000}
+
+
+def _answers_match(detected, truth):
+    # Multi-marks are compared as sets of letters; None means blank
+    if truth is None:
+        return detected is None
+    return detected is not None and sorted(str(detected)) == sorted(truth)
+
+
+def bench_latency(folder, truths, num_questions, repeat=3):
+    """
+    Per-sheet latency of preprocess_image and detect_bubbles, plus detection accuracy.
+
+    Every sheet is timed ``repeat`` times and its fastest run is kept, which removes
+    most of the scheduling noise from the percentiles.
+    """
+    pre_times, detect_times = [], []
+    correct = total = 0
+    for name, truth in truths.items():
+        pre_best = detect_best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            thresh = preprocess_image(os.path.join(folder, name))
+            elapsed = time.perf_counter() - start
+            pre_best = elapsed if pre_best is None else min(pre_best, elapsed)
+            if thresh is None:
+                continue
+            start = time.perf_counter()
+            answers = evaluation.detect_bubbles(thresh, num_questions)
+            elapsed = time.perf_counter() - start
+            detect_best = elapsed if detect_best is None else min(detect_best, elapsed)
+        pre_times.append(pre_best)
+        if thresh is None:
+            total += len(truth)
+            continue
+        detect_times.append(detect_best)
+
+        for q, expected in truth.items():
+            correct += _answers_match(answers.get(int(q)), expected)
+            total += 1
+
+    return {
+        'preprocess_image': _percentiles(pre_times),
+        'detect_bubbles': _percentiles(detect_times),
+        'accuracy': correct / total if total else 0.0,
+    }
+
+
+def bench_scale(pool_folder, names, scale, num_questions, answer_key, workers, work_dir, full_pipeline):
+    """Throughput of evaluate_answers (and optionally run_full_pipeline) on ``scale`` sheets."""
+    batch = os.path.join(work_dir, f"batch_{scale}")
+    replicate_sheets(pool_folder, batch, scale, names)
+
+    result = {}
+    start = time.perf_counter()
+    df = evaluation.evaluate_answers(batch, num_questions, answer_key, workers=workers)
+    elapsed = time.perf_counter() - start
+    result['evaluate_answers'] = {'seconds': elapsed, 'sheets': len(df), 'sheets_per_s': len(df) / elapsed}
+
+    if full_pipeline:
+        from omr_core.pipeline import run_full_pipeline
+
+        key_path = os.path.join(work_dir, "key.xlsx")
+        if not os.path.exists(key_path):
+            import pandas as pd
+            pd.DataFrame({'Question': list(answer_key), 'CorrectOption': list(answer_key.values())}).to_excel(
+                key_path, index=False)
+
+        start = time.perf_counter()
+        run_full_pipeline(batch, key_path, workers=workers, cache_dir=None,
+                          output_dir=os.path.join(work_dir, f"report_{scale}"))
+        elapsed = time.perf_counter() - start
+        result['run_full_pipeline'] = {'seconds': elapsed, 'sheets_per_s': scale / elapsed}
+
+    shutil.rmtree(batch, ignore_errors=True)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of ``results`` against ``baseline``."""
+    regressions = []
+    if results['latency']['accuracy'] + 1e-9 < baseline['latency']['accuracy']:
+        regressions.append(f"accuracy {results['latency']['accuracy']:.3f} < "
+                           f"baseline {baseline['latency']['accuracy']:.3f}")
+
+    for stage in ('preprocess_image', 'detect_bubbles'):
+        new, old = results['latency'][stage]['p50_ms'], baseline['latency'][stage]['p50_ms']
+        if new > old * (1 + tolerance):
+            regressions.append(f"{stage} p50 {new:.1f} ms > baseline {old:.1f} ms")
+
+    for scale, stages in results['scales'].items():
+        if int(scale) < MIN_COMPARE_SCALE:
+            continue
+        for stage, values in stages.items():
+            old = baseline.get('scales', {}).get(scale, {}).get(stage)
+            if old and values['sheets_per_s'] < old['sheets_per_s'] * (1 - tolerance):
+                regressions.append(f"{stage} @ {scale} sheets: {values['sheets_per_s']:.1f} sheets/s < "
+                                   f"baseline {old['sheets_per_s']:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--width", type=int, default=1000, help="Page width in pixels")
+    parser.add_argument("--rotation", type=float, default=2.0, help="Max rotation in degrees")
+    parser.add_argument("--skew", type=float, default=0.02, help="Max corner jitter (fraction of width)")
+    parser.add_argument("--noise", type=float, default=4.0, help="Gaussian noise sigma")
+    parser.add_argument("--blank-rate", type=float, default=0.1)
+    parser.add_argument("--multi-rate", type=float, default=0.0)
+    parser.add_argument("--fill-strength", type=float, default=1.0)
+    parser.add_argument("--pool", type=int, default=20, help="Number of distinct synthetic sheets")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per sheet for the latency percentiles")
+    parser.add_argument("--scales", default="10,100", help="Comma-separated batch sizes, e.g. 10,100,1000,10000")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--full-pipeline", action="store_true", help="Also time run_full_pipeline")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--save-baseline", help="Save the results as a baseline JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="Baseline JSON file to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--no-baseline", action="store_true", help="Do not compare against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    params = {
+        'num_questions': args.questions, 'options': args.options, 'width': args.width,
+        'rotation': args.rotation, 'skew': args.skew, 'noise': args.noise, 'blank_rate': args.blank_rate,
+        'multi_rate': args.multi_rate, 'fill_strength': args.fill_strength,
+    }
+    work_dir = tempfile.mkdtemp(prefix="omr_bench_")
+    try:
+        pool_folder = os.path.join(work_dir, "pool")
+        print(f"Generating {args.pool} synthetic sheets...")
+        truths = write_sheets(pool_folder, args.pool, **params)
+        names = sorted(truths)
+
+        # Answer key = ground truth of the first sheet (blanks keyed as "A")
+        answer_key = {int(q): (a or "A")[0] for q, a in truths[names[0]].items()}
+
+        results = {
+            'params': params,
+            'workers': args.workers,
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'latency': bench_latency(pool_folder, truths, args.questions, args.repeat),
+            'scales': {},
+        }
+        lat = results['latency']
+        print(f"preprocess_image  p50 {lat['preprocess_image']['p50_ms']:.1f} ms  "
+              f"p90 {lat['preprocess_image']['p90_ms']:.1f} ms  p99 {lat['preprocess_image']['p99_ms']:.1f} ms")
+        print(f"detect_bubbles    p50 {lat['detect_bubbles']['p50_ms']:.1f} ms  "
+              f"p90 {lat['detect_bubbles']['p90_ms']:.1f} ms  p99 {lat['detect_bubbles']['p99_ms']:.1f} ms")
+        print(f"accuracy          {lat['accuracy']:.3%}")
+
+        for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+            res = bench_scale(pool_folder, names, scale, args.questions, answer_key, args.workers,
+                              work_dir, args.full_pipeline)
+            results['scales'][str(scale)] = res
+            line = ", ".join(f"{stage} {v['sheets_per_s']:.1f} sheets/s" for stage, v in res.items())
+            print(f"{scale:>6d} sheets: {line}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline and not args.no_baseline and not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            print(f"⚠️ No baseline at {args.baseline}; record one with --save-baseline.")
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {args.baseline}")
+        if baseline.get('params') != params:
+            print("⚠️ Baseline was recorded with different sheet parameters; comparison may be meaningless.")
+        if baseline.get('workers') != args.workers or baseline.get('machine', {}).get('cpus') != os.cpu_count():
+            print("⚠️ Baseline was recorded with other workers or on another machine; "
+                  "record a local one with --save-baseline for meaningful timings.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for r in regressions:
+                print("   -", r)
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
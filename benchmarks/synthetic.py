@@ -0,0 +1,124 @@
+"""
+Synthetic OMR sheet generator with known ground truth.
+
+Sheets use the layout the contour detector expects: one question per row with the
+options side by side, on a white page photographed against a dark background.
+Rotation, perspective skew, noise and the fill pattern are configurable so the
+benchmarks can exercise preprocessing and detection under realistic conditions.
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+LETTERS = "ABCDEFGHIJ"
+
+
+def make_sheet(num_questions=40, options=4, width=1000, rotation=0.0, skew=0.0, noise=0.0,
+               blank_rate=0.1, multi_rate=0.0, fill_strength=1.0, seed=0):
+    """
+    Draw one synthetic OMR sheet.
+
+    Args:
+        num_questions (int): Number of questions (one row each).
+        options (int): Options per question.
+        width (int): Page width in pixels; row spacing and bubble size scale with it.
+        rotation (float): Maximum rotation of the page in degrees (random sign).
+        skew (float): Maximum perspective jitter of each page corner, as a fraction of the width.
+        noise (float): Standard deviation of Gaussian pixel noise.
+        blank_rate (float): Probability that a question is left blank.
+        multi_rate (float): Probability that a question has two marks.
+        fill_strength (float): 1.0 fills bubbles solid black, lower values give lighter pencil marks.
+        seed (int): Random seed; the same arguments always give the same sheet.
+
+    Returns:
+        tuple: (BGR image, ground truth dict question -> letter, None for blank,
+        or two letters such as "AC" for a multi-mark).
+    """
+    rng = np.random.default_rng(seed)
+    scale = width / 1000.0
+    spacing = 40 * scale
+    radius = int(round(13 * scale))
+    height = int(120 * scale + num_questions * spacing)
+
+    page = np.full((height, width), 255, np.uint8)
+    ink = int(round(255 * (1.0 - fill_strength)))
+    truth = {}
+
+    for q in range(num_questions):
+        y = int(round(80 * scale + q * spacing))
+        roll = rng.random()
+        if roll < blank_rate:
+            marked = []
+        elif roll < blank_rate + multi_rate:
+            marked = sorted(rng.choice(options, size=2, replace=False).tolist())
+        else:
+            marked = [int(rng.integers(options))]
+        truth[q + 1] = "".join(LETTERS[o] for o in marked) or None
+
+        for o in range(options):
+            x = int(round(300 * scale + o * 60 * scale))
+            cv2.circle(page, (x, y), radius, 0, max(int(round(3 * scale)), 2), cv2.LINE_AA)
+            if o in marked:
+                cv2.circle(page, (x, y), radius - max(int(round(2 * scale)), 1), ink, -1, cv2.LINE_AA)
+
+    # Place the page on a dark background with a random rotation and perspective skew
+    margin = int(0.1 * max(width, height))
+    canvas_w, canvas_h = width + 2 * margin, height + 2 * margin
+    src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    angle = np.deg2rad(rng.uniform(-rotation, rotation))
+    rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]], dtype=np.float32)
+    centre = np.float32([width / 2, height / 2])
+    dst = (src - centre) @ rot.T + np.float32([canvas_w / 2, canvas_h / 2])
+    dst += rng.uniform(-skew, skew, size=(4, 2)).astype(np.float32) * width
+
+    M = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+    canvas = cv2.warpPerspective(page, M, (canvas_w, canvas_h), borderValue=40)
+
+    if noise > 0:
+        canvas = np.clip(canvas + rng.normal(0, noise, canvas.shape), 0, 255).astype(np.uint8)
+
+    return cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR), truth
+
+
+def write_sheets(folder, count, ext=".jpg", **kwargs):
+    """
+    Write ``count`` synthetic sheets (seeds 0..count-1) and their ground truth.
+
+    Returns:
+        dict: filename -> ground truth, also saved as ``truth.json`` in the folder.
+    """
+    os.makedirs(folder, exist_ok=True)
+    truths = {}
+    for i in range(count):
+        img, truth = make_sheet(seed=i, **kwargs)
+        name = f"sheet_{i:05d}{ext}"
+        cv2.imwrite(os.path.join(folder, name), img)
+        truths[name] = truth
+    with open(os.path.join(folder, "truth.json"), "w") as f:
+        json.dump(truths, f)
+    return truths
+
+
+def replicate_sheets(src_folder, dst_folder, count, names):
+    """
+    Fill ``dst_folder`` with ``count`` sheets by hard-linking (or copying) the given
+    source sheets cyclically, so large scales do not need large amounts of disk.
+
+    Returns:
+        dict: new filename -> source filename.
+    """
+    os.makedirs(dst_folder, exist_ok=True)
+    mapping = {}
+    for i in range(count):
+        src_name = names[i % len(names)]
+        name = f"s{i:06d}{os.path.splitext(src_name)[1]}"
+        src, dst = os.path.join(src_folder, src_name), os.path.join(dst_folder, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            with open(src, "rb") as fi, open(dst, "wb") as fo:
+                fo.write(fi.read())
+        mapping[name] = src_name
+    return mapping
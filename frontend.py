@@ -1,11 +1,19 @@
 import os
-from flask import Flask, request, render_template
+import re
+import tempfile
+from flask import Flask, Response, abort, jsonify, redirect, request, render_template, send_from_directory, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import shutil
-from omr_core.pipeline import run_full_pipeline  # assumes it takes (omr_dir, key_file)
+from omr_core import metrics
+from omr_core.ingest import SheetStream, stream_archive
+from omr_core.jobs import DONE, FAILED, JOBS_DIR, JobQueue
+from omr_core.sources import count_sheets
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB
+# Archive uploads are streamed into the evaluation, never stored, so they get their own limit
+app.config['BULK_MAX_CONTENT_LENGTH'] = int(os.environ.get('OMR_BULK_MAX_BYTES', 10 * 1024 ** 3))  # 10 GB
 
 
 UPLOAD_FOLDER = 'uploads'
@@ -14,8 +22,29 @@ STATIC_FOLDER = 'static'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['STATIC_FOLDER'] = STATIC_FOLDER
 
+# Background evaluation jobs; each upload gets its own folder under jobs/, deleted
+# OMR_JOB_RETENTION_DAYS after the job finished (0 keeps every job)
+JOB_RETENTION_DAYS = float(os.environ.get('OMR_JOB_RETENTION_DAYS', 7))
+job_queue = JobQueue(
+    jobs_dir=os.environ.get('OMR_JOBS_DIR', JOBS_DIR),
+    workers=int(os.environ.get('OMR_JOB_WORKERS', 1)),
+    pipeline_options={'workers': int(os.environ.get('OMR_EVAL_WORKERS', 1))},
+    max_age=JOB_RETENTION_DAYS * 86400 if JOB_RETENTION_DAYS > 0 else None,
+)
+
 ALLOWED_SHEET_EXTENSIONS = {'jpg', 'jpeg', 'png', 'pdf'}
-ALLOWED_KEY_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+ALLOWED_KEY_EXTENSIONS = {'xlsx', 'xls', 'csv', 'pdf'}
+
+# Answer keys uploaded through /api/keys, stored by content hash for bulk uploads
+KEYS_DIR = os.path.join(job_queue.jobs_dir, 'keys')
+KEY_ID_PATTERN = re.compile(r'^[0-9a-f]{64}\.(xlsx|xls|csv|pdf)$')
+
+# Review overlays rendered on demand, kept in a size-bounded cache shared by all jobs
+OVERLAY_CACHE_DIR = os.path.join(job_queue.jobs_dir, 'overlays')
+OVERLAY_CACHE_BYTES = int(os.environ.get('OMR_OVERLAY_CACHE_BYTES', 256 * 1024 * 1024))  # 256 MB
+# Most review links listed on a results page
+MAX_REVIEW_LINKS = 200
+_overlay_cache = None
 
 def allowed_file(filename, allowed_set):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_set
@@ -40,11 +69,8 @@ def upload_files():
         if not key_file or key_file.filename == '':
             return render_template('upload.html', error="No answer key uploaded.")
 
-        # Clear uploads folder and recreate structure
-        shutil.rmtree(UPLOAD_FOLDER, ignore_errors=True)
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        omr_dir = os.path.join(UPLOAD_FOLDER, "omr_sheets")
-        os.makedirs(omr_dir, exist_ok=True)
+        # Every upload gets its own job folder, so concurrent uploads never clobber each other
+        job_id, omr_dir, job_dir = job_queue.create_job()
 
         # Save all OMR sheets
         for file in answer_files:
@@ -54,31 +80,191 @@ def upload_files():
                 file.save(save_path)
                 print(f"Saved OMR sheet: {filename}")
             else:
+                shutil.rmtree(job_dir, ignore_errors=True)
                 return render_template('upload.html', error=f"Invalid OMR file: {file.filename}")
 
         # Save Answer Key
         if allowed_file(key_file.filename, ALLOWED_KEY_EXTENSIONS):
             key_filename = secure_filename(key_file.filename)
-            key_path = os.path.join(UPLOAD_FOLDER, key_filename)
+            key_path = os.path.join(job_dir, key_filename)
             key_file.save(key_path)
             print(f"Saved answer key: {key_filename}")
         else:
-            return render_template('upload.html', error="Invalid answer key format. Allowed formats: .xls, .xlsx, .csv")
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return render_template('upload.html', error="Invalid answer key format. Allowed formats: .xls, .xlsx, .csv, .pdf")
 
-        # Run the pipeline
-        try:
-            summary_text, plot_files = run_full_pipeline(omr_dir, key_path)
-        except Exception as e:
-            print("[ERROR]", e)  # Log the error server side
-            return render_template('results.html', summary="❌ Failed to process files. Check format and content.", plots=[])
-
-        return render_template('results.html', summary=summary_text, plots=plot_files)
+        # Queue the pipeline and answer immediately; the job page polls for progress
+        job_queue.submit(job_id, key_path, total=count_sheets(omr_dir))
+        return redirect(url_for('job_page', job_id=job_id))
 
     return render_template('upload.html')
 
 
-if __name__ == "__main__":
-    import os
+@app.route('/api/keys', methods=['POST'])
+def upload_key():
+    """Validate an answer key and store it for bulk uploads; returns its key_id."""
+    key_file = request.files.get('answer_key')
+    if not key_file or not allowed_file(key_file.filename, ALLOWED_KEY_EXTENSIONS):
+        return jsonify({'error': "Send the answer key (.xls, .xlsx, .csv, .pdf) as the 'answer_key' file."}), 400
+
+    # Imported here so the web process only loads numpy and the key parsers when a key is uploaded
+    from omr_core import keys
+
+    ext = key_file.filename.rsplit('.', 1)[1].lower()
+    os.makedirs(KEYS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=KEYS_DIR, suffix='.' + ext)
+    os.close(fd)
+    key_file.save(tmp_path)
+    try:
+        # Compiling it here also warms the compiled key cache for the jobs using it
+        compiled_key, _ = keys.load_key(tmp_path)
+    except Exception as e:
+        os.remove(tmp_path)
+        return jsonify({'error': f"Invalid answer key: {e}"}), 400
+
+    key_id = f"{compiled_key.digest}.{ext}"
+    os.replace(tmp_path, os.path.join(KEYS_DIR, key_id))
+    return jsonify({'key_id': key_id, 'questions': compiled_key.num_questions,
+                    'warnings': compiled_key.warnings}), 201
+
+
+@app.route('/api/batches', methods=['POST'])
+def upload_archive():
+    """
+    Evaluate a ZIP or tar archive of sheets streamed as the request body (?key=<key_id>).
+
+    Sheets are evaluated while the archive is still being uploaded; the response is
+    sent once the whole body has been read and points to the job's status.
+    """
+    request.max_content_length = app.config['BULK_MAX_CONTENT_LENGTH']
+    limit_mb = app.config['BULK_MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    try:
+        # Fails right away when the declared Content-Length is over the limit
+        body = request.stream
+    except RequestEntityTooLarge:
+        return jsonify({'error': f"Upload larger than {limit_mb} MB."}), 413
+
+    key_id = request.args.get('key', '')
+    if not KEY_ID_PATTERN.match(key_id) or not os.path.exists(os.path.join(KEYS_DIR, key_id)):
+        return jsonify({'error': "Unknown answer key: upload it to /api/keys and pass ?key=<key_id>."}), 400
+
+    job_id, _, job_dir = job_queue.create_job()
+    key_path = os.path.join(job_dir, key_id)
+    shutil.copyfile(os.path.join(KEYS_DIR, key_id), key_path)
+
+    sheets = SheetStream()
+    job_queue.submit(job_id, key_path, sheets=sheets)
+    links = {'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id),
+             'result_url': url_for('job_page', job_id=job_id)}
+    try:
+        received = stream_archive(body, sheets, os.path.join(job_dir, 'spool'))
+    except RequestEntityTooLarge:
+        return jsonify({**links, 'error': f"Upload larger than {limit_mb} MB."}), 413
+    except Exception as e:
+        print(f"[ERROR] Archive upload for job {job_id} failed: {e}")
+        return jsonify({**links, 'error': f"Upload failed: {e}"}), 400
+
+    print(f"Received archive with {received} sheets for job {job_id}")
+    return jsonify({**links, 'sheets': received}), 202
+
+
+def _get_job_or_404(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+
+@app.before_request
+def _start_job_queue():
+    # Pick up queued jobs and jobs of a dead process, in the processes that actually serve
+    # requests; checks the database at most every jobs.LEASE_SECONDS
+    job_queue.start()
+
 
-port = int(os.environ.get('PORT', 5000))
-app.run(host='0.0.0.0', port=port, debug=True)
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = _get_job_or_404(job_id)
+
+    if job['status'] == DONE:
+        plots = [url_for('job_file', job_id=job_id, filename=plot) for plot in job['plots']]
+        review = _review_sheets(job)
+        links = [(name, url_for('sheet_overlay', job_id=job_id, sheet=name)) for name in review[:MAX_REVIEW_LINKS]]
+        return render_template('results.html', summary=job['summary'], plots=plots,
+                               review=links, review_total=len(review))
+    if job['status'] == FAILED:
+        summary = job['summary'] or "❌ Failed to process files. Check format and content."
+        return render_template('results.html', summary=summary, plots=[])
+
+    return render_template('job.html', job=job)
+
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = _get_job_or_404(job_id)
+    return jsonify({
+        'id': job['id'],
+        'status': job['status'],
+        'processed': job['processed'],
+        'total': job['total'],
+        'uploading': job['uploading'],
+        'result_url': url_for('job_page', job_id=job_id),
+    })
+
+
+@app.route('/jobs/<job_id>/files/<path:filename>')
+def job_file(job_id, filename):
+    job = _get_job_or_404(job_id)
+    return send_from_directory(job['output_dir'], filename)
+
+
+def _geometry_path(job):
+    from omr_core.overlay import GEOMETRY_FILENAME
+    return os.path.join(job['sheets_dir'], GEOMETRY_FILENAME)
+
+
+def _review_sheets(job):
+    from omr_core import overlay
+    try:
+        return overlay.review_sheets(_geometry_path(job))
+    except LookupError:
+        return []  # evaluated before geometry was recorded
+
+
+@app.route('/jobs/<job_id>/overlay')
+def sheet_overlay(job_id):
+    """
+    Annotated image of one evaluated sheet (?sheet=<Student_ID>&size=<pixels>).
+
+    Rendered from the geometry recorded during evaluation, so nothing is detected
+    again; rendered overlays are cached.
+    """
+    global _overlay_cache
+    from omr_core import overlay
+
+    job = _get_job_or_404(job_id)
+    name = request.args.get('sheet', '')
+    size = request.args.get('size', overlay.OVERLAY_MAX_DIM, type=int)
+    size = min(max(size, overlay.MIN_OVERLAY_DIM), overlay.MAX_OVERLAY_DIM)
+    if _overlay_cache is None:
+        _overlay_cache = overlay.OverlayCache(OVERLAY_CACHE_DIR, OVERLAY_CACHE_BYTES)
+    try:
+        data = overlay.get_overlay(_geometry_path(job), name, size, cache=_overlay_cache)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    return Response(data, mimetype='image/jpeg')
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Per-stage timings aggregated over every run served by this process (OMR_METRICS=1 to enable)
+    return jsonify({
+        'enabled': metrics.is_enabled(),
+        'stages': metrics.summary(),
+        'peak_rss_bytes': metrics.peak_rss_bytes(),
+    })
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get('PORT', 5000))
+    app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache'))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+# Bump when preprocessing or detection changes in a way that alters fill values
+# (or what an entry stores: version 2 adds the sheet geometry)
+CACHE_VERSION = 2
+
+# Sheet geometry stored with the fills, see evaluation.measure_sheet
+GEOMETRY_FIELDS = ('homography', 'size', 'circles')
+
+
+class FillCache:
+    """
+    Persistent on-disk cache of per-sheet bubble fill matrices.
+
+    Entries are keyed by the SHA-256 of the image bytes plus the preprocessing and
+    detection parameters, so re-submitting the same sheets (or duplicate copies)
+    with a corrected answer key only needs re-scoring. The cache is bounded by
+    ``max_bytes`` and evicts least recently used entries in prune().
+
+    Args:
+        cache_dir (str): Folder holding the cache entries.
+        max_bytes (int): Size limit enforced by prune().
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes, params):
+        """Build a cache key from the raw image bytes and a dict of parameters."""
+        h = hashlib.sha256(image_bytes)
+        h.update(json.dumps({'version': CACHE_VERSION, **params}, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def get(self, key, geometry=None):
+        """
+        Return the cached (filled, area) arrays for a key, or None on a miss.
+
+        A hit refreshes the entry's modification time, which prune() uses as LRU order.
+        A ``geometry`` dict is updated with the sheet geometry stored by put(). Corrupt or
+        truncated entries count as misses and are removed, so the sheet is measured again.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                value = data['filled'], data['area']
+                if geometry is not None:
+                    geometry.update((name, data[name]) for name in GEOMETRY_FIELDS if name in data.files)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, filled, area, geometry=None):
+        """
+        Store the fill arrays for a key (atomic, safe with several worker processes).
+
+        ``geometry`` (homography, size and bubble circles of the sheet) is stored alongside.
+        """
+        arrays = {name: np.asarray(geometry[name]) for name in GEOMETRY_FIELDS if name in (geometry or {})}
+        path = self._path(key)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, filled=filled, area=area, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.npz'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def prune(self):
+        """
+        Evict least recently used entries until the cache fits in ``max_bytes``.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        entries = list(self._entries())
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+        }
@@ -0,0 +1,135 @@
+import numpy as np
+
+BLANK = 'blank'
+SINGLE = 'single'
+MULTI = 'multi'
+AMBIGUOUS = 'ambiguous'
+
+# Fallback blank / filled fill ratios, used when a sheet's own ratios do not show
+# two distinct groups (e.g. a sheet left completely blank)
+DEFAULT_BLANK_LEVEL = 0.55
+DEFAULT_FILLED_LEVEL = 0.95
+
+# Minimum gap between the blank and filled levels for them to count as two groups
+MIN_CONTRAST = 0.15
+
+# A bubble is marked when its normalised fill is at least this value
+MARK_LEVEL = 0.5
+
+# Questions whose least certain bubble is below this confidence are sent to review
+MIN_CONFIDENCE = 0.4
+
+
+def fill_ratios(filled, area):
+    """
+    Normalise filled pixel counts by bubble area.
+
+    Args:
+        filled (numpy array): Filled pixel counts, shape (questions, options), -1 for missing bubbles.
+        area (numpy array): Pixel area of every bubble, same shape.
+
+    Returns:
+        numpy array: float ratios in [0, 1], NaN where the bubble was not found.
+    """
+    filled = np.asarray(filled, dtype=np.float64)
+    area = np.asarray(area, dtype=np.float64)
+    ratios = np.full(filled.shape, np.nan)
+    found = (area > 0) & (filled >= 0)
+    ratios[found] = filled[found] / area[found]
+    return ratios
+
+
+def estimate_levels(ratios):
+    """
+    Estimate the fill ratio of a blank and of a filled bubble on one sheet.
+
+    The sheet's ratios are split into two groups at the point that best separates
+    them (Otsu's criterion on the sorted values) and the median of each group is
+    used as its level. Lighting, pen and print differences between sheets thereby
+    shift the levels instead of causing misreads. When the two groups are closer
+    than MIN_CONTRAST the sheet has only one kind of bubble; the single group is
+    matched to the nearer default level.
+
+    Returns:
+        tuple: (blank_level, filled_level) as floats.
+    """
+    values = np.sort(ratios[~np.isnan(ratios)])
+    if values.size == 0:
+        return DEFAULT_BLANK_LEVEL, DEFAULT_FILLED_LEVEL
+
+    if values.size >= 2:
+        n = values.size
+        counts = np.arange(1, n)
+        sums = np.cumsum(values)[:-1]
+        mean_low = sums / counts
+        mean_high = (values.sum() - sums) / (n - counts)
+        between = counts * (n - counts) * (mean_high - mean_low) ** 2
+        split = int(between.argmax()) + 1
+        blank, filled = float(np.median(values[:split])), float(np.median(values[split:]))
+        if filled - blank >= MIN_CONTRAST:
+            return blank, filled
+
+    level = float(np.median(values))
+    if abs(level - DEFAULT_BLANK_LEVEL) <= abs(level - DEFAULT_FILLED_LEVEL):
+        return level, max(DEFAULT_FILLED_LEVEL, level + MIN_CONTRAST)
+    return min(DEFAULT_BLANK_LEVEL, level - MIN_CONTRAST), level
+
+
+def decide(filled, area):
+    """
+    Turn the measured fills of one sheet into answers, states and confidences.
+
+    Every bubble's fill ratio is rescaled so the sheet's blank level is 0 and its
+    filled level is 1; bubbles at or above MARK_LEVEL are marked. A bubble's
+    confidence grows with its distance from MARK_LEVEL (0 on the boundary, 1 at
+    either level) and a question is as confident as its least certain bubble.
+
+    Args:
+        filled (numpy array): Filled pixel counts, shape (questions, options), -1 for missing bubbles.
+        area (numpy array): Pixel area of every bubble, same shape.
+
+    Returns:
+        dict: ``answers`` (question_number -> letter, several letters such as "AC" for a
+        multi-mark, None for blank), ``states`` (question_number -> BLANK, SINGLE, MULTI
+        or AMBIGUOUS), ``confidence`` (question_number -> 0..1), ``marked`` (boolean
+        questions x options matrix behind ``answers``), ``levels``
+        ((blank, filled) ratios of this sheet) and ``review`` (sorted question numbers
+        that need a human check: ambiguous marks or bubbles that were not found).
+    """
+    ratios = fill_ratios(filled, area)
+    blank_level, filled_level = estimate_levels(ratios)
+    result = {'answers': {}, 'states': {}, 'confidence': {}, 'marked': np.zeros(ratios.shape, dtype=bool),
+              'levels': (blank_level, filled_level), 'review': []}
+    if ratios.size == 0:
+        return result
+
+    normalised = (ratios - blank_level) / (filled_level - blank_level)
+    bubble_conf = np.clip(np.abs(normalised - MARK_LEVEL) / MARK_LEVEL, 0.0, 1.0)
+    missing = np.isnan(ratios).any(axis=1)
+    marked = np.nan_to_num(normalised, nan=0.0) >= MARK_LEVEL
+    confidence = np.where(missing, 0.0, np.nan_to_num(bubble_conf, nan=0.0).min(axis=1))
+    result['marked'] = marked
+
+    for q_idx, (row, conf, lost) in enumerate(zip(marked.tolist(), confidence.tolist(), missing.tolist())):
+        q = q_idx + 1
+        letters = "".join(chr(ord('A') + opt_idx) for opt_idx, on in enumerate(row) if on)
+        if lost or conf < MIN_CONFIDENCE:
+            state = AMBIGUOUS
+            result['review'].append(q)
+        elif not letters:
+            state = BLANK
+        elif len(letters) == 1:
+            state = SINGLE
+        else:
+            state = MULTI
+        # Ambiguous questions keep the best reading so the sheet can still be scored
+        result['answers'][q] = letters or None
+        result['states'][q] = state
+        result['confidence'][q] = round(conf, 3)
+
+    return result
+
+
+def sheet_confidence(decision):
+    """Lowest question confidence of a sheet (1.0 for a sheet without questions)."""
+    return min(decision['confidence'].values(), default=1.0)
@@ -1,121 +1,789 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
 import cv2
 import numpy as np
-import pandas as pd
-from .preprocessing import preprocess_image  # your preprocessing function
+from . import decision, metrics, quality
+from .scoring import encode_answer_key, encode_marks, encode_responses, score_responses
+from .preprocessing import decode_image, load_image, preprocess_array, preprocess_image, preprocessing_params  # your preprocessing function
+from .template import sample_template, template_digest
+from . import sources
+
+
+# Sheets scored together in one score_responses call; a batch is also scored once
+# its oldest sheet has waited SCORE_BATCH_SECONDS, so slow streams still report progress
+SCORE_BATCH = 64
+SCORE_BATCH_SECONDS = 1.0
 
+# Smallest bubble side (in pixels) at full resolution; scaled down with the decode factor
+BUBBLE_MIN_SIZE = 20
 
-def detect_bubbles(thresh_img, num_questions, options_per_question=4, debug=False):
+
+def find_bubble_rows(thresh_img, num_questions, options_per_question=4, min_size=BUBBLE_MIN_SIZE):
     """
-    Detect marked bubbles in a thresholded image and return the selected answers.
+    Locate bubble contours in a thresholded image and group them into question rows.
 
     Args:
         thresh_img (numpy array): Thresholded OMR image (binary).
         num_questions (int): Number of questions expected.
         options_per_question (int): Number of options per question, default 4 (A-D).
-        debug (bool): Print debug info if True.
+        min_size (int): Smallest bubble width and height in pixels.
 
     Returns:
-        dict: question_number -> selected_option_letter (e.g. {1: 'A', 2: 'C', ...})
+        list: One list of contours per detected question, sorted left to right.
     """
     # Find contours in the thresholded image
     cnts, _ = cv2.findContours(thresh_img.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    question_contours = []
+
+    bubbles = []
 
     # Filter contours likely to be bubbles based on size and shape
     for c in cnts:
         x, y, w, h = cv2.boundingRect(c)
         aspect_ratio = w / float(h)
-        if w >= 20 and h >= 20 and 0.8 <= aspect_ratio <= 1.2:
-            question_contours.append(c)
+        if w >= min_size and h >= min_size and 0.8 <= aspect_ratio <= 1.2:
+            bubbles.append((x, y, c))
 
     # Sort bubbles top-to-bottom (by y-coordinate)
-    question_contours = sorted(question_contours, key=lambda c: cv2.boundingRect(c)[1])
-
-    answers = {}
+    bubbles.sort(key=lambda b: b[1])
 
-    # Group bubbles by question and determine filled bubble per question
-    for q_idx, i in enumerate(range(0, len(question_contours), options_per_question)):
-        if q_idx + 1 > num_questions:
+    rows = []
+    for i in range(0, len(bubbles), options_per_question):
+        if len(rows) >= num_questions:
             break
-        row_cnts = question_contours[i : i + options_per_question]
         # Sort left to right within the question options
-        row_cnts = sorted(row_cnts, key=lambda c: cv2.boundingRect(c)[0])
+        row = sorted(bubbles[i : i + options_per_question], key=lambda b: b[0])
+        rows.append([c for _, _, c in row])
 
-        max_nonzero = 0
-        selected_option = None
+    return rows
 
-        for opt_idx, c in enumerate(row_cnts):
-            mask = np.zeros(thresh_img.shape, dtype="uint8")
-            cv2.drawContours(mask, [c], -1, 255, -1)
-            masked_region = cv2.bitwise_and(thresh_img, thresh_img, mask=mask)
-            non_zero = cv2.countNonZero(masked_region)
 
-            if debug:
-                print(f"Question {q_idx+1}, option {opt_idx} (letter {chr(ord('A') + opt_idx)}), non-zero pixels: {non_zero}")
+def measure_bubble_fills(thresh_img, rows, options_per_question=4):
+    """
+    Measure how many pixels are filled inside every bubble in a single pass.
+
+    All bubbles are drawn once into a labelled image (bubble index + 1, 0 for
+    background) and the filled pixels are counted per label with ``np.bincount``,
+    so the cost no longer grows with the number of questions times the image size.
+
+    Args:
+        thresh_img (numpy array): Thresholded OMR image (binary).
+        rows (list): Bubble contours grouped per question, as returned by find_bubble_rows.
+        options_per_question (int): Number of options per question.
+
+    Returns:
+        tuple: (filled, area) int32 arrays of shape (len(rows), options_per_question).
+            ``filled`` holds the non-zero pixel count of each bubble and ``area`` its
+            pixel area; options missing from a row are marked with -1 in both.
+    """
+    shape = (len(rows), options_per_question)
+    filled = np.full(shape, -1, dtype=np.int32)
+    area = np.full(shape, -1, dtype=np.int32)
+
+    contours = [c for row in rows for c in row]
+    if not contours:
+        return filled, area
+
+    labels = np.zeros(thresh_img.shape[:2], dtype=np.int32)
+    for idx, c in enumerate(contours):
+        cv2.drawContours(labels, [c], -1, idx + 1, -1)
+
+    n = len(contours) + 1
+    filled_counts = np.bincount(labels[thresh_img > 0], minlength=n)[1:]
+    area_counts = np.bincount(labels.ravel(), minlength=n)[1:]
+
+    idx = 0
+    for q, row in enumerate(rows):
+        k = len(row)
+        filled[q, :k] = filled_counts[idx : idx + k]
+        area[q, :k] = area_counts[idx : idx + k]
+        idx += k
+
+    return filled, area
+
+
+def bubble_min_size(decode_factor=1):
+    """Smallest bubble side for a sheet decoded at 1/``decode_factor`` resolution (see preprocessing.decode_image)."""
+    return max(2, BUBBLE_MIN_SIZE // decode_factor)
+
+
+def bubble_circles(rows, options_per_question=4):
+    """
+    Centre and radius of every detected bubble, for drawing review overlays.
+
+    Returns:
+        numpy array: float32 (questions, options, 3) of (x, y, radius); missing bubbles have radius 0.
+    """
+    circles = np.zeros((len(rows), options_per_question, 3), dtype=np.float32)
+    for q, row in enumerate(rows):
+        for o, c in enumerate(row):
+            x, y, w, h = cv2.boundingRect(c)
+            circles[q, o] = (x + w / 2.0, y + h / 2.0, max(w, h) / 2.0)
+    return circles
+
+
+def measure_fills(thresh_img, num_questions, options_per_question=4, template=None, geometry=None,
+                  min_size=BUBBLE_MIN_SIZE):
+    """
+    Measure the fill of every bubble, from the fixed template when given or from contours.
+
+    A ``geometry`` dict receives the bubble ``circles`` in ``thresh_img`` coordinates
+    (see bubble_circles). ``min_size`` is the smallest contour bubble (see find_bubble_rows).
+
+    Returns:
+        tuple: (filled, area) int32 arrays of shape (questions, options).
+    """
+    with metrics.stage("detect_bubbles"):
+        if template is not None:
+            filled, area = sample_template(thresh_img, template)
+            if geometry is not None:
+                # Sheets are sampled at the template size; scale the layout back to this sheet
+                sy, sx = (s / float(t) for s, t in zip(thresh_img.shape[:2], template['shape']))
+                circles = np.concatenate([template['centres'] * (sx, sy), template['radii'][..., None] * (sx + sy) / 2],
+                                         axis=-1)
+                geometry['circles'] = circles[:num_questions].astype(np.float32)
+            return filled[:num_questions], area[:num_questions]
+
+        rows = find_bubble_rows(thresh_img, num_questions, options_per_question, min_size)
+        if geometry is not None:
+            geometry['circles'] = bubble_circles(rows, options_per_question)
+        return measure_bubble_fills(thresh_img, rows, options_per_question)
+
+
+def detect_bubbles(thresh_img, num_questions, options_per_question=4, debug=False, return_fills=False,
+                   template=None):
+    """
+    Detect marked bubbles in a thresholded image and return the selected answers.
 
-            if non_zero > max_nonzero:
-                max_nonzero = non_zero
-                selected_option = opt_idx
+    Args:
+        thresh_img (numpy array): Thresholded OMR image (binary).
+        num_questions (int): Number of questions expected.
+        options_per_question (int): Number of options per question, default 4 (A-D).
+        debug (bool): Print debug info if True.
+        return_fills (bool): Also return the raw per-option fill matrix.
+        template (dict, optional): Fixed bubble layout from omr_core.template. When given,
+            contour detection is skipped and the sheet is sampled at the layout coordinates.
 
-        option_letter = chr(ord('A') + selected_option) if selected_option is not None else None
-        answers[q_idx + 1] = option_letter
+    Returns:
+        dict: question_number -> selected_option_letter (e.g. {1: 'A', 2: 'C', ...}),
+        None for blank questions and several letters (e.g. 'AC') for multi-marks,
+        as decided by omr_core.decision.
+        When ``return_fills`` is True, a tuple (answers, filled) where ``filled`` is the
+        int32 array of filled pixel counts per question and option.
+    """
+    filled, area = measure_fills(thresh_img, num_questions, options_per_question, template)
+    result = decision.decide(filled, area)
+    answers = result['answers']
+
+    if debug:
+        _print_decision(result)
 
+    if return_fills:
+        return answers, filled
     return answers
 
 
-def evaluate_answers(images_folder, num_questions, answer_key, options_per_question=4, debug=False):
+def _print_decision(result):
+    """Print the fill levels and every question's state as decided by decision.decide."""
+    blank_level, filled_level = result['levels']
+    print(f"Fill levels: blank {blank_level:.3f}, filled {filled_level:.3f}")
+    for q, state in result['states'].items():
+        print(f"Question {q}: {state} {result['answers'][q]} (confidence {result['confidence'][q]:.2f})")
+
+
+# Per-process state set up by _init_worker so large objects such as the bubble
+# template are sent to each worker once instead of with every task.
+_worker_state = {}
+
+
+def _init_worker(template=None, cache=None, metrics_enabled=False, cv_threads=1):
+    """Initialise a pool worker: limit OpenCV threads and keep the shared template and cache."""
+    # One OpenCV thread per process, otherwise N workers x N cores oversubscribe the CPU
+    cv2.setNumThreads(cv_threads)
+    _worker_state['template'] = template
+    _worker_state['cache'] = cache
+    _worker_state['in_worker'] = True
+    sources.forget_open_pdfs()
+    # Forked workers inherit the parent's samples; start clean so none are sent back twice
+    metrics.reset()
+    metrics.enable(metrics_enabled)
+
+
+def _cache_params(num_questions, options_per_question, template, preflight=False):
     """
-    Evaluate all OMR sheets in a folder against the answer key.
+    Everything besides the image bytes that determines the fill matrix of a sheet.
+
+    With ``preflight`` the check thresholds are part of the key: rejected sheets are never
+    cached, so a cache hit is a sheet that passed these exact checks and is not checked again.
+    """
+    params = {
+        'num_questions': num_questions,
+        'options_per_question': options_per_question,
+        'template': template_digest(template) if template is not None else None,
+        **preprocessing_params(),
+    }
+    if preflight:
+        params['preflight'] = quality.preflight_params()
+    return params
+
+
+def measure_sheet(source, num_questions, options_per_question=4, template=None, cache=None, preflight=None,
+                  timings=None, geometry=None):
+    """
+    Preprocess a single OMR sheet and measure its bubble fills, using the fill cache when given.
+
+    With the pre-flight checks enabled, sheets that are not cached are first checked on
+    a thumbnail (quality.check_sheet); sheets failing the checks are rejected before the
+    perspective correction, thresholding and bubble detection. Cache entries written
+    with the checks enabled are kept apart from those written without, so a cache hit
+    is always a sheet that passed the same checks and skips them (see _cache_params).
 
     Args:
-        images_folder (str): Path to folder containing OMR images.
+        source (str, tuple or MemorySheet): Image path, (pdf_path, page_index) for a scanned
+            PDF page, or an image already in memory (sources.MemorySheet).
+        num_questions (int): Number of questions on the sheet.
+        options_per_question (int): Number of options per question.
+        template (dict, optional): Fixed bubble layout.
+        cache (FillCache, optional): Cache of fill matrices keyed by image content.
+        preflight (bool, optional): Run the pre-flight checks; defaults to quality.PREFLIGHT.
+        timings (dict, optional): Updated with the seconds spent in the pre-flight checks
+            (``preflight``) and in the full processing (``process``).
+        geometry (dict, optional): Updated with the sheet geometry for review overlays:
+            ``homography`` (decoded image to top-down sheet), ``size`` (width, height of
+            the top-down sheet) and bubble ``circles`` in top-down coordinates. Cached
+            sheets get the geometry stored with their fills.
+
+    Returns:
+        tuple: ((filled, area), cached) where the fill arrays are None if the image
+        could not be preprocessed and ``cached`` tells whether they came from the cache.
+
+    Raises:
+        quality.SheetRejected: When the sheet fails the pre-flight checks.
+    """
+    if preflight is None:
+        preflight = quality.PREFLIGHT
+    decoded = {}
+    if sources.is_pdf_page(source):
+        # PDF pages are rasterised in memory; the cache key is the rendered page content
+        with metrics.stage("rasterise_pdf"):
+            img = sources.load_sheet(source)
+        data = img
+        key = None
+        if cache is not None:
+            key = cache.make_key(data, {**_cache_params(num_questions, options_per_question, template, preflight),
+                                        'pdf_dpi': sources.PDF_DPI})
+            fills = cache.get(key, geometry)
+            if fills is not None:
+                return fills, True
+    elif cache is None and not sources.is_in_memory(source):
+        with metrics.stage("imread"):
+            img = load_image(source, info=decoded)
+        if img is None:
+            print("Error loading image:", source)
+            return None, False
+    else:
+        if sources.is_in_memory(source):
+            data = source.data
+        else:
+            with metrics.stage("read_file"):
+                with open(source, 'rb') as f:
+                    data = f.read()
+
+        key = None
+        if cache is not None:
+            with metrics.stage("cache_lookup"):
+                key = cache.make_key(data, _cache_params(num_questions, options_per_question, template, preflight))
+                fills = cache.get(key, geometry)
+            if fills is not None:
+                return fills, True
+
+        with metrics.stage("imread"):
+            img = decode_image(data, info=decoded)
+        if img is None:
+            print("Error loading image:", sources.source_name(source))
+            return None, False
+
+    if timings is None:
+        timings = {}
+    if preflight:
+        start = time.perf_counter()
+        with metrics.stage("preflight"):
+            check = quality.check_sheet(img, num_questions, options_per_question,
+                                        decode_factor=decoded.get('factor', 1))
+        timings['preflight'] = time.perf_counter() - start
+        if not check['ok']:
+            raise quality.SheetRejected(check['reasons'])
+
+    # The thresholded sheet lives in per-thread work buffers; only the small fill arrays leave this call
+    start = time.perf_counter()
+    # A reduced-size decode (preprocessing.DECODE_MAX_DIM) shrinks the bubbles with the sheet
+    factor = decoded.get('factor', 1)
+    thresh = preprocess_array(img, reuse_buffers=True, geometry=geometry, decode_factor=factor)
+    fills = measure_fills(thresh, num_questions, options_per_question, template, geometry, bubble_min_size(factor))
+    timings['process'] = time.perf_counter() - start
+    if cache is not None:
+        cache.put(key, *fills, geometry=geometry)
+    return fills, False
+
+
+def evaluate_sheet(img_path, num_questions, options_per_question=4, debug=False, template=None, cache=None):
+    """
+    Preprocess a single OMR sheet (image path or PDF page source) and detect its answers.
+
+    With ``debug`` the fill levels and every question's decision are printed.
+
+    Returns:
+        dict or None: question_number -> selected option, or None if the image could not be
+        preprocessed or failed the pre-flight checks.
+    """
+    try:
+        fills, _ = measure_sheet(img_path, num_questions, options_per_question, template, cache)
+    except quality.SheetRejected as e:
+        print(f"Rejected {sources.source_name(img_path)}: {e}")
+        return None
+    if fills is None:
+        return None
+    result = decision.decide(*fills)
+    if debug:
+        _print_decision(result)
+    return result['answers']
+
+
+def _evaluate_sheet_task(img_path, num_questions, options_per_question, debug, template=None, cache=None):
+    """
+    Pool task wrapper: never raises, so one bad sheet cannot abort the batch. With
+    ``debug`` the sheet's fill levels and decisions are printed (from the worker).
+
+    Returns:
+        dict: ``answers`` (None if the image could not be preprocessed), ``codes``
+        (uint16 option bitmask per question for scoring, see scoring.encode_marks),
+        ``review`` (question numbers flagged by the decision engine), ``confidence`` (lowest
+        question confidence), ``error`` (message or None), ``rejected`` (reasons the
+        sheet failed the pre-flight checks, None otherwise), ``cached`` (fills came
+        from the cache), ``geometry`` (see measure_sheet, plus the ``ratios`` of filled
+        pixels per bubble; None when unavailable), ``timings`` (seconds spent in the pre-flight checks and the
+        full processing, see measure_sheet), ``peak_rss``
+        (peak resident memory of the evaluating process in bytes after this sheet, None
+        where unavailable) and ``metrics`` (stage samples recorded in a pool worker, None otherwise).
+    """
+    if template is None:
+        template = _worker_state.get('template')
+    if cache is None:
+        cache = _worker_state.get('cache')
+    return _evaluate_source(img_path, num_questions, options_per_question, template, cache, debug)
+
+
+def _evaluate_set_task(item, set_options, debug=False, template=None, cache=None):
+    """
+    Pool task of iter_evaluate_sets: evaluate one (set_name, source) item with its set's layout.
+
+    ``set_options`` maps set name -> (num_questions, options_per_question) and
+    ``template`` (or the worker's shared template) maps set name -> bubble layout.
+    """
+    set_name, source = item
+    num_questions, options_per_question = set_options[set_name]
+    templates = template if template is not None else _worker_state.get('template') or {}
+    if cache is None:
+        cache = _worker_state.get('cache')
+    return _evaluate_source(source, num_questions, options_per_question, templates.get(set_name), cache, debug)
+
+
+def _evaluate_source(img_path, num_questions, options_per_question, template, cache, debug=False):
+    outcome = {'answers': None, 'codes': None, 'review': [], 'confidence': None, 'error': None, 'rejected': None,
+               'cached': False, 'geometry': None, 'timings': {}, 'peak_rss': None, 'metrics': None}
+    geometry = {}
+    try:
+        with metrics.stage("sheet", label=sources.source_name(img_path)):
+            fills, cached = measure_sheet(img_path, num_questions, options_per_question, template, cache,
+                                          timings=outcome['timings'], geometry=geometry)
+        if fills is not None:
+            with metrics.stage("decide"):
+                result = decision.decide(*fills)
+            if debug:
+                print(f"Decisions for {sources.source_name(img_path)}:")
+                _print_decision(result)
+            outcome['answers'] = result['answers']
+            # Questions whose bubbles were not found stay blank (code 0)
+            codes = np.zeros(num_questions, dtype=np.uint16)
+            marked = encode_marks(result['marked'])[:num_questions]
+            codes[:marked.size] = marked
+            outcome['codes'] = codes
+            outcome['review'] = result['review']
+            outcome['confidence'] = decision.sheet_confidence(result)
+            if 'circles' in geometry:
+                filled, area = fills
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    geometry['ratios'] = np.where(area > 0, filled / area, np.nan).astype(np.float16)
+                outcome['geometry'] = geometry
+        outcome['cached'] = cached
+    except quality.SheetRejected as e:
+        outcome['rejected'] = e.reasons
+    except Exception as e:
+        outcome['error'] = f"{type(e).__name__}: {e}"
+    outcome['peak_rss'] = metrics.peak_rss_bytes()
+    if _worker_state.get('in_worker'):
+        # Ship this sheet's stage timings back to the parent process
+        outcome['metrics'] = metrics.drain()
+    return outcome
+
+
+def list_sheet_images(images_folder):
+    """Return the OMR image paths in a folder, sorted by filename for a deterministic order."""
+    return [
+        os.path.join(images_folder, filename)
+        for filename in sorted(os.listdir(images_folder))
+        if filename.lower().endswith(sources.IMAGE_EXTENSIONS)
+    ]
+
+
+def _run_chunk(task, chunk):
+    """Run a pool task over a chunk of sheets inside one worker."""
+    return [task(img_path) for img_path in chunk]
+
+
+def _iter_outcomes(task, img_paths, workers, chunksize, template, cache):
+    """
+    Yield (img_path, outcome) pairs in input order.
+
+    With several workers, at most ``2 * workers`` chunks are in flight at any
+    time, so memory stays bounded no matter how many sheets the batch holds.
+    """
+    if workers <= 1:
+        for img_path in img_paths:
+            yield img_path, task(img_path, template=template, cache=cache)
+        return
+
+    paths = iter(img_paths)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(template, cache, metrics.is_enabled())) as executor:
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(paths, chunksize))
+                if not chunk:
+                    break
+                pending.append((chunk, executor.submit(_run_chunk, task, chunk)))
+            if not pending:
+                break
+            # Always wait on the oldest chunk so results come out in submission order
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+
+
+def iter_evaluate(images, num_questions, answer_key, options_per_question=4, debug=False, template=None,
+                  workers=1, chunksize=4, cache=None, stats=None, scoring_rules=None, geometry_writer=None):
+    """
+    Evaluate OMR sheets one by one and yield each result as soon as it is decoded.
+
+    Args:
+        images (str or iterable): Folder containing OMR images and/or PDFs, or an iterable of
+            sheet sources (image paths, (pdf_path, page_index) tuples or sources.MemorySheet
+            objects). PDF pages are rasterised one at a time inside the workers. The iterable
+            is consumed lazily, so it may still be growing (see omr_core.ingest.SheetStream).
         num_questions (int): Number of questions on the sheet.
         answer_key (dict): Correct answers, e.g. {1:'A', 2:'B', ...}
         options_per_question (int): Number of options per question.
         debug (bool): Print debug info.
+        template (dict, optional): Fixed bubble layout shared by every sheet in the batch.
+        workers (int, optional): Number of worker processes. 1 runs in the current process,
+            None uses every CPU core.
+        chunksize (int): Number of sheets submitted to a worker at a time.
+        cache (FillCache, optional): Cache of fill matrices keyed by image content; cached
+            sheets are only re-scored. The cache is pruned to its size limit at the end.
+        stats (dict, optional): Updated in place with ``cache_hits``, ``cache_misses``, ``failed``,
+            ``review`` (sheets with questions flagged for human review), ``rejected`` (list of
+            (Student_ID, reasons) for sheets failing the pre-flight checks), ``preflight_seconds``,
+            ``fully_processed`` and ``process_seconds`` (see preflight_summary) and ``peak_rss`` (per-sheet peak resident memory samples in bytes, see rss_summary).
+        scoring_rules (dict, optional): weights / negative / multi_mark, see scoring.score_responses.
+        geometry_writer (overlay.GeometryWriter, optional): Receives the detection geometry
+            of every scored sheet, for review overlays.
+
+    Yields:
+        dict: {'Student_ID': filename, 1: 'A', ..., 'Total_Score': score, 'Confidence': lowest
+        question confidence, 'Review': flagged question numbers as "3;17" or ""} per valid sheet
+        (``<pdf name>#p<page>`` for PDF pages),
+        in input order regardless of the number of workers.
+    """
+    img_paths = sources.iter_sheet_sources(images) if isinstance(images, str) else images
+    task = partial(_evaluate_sheet_task, num_questions=num_questions,
+                   options_per_question=options_per_question, debug=debug)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Encode the key once; every sheet is then scored with array operations
+    key_mask = encode_answer_key(answer_key, num_questions, options_per_question)
+    stats = _init_stats(stats)
+
+    batch = _ScoreBatch(key_mask, scoring_rules, stats, geometry_writer)
+    for img_path, outcome in _iter_outcomes(task, img_paths, workers, chunksize, template, cache):
+        if _check_outcome(img_path, outcome, cache, stats, debug):
+            batch.add(img_path, outcome)
+        if batch.ready():
+            yield from batch.score()
+    yield from batch.score()
+
+    if cache is not None:
+        cache.prune()
+
+
+def iter_evaluate_sets(sheet_sets, options_per_question=4, debug=False, templates=None, workers=1, chunksize=4,
+                       cache=None, stats=None, scoring_rules=None, geometry_writers=None):
+    """
+    Evaluate several exam sets, each against its own answer key, through one worker pool.
+
+    The sets are queued one after the other into the same pool, so workers are started
+    (and the fill cache shared) once for the whole exam instead of once per set.
+
+    Args:
+        sheet_sets (list): (set_name, images, answer_key, num_questions) tuples, with
+            ``images`` and ``answer_key`` as for iter_evaluate.
+        options_per_question (int): Number of options per question.
+        debug (bool): Print debug info.
+        templates (dict, optional): set_name -> fixed bubble layout; sets without one use
+            contour detection.
+        workers (int, optional): Number of worker processes. 1 runs in the current process,
+            None uses every CPU core.
+        chunksize (int): Number of sheets submitted to a worker at a time.
+        cache (FillCache, optional): Cache of fill matrices, pruned once at the end.
+        stats (dict, optional): Updated in place with set_name -> stats dict as filled by
+            iter_evaluate.
+        scoring_rules (dict, optional): weights / negative / multi_mark, see scoring.score_responses.
+        geometry_writers (dict, optional): set_name -> overlay.GeometryWriter for the set's
+            detection geometry.
+
+    Yields:
+        tuple: (set_name, result row as yielded by iter_evaluate), set by set in input order.
+    """
+    set_options, key_masks = {}, {}
+    for set_name, _, answer_key, num_questions in sheet_sets:
+        set_options[set_name] = (num_questions, options_per_question)
+        key_masks[set_name] = encode_answer_key(answer_key, num_questions, options_per_question)
+
+    def items():
+        for set_name, images, _, _ in sheet_sets:
+            img_paths = sources.iter_sheet_sources(images) if isinstance(images, str) else images
+            for source in img_paths:
+                yield set_name, source
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if stats is None:
+        stats = {}
+    for set_name in set_options:
+        stats[set_name] = _init_stats(stats.get(set_name))
+
+    task = partial(_evaluate_set_task, set_options=set_options, debug=debug)
+    batch = None
+    for (set_name, img_path), outcome in _iter_outcomes(task, items(), workers, chunksize, templates or {}, cache):
+        if batch is None or batch.name != set_name:
+            # Sets arrive one after the other; score what is left of the previous one
+            if batch is not None:
+                yield from ((batch.name, entry) for entry in batch.score())
+            batch = _ScoreBatch(key_masks[set_name], scoring_rules, stats[set_name],
+                                (geometry_writers or {}).get(set_name), name=set_name)
+        if _check_outcome(img_path, outcome, cache, stats[set_name], debug):
+            batch.add(img_path, outcome)
+        if batch.ready():
+            yield from ((set_name, entry) for entry in batch.score())
+    if batch is not None:
+        yield from ((batch.name, entry) for entry in batch.score())
+
+    if cache is not None:
+        cache.prune()
+
+
+def _init_stats(stats):
+    if stats is None:
+        stats = {}
+    for name in ('cache_hits', 'cache_misses', 'failed', 'review', 'fully_processed'):
+        stats.setdefault(name, 0)
+    for name in ('preflight_seconds', 'process_seconds'):
+        stats.setdefault(name, 0.0)
+    stats.setdefault('rejected', [])
+    stats.setdefault('peak_rss', [])
+    return stats
+
+
+def _check_outcome(img_path, outcome, cache, stats, debug=False):
+    """Record one sheet outcome in ``stats``; True when the sheet has answers to score."""
+    filename = sources.source_name(img_path)
+    error = outcome['error']
+    metrics.merge(outcome.get('metrics'))
+    if outcome.get('peak_rss'):
+        stats['peak_rss'].append(outcome['peak_rss'])
+    timings = outcome.get('timings') or {}
+    stats['preflight_seconds'] += timings.get('preflight', 0.0)
+    if 'process' in timings:
+        stats['fully_processed'] += 1
+        stats['process_seconds'] += timings['process']
+    if cache is not None and error is None and not outcome.get('rejected'):
+        stats['cache_hits' if outcome['cached'] else 'cache_misses'] += 1
+    if error is not None:
+        stats['failed'] += 1
+        print(f"❌ Failed to evaluate {filename}: {error}")
+        return False
+    if outcome.get('rejected'):
+        stats['rejected'].append((filename, outcome['rejected']))
+        print(f"🚫 Rejected {filename}: {'; '.join(outcome['rejected'])}")
+        return False
+    if outcome['answers'] is None:
+        if debug:
+            print(f"Skipping {filename}: could not preprocess image.")
+        return False
+    return True
+
+
+class _ScoreBatch:
+    """
+    Sheet outcomes waiting to be scored together.
+
+    The option bitmasks of every sheet in the batch are stacked into one matrix and
+    scored with a single score_responses call; score() then yields the result rows
+    in the order the sheets were added.
+    """
+
+    def __init__(self, key_mask, scoring_rules, stats, geometry_writer=None, name=None):
+        self.key_mask = key_mask
+        self.scoring_rules = scoring_rules or {}
+        self.stats = stats
+        self.geometry_writer = geometry_writer
+        self.name = name
+        self._items = []
+        self._started = None
+
+    def add(self, img_path, outcome):
+        if not self._items:
+            self._started = time.monotonic()
+        self._items.append((img_path, outcome))
+
+    def ready(self):
+        """True once the batch is full or its oldest sheet has waited long enough."""
+        return bool(self._items) and (len(self._items) >= SCORE_BATCH
+                                      or time.monotonic() - self._started >= SCORE_BATCH_SECONDS)
+
+    def score(self):
+        """Score the batch and yield its result rows; the batch is empty afterwards."""
+        items, self._items = self._items, []
+        if not items:
+            return
+        with metrics.stage("score"):
+            codes = np.stack([outcome['codes'] for _, outcome in items])
+            scores = score_responses(codes, self.key_mask, **self.scoring_rules).tolist()
+
+        for (img_path, outcome), total_score in zip(items, scores):
+            filename = sources.source_name(img_path)
+            student_answers = outcome['answers']
+            if outcome['review']:
+                self.stats['review'] += 1
+            if self.geometry_writer is not None and outcome.get('geometry') is not None:
+                self.geometry_writer.write(filename, img_path, outcome['geometry'], student_answers,
+                                           outcome['review'])
+            yield {'Student_ID': filename, **student_answers, 'Total_Score': total_score,
+                   'Confidence': outcome['confidence'], 'Review': ";".join(map(str, outcome['review']))}
+
+
+def rss_summary(samples):
+    """
+    Summarise per-sheet peak RSS samples collected by iter_evaluate.
+
+    Returns:
+        dict or None: {'max', 'p50', 'p90'} in bytes, None when no samples were collected.
+    """
+    if not samples:
+        return None
+    p50, p90 = np.percentile(samples, [50, 90])
+    return {'max': int(max(samples)), 'p50': int(p50), 'p90': int(p90)}
+
+
+def preflight_summary(stats):
+    """
+    Estimate the compute the pre-flight checks saved in a batch.
+
+    Every rejected sheet is assumed to have cost what an accepted sheet cost on average
+    in the full processing (perspective correction, thresholding, bubble detection).
+
+    Args:
+        stats (dict): Stats filled by iter_evaluate (or one set's stats of iter_evaluate_sets).
 
     Returns:
-        pandas.DataFrame: Results containing student IDs, their answers, and total scores.
+        dict or None: ``rejected`` (sheets), ``preflight_seconds`` (spent on the checks of
+        every sheet not found in the cache), ``saved_seconds`` (estimated full processing skipped, None when no
+        sheet was fully processed to estimate from) and ``net_seconds`` (saved minus
+        spent); None when no pre-flight check ran.
     """
-    results = []
+    if not stats.get('preflight_seconds'):
+        return None
+    rejected = len(stats['rejected'])
+    saved = None
+    if stats['fully_processed']:
+        saved = rejected * stats['process_seconds'] / stats['fully_processed']
+    return {
+        'rejected': rejected,
+        'preflight_seconds': stats['preflight_seconds'],
+        'saved_seconds': saved,
+        'net_seconds': None if saved is None else saved - stats['preflight_seconds'],
+    }
 
-    for filename in os.listdir(images_folder):
-        if filename.lower().endswith((".jpg", ".png")):
-            img_path = os.path.join(images_folder, filename)
-            preprocessed_img = preprocess_image(img_path)
-            if preprocessed_img is None:
-                if debug:
-                    print(f"Skipping {filename}: could not preprocess image.")
-                continue
 
-            student_answers = detect_bubbles(preprocessed_img, num_questions, options_per_question, debug)
+def evaluate_answers(images_folder, num_questions, answer_key, options_per_question=4, debug=False, template=None,
+                     workers=1, chunksize=4, cache=None, scoring_rules=None):
+    """
+    Evaluate all OMR sheets in a folder against the answer key.
 
-            total_score = score_omr(student_answers, answer_key)
+    Args:
+        images_folder (str): Path to folder containing OMR images.
+        num_questions (int): Number of questions on the sheet.
+        answer_key (dict): Correct answers, e.g. {1:'A', 2:'B', ...}
+        options_per_question (int): Number of options per question.
+        debug (bool): Print debug info.
+        template (dict, optional): Fixed bubble layout shared by every sheet in the batch.
+        workers (int, optional): Number of worker processes. 1 runs in the current process,
+            None uses every CPU core.
+        chunksize (int): Number of sheets submitted to a worker at a time.
+        cache (FillCache, optional): Cache of fill matrices keyed by image content.
+        scoring_rules (dict, optional): weights / negative / multi_mark, see scoring.score_responses.
 
-            entry = {'Student_ID': filename, **student_answers, 'Total_Score': total_score}
-            results.append(entry)
+    Returns:
+        pandas.DataFrame: Results containing student IDs, their answers, and total scores,
+        in filename order regardless of the number of workers.
+    """
+    results = list(iter_evaluate(images_folder, num_questions, answer_key, options_per_question, debug,
+                                 template=template, workers=workers, chunksize=chunksize, cache=cache,
+                                 scoring_rules=scoring_rules))
 
     if not results:
         print("⚠️ No valid OMR images found in:", images_folder)
 
+    import pandas as pd
+
     return pd.DataFrame(results)
 
 
-def score_omr(student_answers, answer_key):
+def results_fieldnames(num_questions):
+    """Column order of the results CSV: Student_ID, one column per question, Total_Score, Confidence, Review."""
+    return ['Student_ID', *range(1, num_questions + 1), 'Total_Score', 'Confidence', 'Review']
+
+
+def score_omr(student_answers, answer_key, options_per_question=4, **rules):
     """
     Score student answers against the answer key.
 
     Args:
         student_answers (dict): student answers, e.g. {1:'A', 2:'C', ...}
         answer_key (dict): correct answers.
+        options_per_question (int): Number of options per question.
+        **rules: Scoring rules passed to scoring.score_responses
+            (weights, negative, multi_mark).
 
     Returns:
-        int: total score.
+        int: total score (float when weights or negative marking are used).
     """
-    score = 0
-    for q, ans in student_answers.items():
-        if answer_key.get(q) and ans == answer_key[q]:
-            score += 1
-    return score
+    num_questions = max([int(q) for q in answer_key] + [int(q) for q in student_answers], default=0)
+    key_mask = encode_answer_key(answer_key, num_questions, options_per_question)
+    codes = encode_responses([student_answers], num_questions, options_per_question)
+    return score_responses(codes, key_mask, **rules)[0].item()
@@ -0,0 +1,333 @@
+import os
+import posixpath
+import queue
+import shutil
+import struct
+import tarfile
+import threading
+import zlib
+
+from . import sources
+
+# Largest image member accepted from an archive; larger members fail the upload
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+
+# Decoded sheets waiting between the upload and the evaluation; bounds memory per upload
+STREAM_BUFFER = 16
+
+_READ_SIZE = 64 * 1024
+
+_ZIP_LOCAL = b'PK\x03\x04'
+_ZIP_DESCRIPTOR = b'PK\x07\x08'
+# Central directory, ZIP64 end and end-of-archive records: no member data follows
+_ZIP_END = (b'PK\x01\x02', b'PK\x06\x06', b'PK\x06\x07', b'PK\x05\x06')
+# signature, version, flags, method, time, date, crc32, compressed size, size, name length, extra length
+_ZIP_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_ZIP64_EXTRA = 0x0001
+_STORED, _DEFLATED = 0, 8
+
+
+class _Reader:
+    """Read a non-seekable stream in order, with bytes pushed back in front of it."""
+
+    def __init__(self, stream, prefix=b''):
+        self._stream = stream
+        self._buffer = prefix
+
+    def read(self, size=_READ_SIZE):
+        if size is None or size < 0:
+            size = _READ_SIZE
+        if self._buffer:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            return data
+        return self._stream.read(size)
+
+    def read_exact(self, size):
+        parts = []
+        while size > 0:
+            data = self.read(min(size, _READ_SIZE))
+            if not data:
+                raise ValueError("Archive is truncated")
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def unread(self, data):
+        self._buffer = data + self._buffer
+
+    def drain(self):
+        while self.read(_READ_SIZE):
+            pass
+
+
+class _ZipMember:
+    """
+    Readable stream over the data of one ZIP member, inflated while it is read.
+
+    The CRC-32 is checked once the member's data has been read completely.
+    """
+
+    def __init__(self, reader, name, method, compressed_size, crc, descriptor, zip64):
+        self.name = name
+        self._reader = reader
+        # None when the size only follows the data (data descriptor); deflate marks its own end
+        self._remaining = None if descriptor else compressed_size
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS) if method == _DEFLATED else None
+        self._expected_crc = crc
+        self._descriptor = descriptor
+        self._zip64 = zip64
+        self._crc = 0
+        self._done = False
+
+    def read(self, size=-1):
+        parts, total = [], 0
+        while not self._done and (size < 0 or total < size):
+            data = self._next_chunk(_READ_SIZE if size < 0 else size - total)
+            parts.append(data)
+            total += len(data)
+        return b''.join(parts)
+
+    def _next_chunk(self, limit):
+        inflater = self._inflater
+        if inflater is None:
+            if self._remaining == 0:
+                self._finish()
+                return b''
+            data = self._reader.read(min(limit, self._remaining))
+            if not data:
+                raise ValueError("Archive is truncated")
+            self._remaining -= len(data)
+        else:
+            if inflater.eof:
+                self._finish()
+                return b''
+            chunk = inflater.unconsumed_tail
+            if not chunk:
+                want = _READ_SIZE if self._remaining is None else min(_READ_SIZE, self._remaining)
+                chunk = self._reader.read(want) if want else b''
+                if not chunk:
+                    raise ValueError("Archive is truncated")
+                if self._remaining is not None:
+                    self._remaining -= len(chunk)
+            data = inflater.decompress(chunk, limit)
+        self._crc = zlib.crc32(data, self._crc)
+        return data
+
+    def _finish(self):
+        self._done = True
+        if self._inflater is not None and self._inflater.unused_data and self._remaining is None:
+            # The deflate stream ended inside the last read: the rest belongs to the next record
+            self._reader.unread(self._inflater.unused_data)
+        crc = self._expected_crc
+        if self._descriptor:
+            head = self._reader.read_exact(4)
+            if head == _ZIP_DESCRIPTOR:
+                head = self._reader.read_exact(4)
+            crc = struct.unpack('<I', head)[0]
+            self._reader.read_exact(16 if self._zip64 else 8)
+        if self._crc != crc:
+            raise ValueError(f"ZIP member {self.name} is corrupt (CRC mismatch)")
+
+
+def _zip64_sizes(extra, size, compressed_size):
+    # The ZIP64 extra field holds the 8-byte sizes that are 0xFFFFFFFF in the header
+    offset = 0
+    while offset + 4 <= len(extra):
+        field, length = struct.unpack_from('<HH', extra, offset)
+        if field == _ZIP64_EXTRA:
+            values = list(struct.unpack_from(f'<{length // 8}Q', extra, offset + 4))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+            return size, compressed_size, True
+        offset += 4 + length
+    return size, compressed_size, False
+
+
+def iter_zip_members(stream):
+    """
+    Yield (name, fileobj) for every member of a ZIP archive read front to back.
+
+    Members are found through their local headers, so the archive is never buffered
+    or seeked (the central directory at the end is not needed). Each fileobj must be
+    read before the next member is requested; the unread rest is skipped.
+
+    Raises:
+        ValueError: For encrypted members, unsupported compression methods, stored
+            members without sizes in their header, truncated or corrupt data.
+    """
+    reader = stream if isinstance(stream, _Reader) else _Reader(stream)
+    while True:
+        signature = reader.read_exact(4)
+        if signature in _ZIP_END:
+            # Nothing but the central directory left; consume it so the upload completes
+            reader.drain()
+            return
+        if signature != _ZIP_LOCAL:
+            raise ValueError("Not a ZIP archive or corrupt ZIP data")
+
+        header = _ZIP_HEADER.unpack(signature + reader.read_exact(_ZIP_HEADER.size - 4))
+        _, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = header
+        name = reader.read_exact(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = reader.read_exact(extra_length)
+        size, compressed_size, zip64 = _zip64_sizes(extra, size, compressed_size)
+        descriptor = bool(flags & 0x08)
+
+        if flags & 0x01:
+            raise ValueError(f"ZIP member {name} is encrypted")
+        if method not in (_STORED, _DEFLATED):
+            raise ValueError(f"ZIP member {name} uses unsupported compression method {method}")
+        if method == _STORED and descriptor:
+            raise ValueError(f"ZIP member {name} is stored without its size and cannot be streamed")
+
+        member = _ZipMember(reader, name, method, compressed_size, crc, descriptor, zip64)
+        yield name, member
+        while member.read(_READ_SIZE):
+            pass
+
+
+def iter_tar_members(stream):
+    """Yield (name, fileobj) for every regular file of a (optionally compressed) tar stream."""
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, archive.extractfile(info)
+    except tarfile.TarError as e:
+        raise ValueError(f"Not a ZIP or tar archive, or corrupt tar data ({e})") from e
+
+
+def iter_archive(stream):
+    """Yield (name, fileobj) for the files of a ZIP or tar archive, detected from its first bytes."""
+    reader = _Reader(stream)
+    head = reader.read(4)
+    if not head:
+        raise ValueError("Empty upload")
+    reader.unread(head)
+    if head.startswith(b'PK'):
+        return iter_zip_members(reader)
+    return iter_tar_members(reader)
+
+
+def iter_archive_sheets(stream, spool_dir, max_image_bytes=MAX_IMAGE_BYTES):
+    """
+    Decode the sheets of an uploaded archive into sheet sources as they arrive.
+
+    Image members become sources.MemorySheet objects named by their path inside the
+    archive and are never written to disk. A PDF needs random access to be rendered,
+    so each PDF member alone is spooled to ``spool_dir`` and its pages are yielded as
+    (pdf_path, page_index) sources. Other files, folders and macOS metadata are skipped.
+
+    Args:
+        stream: Readable binary stream (e.g. the request body).
+        spool_dir (str): Folder for PDF members.
+        max_image_bytes (int): Largest image member accepted.
+
+    Yields:
+        MemorySheet or tuple: Sheet sources in archive order.
+    """
+    pdfs = 0
+    for name, member in iter_archive(stream):
+        base = posixpath.basename(name.replace('\\', '/'))
+        if not base or base.startswith('.') or name.startswith('__MACOSX/'):
+            continue
+        ext = os.path.splitext(base)[1].lower()
+        if ext in sources.IMAGE_EXTENSIONS:
+            data = member.read(max_image_bytes + 1)
+            if len(data) > max_image_bytes:
+                raise ValueError(f"{name} is larger than {max_image_bytes // (1024 * 1024)} MB")
+            yield sources.MemorySheet(name, data)
+        elif ext in sources.PDF_EXTENSIONS:
+            # One folder per PDF keeps its name as the Student_ID prefix without collisions
+            pdfs += 1
+            folder = os.path.join(spool_dir, f"{pdfs:05d}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, base)
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(member, f, _READ_SIZE)
+            for page_index in range(sources.pdf_page_count(path)):
+                yield (path, page_index)
+        else:
+            print(f"⚠️ Skipping {name}: not an image or PDF")
+
+
+class _Finished:
+    def __init__(self, error=None):
+        self.error = error
+
+
+class SheetStream:
+    """
+    Hand sheets from an upload that is still being read to the job evaluating them.
+
+    The request thread put()s sheet sources as archive members are decoded and the job
+    iterates the stream. At most ``maxsize`` sheets wait in between, so a client that
+    uploads faster than the sheets are evaluated is slowed down (the request thread
+    blocks and stops reading the socket) instead of the batch piling up in memory.
+
+    Args:
+        maxsize (int): Sheets buffered between the producer and the job.
+    """
+
+    def __init__(self, maxsize=STREAM_BUFFER):
+        self._queue = queue.Queue(maxsize)
+        self._closed = threading.Event()
+        self.received = 0
+        self.finished = False
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise RuntimeError("The evaluation of this upload has stopped")
+
+    def put(self, source):
+        """Queue one sheet source, waiting while the buffer is full."""
+        self._put(source)
+        self.received += 1
+
+    def finish(self, error=None):
+        """Mark the end of the upload; a given ``error`` fails the evaluation."""
+        self.finished = True
+        try:
+            self._put(_Finished(error))
+        except RuntimeError:
+            pass  # the job already stopped and does not wait for the end
+
+    def close(self):
+        """Called by the consumer when it stops; pending and further put() calls fail."""
+        self._closed.set()
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, _Finished):
+                if item.error is not None:
+                    raise ValueError(f"Upload failed: {item.error}")
+                return
+            yield item
+
+
+def stream_archive(stream, sheets, spool_dir):
+    """
+    Decode an uploaded archive into ``sheets`` and finish the stream.
+
+    Returns:
+        int: Number of sheets received.
+
+    Raises:
+        Exception: Whatever stopped the upload; the stream is finished with that error
+        first, so the evaluating job fails too.
+    """
+    try:
+        for source in iter_archive_sheets(stream, spool_dir):
+            sheets.put(source)
+    except Exception as e:
+        sheets.finish(e)
+        raise
+    sheets.finish()
+    return sheets.received
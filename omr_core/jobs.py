@@ -0,0 +1,347 @@
+import json
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+JOBS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'jobs'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Minimum seconds between two progress writes to the job database
+PROGRESS_INTERVAL = 1.0
+
+# A running job is leased to the process running it, which renews the lease every
+# LEASE_SECONDS / 3. Jobs whose lease ran out (their process died) are taken over by
+# the next start() of any web process; start() looks at most once per LEASE_SECONDS.
+LEASE_SECONDS = 30
+
+# Finished jobs and their files are deleted this many seconds after they finished
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # 7 days
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    sheets_dir TEXT NOT NULL,
+    key_path TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    plots TEXT,
+    error TEXT,
+    streamed INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease REAL
+)
+"""
+
+# Columns added after the first release, created on databases that lack them
+_ADDED_COLUMNS = {
+    'streamed': "INTEGER NOT NULL DEFAULT 0",
+    'owner': "TEXT",
+    'lease': "REAL",
+}
+
+
+class JobQueue:
+    """
+    Background OMR evaluation jobs backed by a local SQLite database.
+
+    Each job gets its own working folder (``<jobs_dir>/<job_id>``) holding the uploaded
+    sheets, the answer key and the report output, so concurrent uploads never share
+    files. Jobs run on a local thread pool. Several web processes can share one jobs
+    folder: a process claims a job atomically in the database before running it and
+    keeps it leased while it runs, so every job runs once. Queued jobs, and jobs of a
+    process that died, are picked up by start(). Jobs fed by a streamed upload (see
+    submit()) run on their own thread and fail instead if their process dies.
+    Finished jobs are deleted with their files after ``max_age`` seconds.
+
+    Args:
+        jobs_dir (str): Folder holding the job database and per-job folders.
+        workers (int): Number of jobs evaluated at the same time.
+        pipeline_options (dict, optional): Extra keyword arguments for run_full_pipeline.
+        max_age (float, optional): Seconds finished jobs are kept; None keeps them forever.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=1, pipeline_options=None, max_age=DEFAULT_MAX_AGE):
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, 'jobs.sqlite3')
+        self.pipeline_options = pipeline_options or {}
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='omr-job')
+        self._submitted = set()
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._last_sweep = None
+        self._heartbeat = None
+        self._owner_pid = None
+        self._owner_id = None
+
+        os.makedirs(jobs_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    @property
+    def owner(self):
+        """Lease owner name of this process (host, pid and a random suffix; new after a fork)."""
+        pid = os.getpid()
+        if self._owner_pid != pid:
+            self._owner_pid = pid
+            self._owner_id = f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner_id
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _update(self, job_id, owner=None, **fields):
+        # With an owner, only a job still leased to it is updated
+        fields['updated'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        where, params = "id = ?", [job_id]
+        if owner is not None:
+            where, params = "id = ? AND owner = ?", [job_id, owner]
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE {where}", (*fields.values(), *params))
+
+    def _claim(self, job_id):
+        """Atomically take a queued job, or a running job whose lease ran out; True when claimed."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease = ?, processed = 0, updated = ? "
+                "WHERE id = ? AND (status = ? OR (status = ? AND (lease IS NULL OR lease < ?)))",
+                (RUNNING, self.owner, now + LEASE_SECONDS, now, job_id, QUEUED, RUNNING, now),
+            )
+        if cursor.rowcount != 1:
+            return False
+        self._start_heartbeat()
+        return True
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None and self._heartbeat.is_alive():
+                return
+            self._heartbeat = threading.Thread(target=self._renew_leases, name='omr-job-lease', daemon=True)
+            self._heartbeat.start()
+
+    def _renew_leases(self):
+        """Keep the leases of the jobs this process runs from running out."""
+        while True:
+            time.sleep(LEASE_SECONDS / 3)
+            try:
+                with self._connect() as conn:
+                    conn.execute("UPDATE jobs SET lease = ? WHERE owner = ? AND status = ?",
+                                 (time.time() + LEASE_SECONDS, self.owner, RUNNING))
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not renew job leases: {e}")
+
+    def create_job(self):
+        """
+        Create a job folder and return (job_id, sheets_dir, job_dir).
+
+        The caller saves the sheets into ``sheets_dir`` and the answer key into
+        ``job_dir``, then calls submit().
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        sheets_dir = os.path.join(job_dir, 'omr_sheets')
+        os.makedirs(sheets_dir)
+        return job_id, sheets_dir, job_dir
+
+    def submit(self, job_id, key_path, total=0, sheets=None):
+        """
+        Record a job as queued and hand it to the worker pool.
+
+        ``sheets`` is an iterable of sheet sources evaluated instead of the job's sheets
+        folder, for uploads that are still arriving (omr_core.ingest.SheetStream). Such a
+        job starts at once on its own thread, since the upload waits for it, and cannot
+        be resumed after a restart.
+        """
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        now = time.time()
+        # A streamed job can only run in the process receiving the upload, so it is claimed right away
+        streamed = sheets is not None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created, updated, sheets_dir, key_path, output_dir, total, streamed, "
+                "owner, lease) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, RUNNING if streamed else QUEUED, now, now, os.path.join(job_dir, 'omr_sheets'), key_path,
+                 os.path.join(job_dir, 'output'), total, int(streamed),
+                 self.owner if streamed else None, now + LEASE_SECONDS if streamed else None),
+            )
+        if not streamed:
+            self._dispatch(job_id)
+        else:
+            self._start_heartbeat()
+            with self._lock:
+                self._streams[job_id] = sheets
+                self._submitted.add(job_id)
+            threading.Thread(target=self._run, args=(job_id,), name=f'omr-stream-{job_id[:8]}', daemon=True).start()
+        return job_id
+
+    def start(self):
+        """
+        Pick up queued jobs and jobs whose process died, and delete expired jobs.
+
+        Cheap enough to call on every request: the database is only looked at once
+        every LEASE_SECONDS per process. Jobs are claimed before they run, so web
+        processes calling this concurrently never run a job twice.
+        """
+        now = time.time()
+        with self._lock:
+            if self._last_sweep is not None and now - self._last_sweep < LEASE_SECONDS:
+                return
+            self._last_sweep = now
+
+        self.expire()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, status, streamed FROM jobs WHERE status = ? OR (status = ? AND (lease IS NULL OR lease < ?)) "
+                "ORDER BY created", (QUEUED, RUNNING, now)
+            ).fetchall()
+        for row in rows:
+            if row['streamed']:
+                # The uploaded archive was never stored, so there is nothing to resume from
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, summary = ?, updated = ? "
+                        "WHERE id = ? AND status IN (?, ?) AND (lease IS NULL OR lease < ?)",
+                        (FAILED, "Interrupted by a restart",
+                         "❌ The upload was interrupted by a restart; please upload the archive again.",
+                         time.time(), row['id'], QUEUED, RUNNING, now),
+                    )
+                continue
+            if row['status'] == RUNNING:
+                print(f"🔁 Resuming OMR job {row['id']}")
+            self._dispatch(row['id'])
+
+    def expire(self, max_age=None):
+        """
+        Delete finished (done or failed) jobs older than ``max_age`` seconds with their files.
+
+        Job folders without a database row (e.g. an upload that failed before its job
+        was submitted) are removed once they are as old.
+
+        Returns:
+            int: Number of deleted jobs.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        if max_age is None:
+            return 0
+        cutoff = time.time() - max_age
+        with self._connect() as conn:
+            expired = [row['id'] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, cutoff))]
+            known = {row['id'] for row in conn.execute("SELECT id FROM jobs")}
+        for job_id in expired:
+            self.delete(job_id)
+
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            if _JOB_ID.match(name) and name not in known and os.path.isdir(path):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        if expired:
+            print(f"🧹 Deleted {len(expired)} finished jobs older than {max_age / 86400:g} days")
+        return len(expired)
+
+    def _dispatch(self, job_id):
+        with self._lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['plots'] = json.loads(job['plots']) if job['plots'] else []
+        sheets = self._streams.get(job_id)
+        job['uploading'] = sheets is not None and not sheets.finished
+        if sheets is not None:
+            job['total'] = max(job['total'], sheets.received)
+        return job
+
+    def _run(self, job_id):
+        # Imported here so the web process only loads the pipeline when a job runs
+        from omr_core.pipeline import run_full_pipeline
+
+        job = self.get(job_id)
+        sheets = self._streams.get(job_id)
+        owner = self.owner
+        try:
+            # Streamed jobs are claimed by submit(); another process may have taken any other job
+            if job is None or (sheets is None and not self._claim(job_id)):
+                return
+
+            state = {'processed': 0, 'written': 0.0}
+
+            def progress(processed):
+                state['processed'] = processed
+                now = time.monotonic()
+                if now - state['written'] >= PROGRESS_INTERVAL:
+                    state['written'] = now
+                    self._update(job_id, owner, processed=processed)
+
+            options = dict(self.pipeline_options)
+            if sheets is not None:
+                options['sheets'] = sheets
+            summary_text, plots = run_full_pipeline(
+                job['sheets_dir'], job['key_path'], output_dir=job['output_dir'],
+                progress=progress, **options)
+
+            status = DONE if plots else FAILED
+            final = {'total': sheets.received} if sheets is not None else {}
+            self._update(job_id, owner, status=status, processed=state['processed'],
+                         summary=summary_text, plots=json.dumps(plots), **final)
+        except Exception as e:
+            print(f"[ERROR] OMR job {job_id} failed: {e}")
+            self._update(job_id, owner, status=FAILED, error=f"{e}\n{traceback.format_exc()}")
+        finally:
+            if sheets is not None:
+                # Unblock the upload if the evaluation stopped before reading it all
+                sheets.close()
+            with self._lock:
+                self._submitted.discard(job_id)
+                self._streams.pop(job_id, None)
+
+    def delete(self, job_id):
+        """Remove a job and its files (see expire() for finished jobs)."""
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
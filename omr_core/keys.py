@@ -0,0 +1,303 @@
+import csv
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from .cache import DEFAULT_CACHE_DIR
+from .scoring import parse_options
+
+# Compiled keys are stored next to the fill cache entries and share its size limit
+DEFAULT_KEY_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'keys')
+
+KEY_EXTENSIONS = ('.pdf', '.xlsx', '.xls', '.csv')
+
+# Bump when parsing or compiling changes the compiled result for the same file
+KEY_FORMAT_VERSION = 1
+
+# Invalid entries listed in a validation error before the message is cut short
+_MAX_REPORTED = 10
+
+
+class AnswerKey:
+    """
+    Compiled answer key: one option bitmask per question.
+
+    Bit ``i`` of ``key_mask[q - 1]`` is set when option ``i`` is correct for
+    question ``q`` (see scoring.encode_answer_key); questions without an entry
+    have mask 0 and are not scored.
+
+    Args:
+        key_mask (numpy array): uint16 bitmask per question.
+        options_per_question (int): Number of options the key was validated against.
+        digest (str, optional): SHA-256 of the source file.
+        warnings (list, optional): Non-fatal problems found while compiling.
+    """
+
+    def __init__(self, key_mask, options_per_question=4, digest=None, warnings=None):
+        self.key_mask = np.asarray(key_mask, dtype=np.uint16)
+        self.options_per_question = options_per_question
+        self.digest = digest
+        self.warnings = list(warnings or [])
+
+    @property
+    def num_questions(self):
+        return int(self.key_mask.shape[0])
+
+    def to_dict(self):
+        """Return question_number -> correct letter(s), e.g. {1: 'A', 2: 'BD'}, for keyed questions."""
+        answers = {}
+        for q_idx, mask in enumerate(self.key_mask.tolist()):
+            if mask:
+                answers[q_idx + 1] = "".join(chr(ord('A') + i) for i in range(self.options_per_question)
+                                             if (mask >> i) & 1)
+        return answers
+
+    def save(self, path):
+        """Write the compiled key to an ``.npz`` file atomically."""
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, key_mask=self.key_mask, options=np.array(self.options_per_question),
+                         warnings=np.array(self.warnings, dtype=str))
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, digest=None):
+        """Read a key written by save()."""
+        with np.load(path) as data:
+            return cls(data['key_mask'], int(data['options']), digest, data['warnings'].tolist())
+
+
+def _answer_from_cell(val):
+    # PDF key cells look like "1-A", "1. A" or just "A"
+    val = str(val).strip()
+    if '-' in val:
+        return val.split('-')[1].strip()
+    if '.' in val:
+        return val.split('.')[1].strip()
+    return val
+
+
+def parse_pdf_key(pdf_path):
+    """
+    Read answers from the first table of a PDF, column by column.
+
+    Returns:
+        dict: question_number -> answer text, numbered in reading order.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        table = pdf.pages[0].extract_table()
+
+    if not table:
+        raise ValueError("No table found in PDF answer key")
+
+    answers = {}
+    rows = table[1:]
+    columns = max((len(row) for row in rows), default=0)
+    for col in range(columns):
+        for row in rows:
+            val = row[col] if col < len(row) else None
+            if val is None or not str(val).strip():
+                continue
+            answers[len(answers) + 1] = _answer_from_cell(val)
+    return answers
+
+
+def _table_to_answers(header, rows):
+    """
+    Map a header row and data rows to question_number -> answer.
+
+    Uses the Question column when present (else row order) and the CorrectOption or
+    Answer column (else the second column), like scoring.answer_key_to_dict.
+    """
+    header = [str(h).strip() if h is not None else '' for h in header]
+    if 'CorrectOption' in header:
+        answer_col = header.index('CorrectOption')
+    elif 'Answer' in header:
+        answer_col = header.index('Answer')
+    else:
+        answer_col = 1
+    question_col = header.index('Question') if 'Question' in header else None
+
+    answers = {}
+    for row_idx, row in enumerate(rows):
+        value = row[answer_col] if answer_col < len(row) else None
+        if value is None or (isinstance(value, float) and np.isnan(value)) or not str(value).strip():
+            continue
+        if question_col is None:
+            q = row_idx + 1
+        else:
+            try:
+                q = int(float(row[question_col]))
+            except (TypeError, ValueError, IndexError):
+                continue
+        answers[q] = str(value).strip()
+    return answers
+
+
+def parse_xlsx_key(path):
+    """Read answers from the first sheet of an .xlsx workbook with openpyxl (no pandas)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Answer key sheet is empty")
+        return _table_to_answers(header, list(rows))
+    finally:
+        workbook.close()
+
+
+def parse_xls_key(path):
+    """Read answers from the first sheet of a legacy .xls workbook."""
+    import pandas as pd
+
+    df = pd.read_excel(path, sheet_name=0)
+    return _table_to_answers(list(df.columns), df.itertuples(index=False, name=None))
+
+
+def parse_csv_key(path):
+    """Read answers from a CSV file with a header row."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Answer key file is empty")
+        return _table_to_answers(header, list(rows))
+
+
+_PARSERS = {
+    '.pdf': parse_pdf_key,
+    '.xlsx': parse_xlsx_key,
+    '.xls': parse_xls_key,
+    '.csv': parse_csv_key,
+}
+
+
+def parse_key_file(path):
+    """
+    Read the raw answers of a key file in any supported format.
+
+    Returns:
+        dict: question_number -> answer text as written in the file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    parser = _PARSERS.get(ext)
+    if parser is None:
+        raise ValueError(f"Unsupported answer key format: {ext}")
+    return parser(path)
+
+
+def compile_key(answers, options_per_question=4, digest=None):
+    """
+    Validate raw answers and compile them into an AnswerKey.
+
+    Args:
+        answers (dict): question_number -> correct option(s), e.g. {1: 'A', 2: 'B,D'}.
+        options_per_question (int): Number of options per question.
+        digest (str, optional): Source file hash stored with the key.
+
+    Returns:
+        AnswerKey: The compiled key. Questions missing between 1 and the highest
+        question number are reported in ``warnings`` and left unscored.
+
+    Raises:
+        ValueError: If the key is empty or has entries that are not valid options.
+    """
+    errors = []
+    valid = {}
+    for q, value in answers.items():
+        indexes = parse_options(value, options_per_question)
+        if not isinstance(q, (int, np.integer)) or q < 1:
+            errors.append(f"question {q!r}")
+        elif not indexes:
+            errors.append(f"question {q}: {value!r}")
+        else:
+            valid[int(q)] = indexes
+
+    if errors:
+        shown = ", ".join(errors[:_MAX_REPORTED])
+        more = f" and {len(errors) - _MAX_REPORTED} more" if len(errors) > _MAX_REPORTED else ""
+        raise ValueError(f"Invalid answer key entries (options A-{chr(ord('A') + options_per_question - 1)}): "
+                         f"{shown}{more}")
+    if not valid:
+        raise ValueError("Answer key is empty")
+
+    key_mask = np.zeros(max(valid), dtype=np.uint16)
+    for q, indexes in valid.items():
+        for idx in indexes:
+            key_mask[q - 1] |= 1 << idx
+
+    warnings = []
+    missing = np.flatnonzero(key_mask == 0) + 1
+    if missing.size:
+        warnings.append(f"No answer for question(s) {', '.join(map(str, missing[:_MAX_REPORTED].tolist()))}"
+                        f"{' …' if missing.size > _MAX_REPORTED else ''}; they are not scored.")
+    return AnswerKey(key_mask, options_per_question, digest, warnings)
+
+
+def file_digest(path):
+    """SHA-256 of a file's content."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_key(path, cache_dir=DEFAULT_KEY_CACHE_DIR, options_per_question=4):
+    """
+    Load an answer key file (PDF, XLSX, XLS or CSV) as a compiled AnswerKey.
+
+    The compiled key is cached under ``cache_dir`` by the hash of the file content, so
+    running another batch against the same key never opens pdfplumber, openpyxl or
+    pandas again. Corrupt or truncated cache entries are removed and recompiled.
+
+    Args:
+        path (str): Answer key file.
+        cache_dir (str, optional): Folder for compiled keys; None disables the cache.
+        options_per_question (int): Number of options per question.
+
+    Returns:
+        tuple: (AnswerKey, cached) where ``cached`` tells whether it came from the cache.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _PARSERS:
+        raise ValueError(f"Unsupported answer key format: {ext}")
+
+    digest = file_digest(path)
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{digest}-o{options_per_question}-v{KEY_FORMAT_VERSION}.npz")
+        try:
+            key = AnswerKey.load(cache_path, digest)
+            os.utime(cache_path)  # LRU order for FillCache.prune()
+            return key, True
+        except FileNotFoundError:
+            pass
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # Corrupt or truncated entry: drop it and compile the key again
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    key = compile_key(parse_key_file(path), options_per_question, digest)
+    if cache_path:
+        try:
+            key.save(cache_path)
+        except OSError as e:
+            print(f"⚠️ Could not cache compiled answer key: {e}")
+    return key, False
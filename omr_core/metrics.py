@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Samples kept per stage; older samples are dropped so a long-running web process stays bounded
+MAX_SAMPLES = 100_000
+
+_state = {'enabled': os.environ.get('OMR_METRICS', '') not in ('', '0')}
+_lock = threading.Lock()
+_samples = {}  # stage -> deque of (wall_s, cpu_s, peak_bytes, label)
+_totals = {}   # stage -> number of samples ever recorded
+_local = threading.local()
+
+
+def enable(flag=True):
+    """Turn instrumentation on or off (also settable with the OMR_METRICS=1 environment variable)."""
+    _state['enabled'] = bool(flag)
+    if flag and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+class _Stage:
+    """Context manager timing one stage: wall time, CPU time and peak traced memory."""
+
+    __slots__ = ('name', 'label', 'wall', 'cpu', 'start_mem', 'peak_seen')
+
+    def __init__(self, name, label):
+        self.name = name
+        self.label = label
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Keep the enclosing stage's peak before resetting the counter for this one
+                stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+            tracemalloc.reset_peak()
+            self.start_mem = self.peak_seen = current
+        else:
+            self.start_mem = self.peak_seen = 0
+        stack.append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = _local.stack
+        stack.pop()
+        if tracemalloc.is_tracing():
+            self.peak_seen = max(self.peak_seen, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak_seen = max(stack[-1].peak_seen, self.peak_seen)
+        record(self.name, wall, cpu, self.peak_seen - self.start_mem, self.label)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, label=None):
+    """
+    Time a block of code under a stage name.
+
+    Usage::
+
+        with metrics.stage("correct_perspective"):
+            ...
+
+    When instrumentation is disabled this returns a shared no-op context manager.
+    ``label`` (e.g. the sheet filename) is kept with the sample so the slowest sheets can be reported.
+    """
+    if not _state['enabled']:
+        return _NULL_STAGE
+    return _Stage(name, label)
+
+
+def record(name, wall, cpu=0.0, peak_bytes=0, label=None):
+    """Add one sample for a stage."""
+    with _lock:
+        if name not in _samples:
+            _samples[name] = deque(maxlen=MAX_SAMPLES)
+            _totals[name] = 0
+        _samples[name].append((wall, cpu, peak_bytes, label))
+        _totals[name] += 1
+
+
+def reset():
+    """Forget every recorded sample."""
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+
+
+def drain():
+    """Remove and return every sample recorded so far (used to ship samples out of pool workers)."""
+    if not _state['enabled']:
+        return None
+    with _lock:
+        drained = {name: list(samples) for name, samples in _samples.items() if samples}
+        for samples in _samples.values():
+            samples.clear()
+    return drained
+
+
+def merge(drained):
+    """Add samples returned by drain() in another process."""
+    if not drained:
+        return
+    for name, samples in drained.items():
+        for sample in samples:
+            record(name, *sample)
+
+
+def mark():
+    """Return a marker so summary(since=...) only covers samples recorded afterwards."""
+    with _lock:
+        return dict(_totals)
+
+
+def _collect(since=None):
+    with _lock:
+        collected = {}
+        for name, samples in _samples.items():
+            new = _totals[name] - (since or {}).get(name, 0)
+            if new > 0:
+                collected[name] = list(samples)[-new:]
+        return collected
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def summary(since=None, slowest=5):
+    """
+    Aggregate the recorded samples per stage.
+
+    Returns:
+        dict: stage -> {count, wall_total, wall_p50, wall_p90, wall_p99, wall_max,
+        cpu_total, peak_mem_max, slowest} (times in seconds, memory in bytes).
+    """
+    import numpy as np
+
+    result = {}
+    for name, samples in _collect(since).items():
+        wall = np.array([s[0] for s in samples])
+        cpu = np.array([s[1] for s in samples])
+        mem = np.array([s[2] for s in samples])
+        p50, p90, p99 = np.percentile(wall, [50, 90, 99])
+        worst = sorted((s for s in samples if s[3] is not None), key=lambda s: s[0], reverse=True)[:slowest]
+        result[name] = {
+            'count': len(samples),
+            'wall_total': float(wall.sum()),
+            'wall_p50': float(p50),
+            'wall_p90': float(p90),
+            'wall_p99': float(p99),
+            'wall_max': float(wall.max()),
+            'cpu_total': float(cpu.sum()),
+            'peak_mem_max': int(mem.max()),
+            'slowest': [{'label': s[3], 'wall': s[0]} for s in worst],
+        }
+    return result
+
+
+def format_summary(stats):
+    """Format summary() output as log lines."""
+    lines = []
+    for name, s in sorted(stats.items(), key=lambda item: item[1]['wall_total'], reverse=True):
+        lines.append(
+            f"   ⏱️ {name:<20s} n={s['count']:<6d} total {s['wall_total']:.2f}s  "
+            f"p50 {s['wall_p50'] * 1000:.1f}ms  p90 {s['wall_p90'] * 1000:.1f}ms  "
+            f"p99 {s['wall_p99'] * 1000:.1f}ms  cpu {s['cpu_total']:.2f}s  "
+            f"peak {s['peak_mem_max'] / 1e6:.1f}MB"
+        )
+    return lines
+
+
+def write_json(path, stats, **extra):
+    """Write summary() output (plus any extra fields) to a JSON file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'stages': stats, 'peak_rss_bytes': peak_rss_bytes(), **extra}, f, indent=2)
+
+
+if _state['enabled']:
+    enable(True)
@@ -0,0 +1,370 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from . import sources
+from .results import encode_answer
+
+GEOMETRY_FILENAME = "OMR_Geometry.zip"
+_INDEX_MEMBER = "index.json"
+
+# Longest side (in pixels) of a rendered overlay, and the range a request may ask for
+OVERLAY_MAX_DIM = 1000
+MIN_OVERLAY_DIM = 200
+MAX_OVERLAY_DIM = 2000
+JPEG_QUALITY = 85
+
+# Bump when the drawing code changes so cached overlays are re-rendered
+OVERLAY_VERSION = 1
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024  # 256 MB
+# prune() evicts down to this share of the limit, so it does not run on every put
+_PRUNE_TARGET = 0.8
+
+# BGR colours: chosen options, questions flagged for review, other bubbles
+_CHOSEN = (0, 160, 0)
+_FLAGGED = (0, 0, 230)
+_BUBBLE = (200, 140, 60)
+
+# Geometry indexes read by the web process: path -> (mtime, index)
+_indexes = {}
+_MAX_INDEXES = 16
+
+
+class GeometryWriter:
+    """
+    Stream the detection geometry of evaluated sheets into one ZIP file.
+
+    Every sheet becomes a small compressed ``.npz`` member holding the ``homography``
+    from the decoded image to the top-down sheet, the top-down ``size``, the bubble
+    ``circles`` (x, y, radius), the ``ratios`` of filled pixels, the ``chosen`` options
+    (bitmask per question) and the questions flagged for ``review``. The index from
+    Student_ID to member and sheet source is written by close(); the file only appears
+    under its final name then.
+
+    Args:
+        folder (str): Sheets folder; the file is ``<folder>/OMR_Geometry.zip`` and sheet
+            paths inside the folder are stored relative to it.
+        options_per_question (int): Number of options per question.
+    """
+
+    def __init__(self, folder, options_per_question=4):
+        self.folder = os.path.abspath(folder)
+        self.options_per_question = options_per_question
+        self.path = os.path.join(folder, GEOMETRY_FILENAME)
+        self._partial = self.path + ".part"
+        # Members are already compressed npz files
+        self._zip = zipfile.ZipFile(self._partial, 'w', zipfile.ZIP_STORED)
+        self._index = {}
+        self.sheets = 0
+
+    def _source_ref(self, source):
+        if sources.is_in_memory(source):
+            return None  # archive uploads are never stored
+        if sources.is_pdf_page(source):
+            path, page = source
+        else:
+            path, page = source, None
+        path = os.path.abspath(path)
+        if os.path.commonpath([path, self.folder]) == self.folder:
+            path = os.path.relpath(path, self.folder)
+        return {'path': path, 'page': page}
+
+    def write(self, name, source, geometry, answers, review):
+        """
+        Add one sheet.
+
+        Args:
+            name (str): Student_ID of the sheet.
+            source: Sheet source the geometry was measured on.
+            geometry (dict): ``homography``, ``size``, ``circles`` and ``ratios`` (see
+                evaluation.measure_sheet).
+            answers (dict): question_number -> chosen letters or None.
+            review (list): Question numbers flagged for review.
+        """
+        circles = np.asarray(geometry['circles'], dtype=np.float32)
+        chosen = np.array([encode_answer(answers.get(q), self.options_per_question)
+                           for q in range(1, circles.shape[0] + 1)], dtype=np.uint16)
+        buf = io.BytesIO()
+        np.savez_compressed(buf, homography=np.asarray(geometry['homography'], dtype=np.float64),
+                            size=np.asarray(geometry['size'], dtype=np.int32), circles=circles,
+                            ratios=np.asarray(geometry['ratios'], dtype=np.float16), chosen=chosen,
+                            review=np.asarray(review, dtype=np.int16))
+        member = f"{self.sheets:07d}.npz"
+        self._zip.writestr(member, buf.getvalue())
+        self.sheets += 1
+        self._index[str(name)] = {'member': member, 'source': self._source_ref(source), 'review': len(review)}
+
+    def close(self):
+        """Write the index and move the file to its final name."""
+        self._zip.writestr(_INDEX_MEMBER, json.dumps(self._index))
+        self._zip.close()
+        os.replace(self._partial, self.path)
+        return self.path
+
+    def abort(self):
+        """Discard a partially written file."""
+        self._zip.close()
+        if os.path.exists(self._partial):
+            os.remove(self._partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def load_index(path):
+    """
+    Read the index of a geometry file: Student_ID -> {'member', 'source', 'review'}.
+
+    Indexes are kept in memory until the file changes.
+
+    Raises:
+        LookupError: When there is no geometry file at ``path``.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        raise LookupError("No sheet geometry was recorded for these results") from None
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with zipfile.ZipFile(path) as zf:
+        index = json.loads(zf.read(_INDEX_MEMBER))
+    if len(_indexes) >= _MAX_INDEXES:
+        _indexes.clear()
+    _indexes[path] = (mtime, index)
+    return index
+
+
+def review_sheets(path):
+    """Student_IDs of the sheets with questions flagged for review, in evaluation order."""
+    return [name for name, entry in load_index(path).items() if entry['review']]
+
+
+def load_geometry(path, name):
+    """
+    Load the geometry of one sheet from a file written by GeometryWriter.
+
+    Returns:
+        dict: The arrays stored by GeometryWriter.write() and ``source``, the sheet source
+        to draw on (None when the image was not kept).
+
+    Raises:
+        LookupError: When the file or the sheet is unknown.
+    """
+    entry = load_index(path).get(name)
+    if entry is None:
+        raise LookupError(f"Unknown sheet: {name}")
+    with zipfile.ZipFile(path) as zf:
+        with np.load(io.BytesIO(zf.read(entry['member']))) as data:
+            geometry = {key: data[key] for key in data.files}
+
+    source = entry['source']
+    if source is not None:
+        sheet_path = os.path.join(os.path.dirname(os.path.abspath(path)), source['path'])
+        source = sheet_path if source['page'] is None else (sheet_path, source['page'])
+    geometry['source'] = source
+    return geometry
+
+
+def render_overlay(img, geometry, max_dim=OVERLAY_MAX_DIM):
+    """
+    Draw the detection result of a sheet on its top-down view, downscaled.
+
+    Chosen options are circled in green, every option of a question flagged for review
+    in red with its fill ratio, and the other detected bubbles in blue.
+
+    Args:
+        img (numpy array or None): Decoded sheet (as the pipeline decoded it); None draws
+            on a blank page.
+        geometry (dict): Output of load_geometry.
+        max_dim (int): Longest side of the overlay.
+
+    Returns:
+        numpy array: BGR overlay image.
+    """
+    import cv2
+
+    width, height = (int(v) for v in geometry['size'])
+    scale = min(1.0, max_dim / float(max(width, height, 1)))
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    if img is None:
+        sheet = np.full(size[::-1], 255, dtype=np.uint8)
+    else:
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Warp and downscale in one pass; large reductions are area-averaged first to avoid aliasing
+        shrink = min(1.0, 2 * scale)
+        if shrink < 1.0:
+            gray = cv2.resize(gray, None, fx=shrink, fy=shrink, interpolation=cv2.INTER_AREA)
+        matrix = np.diag([scale, scale, 1.0]) @ geometry['homography'] @ np.diag([1 / shrink, 1 / shrink, 1.0])
+        sheet = cv2.warpPerspective(gray, matrix, size, flags=cv2.INTER_LINEAR)
+    canvas = cv2.cvtColor(sheet, cv2.COLOR_GRAY2BGR)
+
+    flagged = {int(q) for q in geometry['review']}
+    font_scale = max(0.3, 0.4 * scale * max(width, height) / 1000.0)
+    for q, (row, ratios, chosen) in enumerate(zip(geometry['circles'], geometry['ratios'], geometry['chosen'])):
+        review = q + 1 in flagged
+        for o, ((x, y, r), ratio) in enumerate(zip(row, ratios)):
+            if r <= 0:
+                continue
+            centre = (int(round(x * scale)), int(round(y * scale)))
+            radius = max(2, int(round(r * scale)))
+            if (int(chosen) >> o) & 1:
+                cv2.circle(canvas, centre, radius + 2, _FLAGGED if review else _CHOSEN, 2)
+            else:
+                cv2.circle(canvas, centre, radius, _FLAGGED if review else _BUBBLE, 1)
+            if review and np.isfinite(ratio):
+                cv2.putText(canvas, f"{float(ratio):.0%}", (centre[0] - radius, centre[1] - radius - 3),
+                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, _FLAGGED, 1, cv2.LINE_AA)
+    return canvas
+
+
+class OverlayCache:
+    """
+    Bounded on-disk cache of rendered overlays (JPEG bytes).
+
+    Entries are evicted least recently used first once the cache grows beyond
+    ``max_bytes``, so browsing thousands of sheets keeps a fixed footprint.
+
+    Args:
+        cache_dir (str): Folder holding the cached overlays.
+        max_bytes (int): Size limit.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._bytes = None  # running size estimate, measured on the first put()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(geometry_path, name, max_dim):
+        """Key of an overlay: the geometry file (and its version on disk), the sheet and the size."""
+        stat = os.stat(geometry_path)
+        payload = json.dumps([OVERLAY_VERSION, os.path.abspath(geometry_path), stat.st_mtime, stat.st_size,
+                              name, max_dim])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.jpg')
+
+    def get(self, key):
+        """Return the cached overlay bytes, or None; a hit refreshes the entry's LRU position."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """Store overlay bytes (atomically) and evict old entries when over the limit."""
+        path = self._path(key)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self._bytes is None:
+            self._bytes = sum(size for _, size, _ in self._entries())
+        else:
+            self._bytes += len(data)
+        if self._bytes > self.max_bytes:
+            self.prune()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.jpg'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def prune(self):
+        """
+        Evict least recently used overlays until the cache is well below ``max_bytes``.
+
+        Returns:
+            int: Number of evicted overlays.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * _PRUNE_TARGET:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._bytes = total
+        return evicted
+
+
+def get_overlay(geometry_path, name, max_dim=OVERLAY_MAX_DIM, cache=None):
+    """
+    Return the JPEG overlay of one sheet, rendering it only when it is not cached.
+
+    Sheets whose image was not kept (archive uploads) or can no longer be read are
+    drawn on a blank page.
+
+    Args:
+        geometry_path (str): Geometry file written by GeometryWriter.
+        name (str): Student_ID of the sheet.
+        max_dim (int): Longest side of the overlay.
+        cache (OverlayCache, optional): Cache of rendered overlays.
+
+    Returns:
+        bytes: JPEG image.
+
+    Raises:
+        LookupError: When the geometry file or the sheet is unknown.
+    """
+    import cv2
+
+    key = None
+    if cache is not None:
+        try:
+            key = cache.make_key(geometry_path, name, max_dim)
+        except OSError:
+            raise LookupError("No sheet geometry was recorded for these results") from None
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    geometry = load_geometry(geometry_path, name)
+    img = None
+    if geometry['source'] is not None:
+        try:
+            img = sources.load_sheet(geometry['source'])
+        except Exception as e:
+            print(f"⚠️ Could not load {name} for its overlay: {e}")
+    ok, encoded = cv2.imencode('.jpg', render_overlay(img, geometry, max_dim),
+                               [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise RuntimeError(f"Could not encode the overlay of {name}")
+    data = encoded.tobytes()
+    if cache is not None:
+        cache.put(key, data)
+    return data
@@ -1,121 +1,221 @@
+import csv
 import os
+import re
 import shutil
+import time
 import traceback
-import pandas as pd
 
-from omr_core import preprocessing, scoring, evaluation, summary, report
-import pdfplumber
+# Only the cache path is needed at import time: the OpenCV, pandas and reporting
+# modules are imported by the functions that use them, so importing the pipeline is cheap
+from omr_core.cache import DEFAULT_CACHE_DIR
 
 
 def load_answer_key_from_pdf(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        page = pdf.pages[0]  # Get first page
-        table = page.extract_table()
-
-    if not table:
-        raise ValueError("No table found in PDF answer key")
-
-    # Convert table to DataFrame for easier processing
-    df = pd.DataFrame(table[1:], columns=table[0])
-    df.columns = df.columns.str.strip()
-
-    answer_key = {}
-    question_num = 1
-
-    # Loop through all columns and their values to build answer key dict
-    for col in df.columns:
-        for val in df[col].dropna():
-            val = str(val).strip()
-            if '-' in val:
-                ans = val.split('-')[1].strip()
-            elif '.' in val:
-                ans = val.split('.')[1].strip()
-            else:
-                ans = val
-            answer_key[question_num] = ans
-            question_num += 1
+    """Read a PDF answer key table into a question_number -> answer dict."""
+    from omr_core import keys
 
-    return answer_key
+    return keys.parse_pdf_key(pdf_path)
 
 
 STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
-def load_answer_key(file_path, sheet_name=None):
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in ['.xlsx', '.xls']:
-        # Use existing Excel loader in scoring.py
-        return scoring.load_answer_key(file_path, sheet_name)
-    elif ext == '.pdf':
-        # Load from PDF using pdfplumber
-        return load_answer_key_from_pdf(file_path)
-    else:
-        raise ValueError(f"Unsupported answer key format: {ext}")
-def run_full_pipeline(omr_sheets_folder, answer_key_path):
+PROGRESS_EVERY = 500  # log a progress line every N evaluated sheets
+RESULTS_DATASET = "OMR_Scores.parquet"  # columnar results folder inside the sheets folder
+COMBINED_CSV = "OMR_Scores_All_Sets.csv"  # results of every set of a multi-set run
+REJECTED_CSV = "OMR_Rejected.csv"  # sheets rejected by the pre-flight checks, with the reasons
+def load_answer_key(file_path):
+    """Read an answer key (PDF, XLSX, XLS or CSV) into a question_number -> answer dict, without caching."""
+    from omr_core import keys
+
+    return keys.parse_key_file(file_path)
+def load_or_build_template(template_path, omr_sheets_folder, num_questions, options_per_question=4):
+    """
+    Load a saved bubble layout, or build it from the first sheet in the folder and save it.
+
+    Returns:
+        dict or None: The layout, or None when no reference sheet could be processed.
+    """
+    from omr_core import preprocessing, sources, template
+
+    if os.path.exists(template_path):
+        return template.load_template(template_path)
+
+    for source in sources.iter_sheet_sources(omr_sheets_folder):
+        img = sources.load_sheet(source)
+        if img is None:
+            continue
+        layout = template.build_template(preprocessing.preprocess_array(img), num_questions, options_per_question)
+        if layout['radii'].size:
+            template.save_template(layout, template_path)
+            return layout
+    return None
+
+
+def run_full_pipeline(omr_sheets_folder, answer_key_path, template_path=None, workers=1,
+                      cache_dir=DEFAULT_CACHE_DIR, scoring_rules=None, output_dir=None, progress=None,
+                      exam_set=None, write_parquet=True, sheets=None, write_geometry=True):
+    """
+    Load the answer key, evaluate every sheet, then write the summary and report.
+
+    Args:
+        omr_sheets_folder (str): Folder with the OMR sheet images and/or multi-page PDFs.
+        answer_key_path (str): Answer key file (.pdf, .xlsx, .xls, .csv).
+        template_path (str, optional): Saved bubble layout; built from the first sheet if missing.
+        workers (int, optional): Worker processes for evaluation (None = all cores).
+        cache_dir (str, optional): Fill cache folder, None disables the cache.
+        scoring_rules (dict, optional): weights / negative / multi_mark for scoring.
+        output_dir (str, optional): Folder for report files, cleared first. Defaults to static/.
+        progress (callable, optional): Called with the number of sheets evaluated so far.
+        exam_set (str, optional): Partition name of the Parquet results; defaults to the
+            sheets folder name.
+        write_parquet (bool): Also write the results as Parquet (``OMR_Scores.parquet/``
+            in the sheets folder, see omr_core.results) when pyarrow is installed.
+        sheets (iterable, optional): Sheet sources to evaluate instead of the folder's
+            content, e.g. an archive upload still in progress (omr_core.ingest); the
+            results are still written to ``omr_sheets_folder``.
+        write_geometry (bool): Keep the detection geometry of every sheet in
+            ``OMR_Geometry.zip`` in the sheets folder, for review overlays (omr_core.overlay).
+
+    Returns:
+        tuple: (log text, list of report plot filenames inside output_dir)
+    """
+    from omr_core import evaluation, keys, metrics, overlay, report, results, summary
+    from omr_core.cache import FillCache
+
     logs = []
     plot_filenames = []
+    parquet_writer = None
+    geometry_writer = None
+    output_dir = output_dir or STATIC_DIR
+    metrics_mark = metrics.mark()
 
-    # Clear static folder
-    if os.path.exists(STATIC_DIR):
-        for f in os.listdir(STATIC_DIR):
-            file_path = os.path.join(STATIC_DIR, f)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f"❌ Failed to delete {file_path}: {e}")
-
-    os.makedirs(STATIC_DIR, exist_ok=True)
+    _clear_output_dir(output_dir)
 
     try:
         logs.append("▶️ Loading answer key...")
-        answer_key = load_answer_key(answer_key_path)
-
-        # Convert DataFrame answer_key to dict if needed
-        if isinstance(answer_key, pd.DataFrame):
-            answer_key_dict = {}
-            for idx, row in answer_key.iterrows():
-                q = row['Question'] if 'Question' in row else idx + 1
-                a = row['Answer'] if 'Answer' in row else row[1]
-                answer_key_dict[q] = a
-            answer_key = answer_key_dict
-
-        logs.append("✅ Answer key loaded.")
+        with metrics.stage("answer_key"):
+            key_cache_dir = os.path.join(cache_dir, 'keys') if cache_dir else None
+            compiled_key, key_cached = keys.load_key(answer_key_path, key_cache_dir)
+            answer_key = compiled_key.to_dict()
+
+        logs.append(f"✅ Answer key loaded ({compiled_key.num_questions} questions"
+                    f"{', compiled key from cache' if key_cached else ''}).")
+        for warning in compiled_key.warnings:
+            logs.append(f"⚠️ {warning}")
     except Exception as e:
         logs.append(f"❌ Failed to load answer key: {e}")
         logs.append(traceback.format_exc())
         return ("\n".join(logs), [])
 
+    partial_csv = None
     try:
         logs.append("▶️ Running evaluation on OMR sheets...")
 
-        # <-- Place here -->
-        num_questions = len(answer_key)  # get number of questions
-        df_results = evaluation.evaluate_answers(omr_sheets_folder, num_questions, answer_key)
-        if df_results.empty:
-            logs.append("❌ No valid OMR sheets processed.")
-            return ("\n".join(logs), [])
+        num_questions = compiled_key.num_questions  # get number of questions
 
-        logs.append(f"✅ Evaluation processed {len(df_results)} OMR sheets.")
+        layout = None
+        if template_path:
+            layout = load_or_build_template(template_path, omr_sheets_folder, num_questions)
+            if layout is not None:
+                logs.append(f"✅ Using bubble template {template_path} "
+                            f"({layout['radii'].shape[0]} questions).")
+            else:
+                logs.append("⚠️ Could not build a bubble template, falling back to contour detection.")
 
-        # Save results CSV
+        # Stream results straight into the CSV so memory stays flat for any batch size
         output_csv = os.path.join(omr_sheets_folder, "OMR_Scores.csv")
-        df_results.to_csv(output_csv, index=False)
+        partial_csv = output_csv + ".part"
+        cache = FillCache(cache_dir) if cache_dir else None
+        eval_stats = {}
+        processed = 0
+        accumulator = summary.SummaryAccumulator(answer_key, num_questions)
+        scores = []  # (Student_ID, Total_Score) pairs for the per-student plot of small cohorts
+        if write_parquet:
+            try:
+                parquet_writer = results.ResultsWriter(
+                    os.path.join(omr_sheets_folder, RESULTS_DATASET),
+                    exam_set or os.path.basename(os.path.normpath(omr_sheets_folder)), num_questions)
+            except ImportError as e:
+                logs.append(f"⚠️ {e}; writing CSV results only.")
+        if write_geometry:
+            geometry_writer = overlay.GeometryWriter(omr_sheets_folder)
+        eval_start = time.perf_counter()
+        with metrics.stage("evaluate"):
+            with open(partial_csv, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=evaluation.results_fieldnames(num_questions))
+                writer.writeheader()
+                for entry in evaluation.iter_evaluate(omr_sheets_folder if sheets is None else sheets,
+                                                      num_questions, answer_key,
+                                                      template=layout, workers=workers,
+                                                      cache=cache, stats=eval_stats,
+                                                      scoring_rules=scoring_rules,
+                                                      geometry_writer=geometry_writer):
+                    writer.writerow(entry)
+                    if parquet_writer is not None:
+                        parquet_writer.write(entry)
+                    accumulator.update(entry)
+                    if processed < report.MAX_BAR_STUDENTS:
+                        scores.append((entry['Student_ID'], entry['Total_Score']))
+                    processed += 1
+                    if progress is not None:
+                        progress(processed)
+                    if processed % PROGRESS_EVERY == 0:
+                        logs.append(f"   … {processed} sheets evaluated, "
+                                    f"running average {accumulator.total / processed:.2f}")
+
+        eval_seconds = time.perf_counter() - eval_start
+        _log_preflight(logs, eval_stats, omr_sheets_folder)
+
+        if processed == 0:
+            if parquet_writer is not None:
+                parquet_writer.abort()
+            if geometry_writer is not None:
+                geometry_writer.abort()
+            logs.append("❌ No valid OMR sheets processed.")
+            return ("\n".join(logs), [])
+
+        os.replace(partial_csv, output_csv)
+        if parquet_writer is not None:
+            with metrics.stage("write_parquet"):
+                parquet_path = parquet_writer.close()
+            parquet_writer = None
+            logs.append(f"✅ Columnar results saved to {parquet_path}")
+        if geometry_writer is not None:
+            geometry_writer.close()
+            geometry_writer = None
+        logs.append(f"✅ Evaluation processed {processed} OMR sheets.")
+        if cache is not None:
+            logs.append(f"   Cache: {eval_stats['cache_hits']} hits, {eval_stats['cache_misses']} misses.")
+        if eval_stats['review']:
+            logs.append(f"⚠️ {eval_stats['review']} of {processed} sheets have questions flagged for review "
+                        f"(see the Review column).")
+        rss = evaluation.rss_summary(eval_stats['peak_rss'])
+        if rss:
+            logs.append(f"   Peak RSS per sheet: max {rss['max'] / 1e6:.1f}MB, p50 {rss['p50'] / 1e6:.1f}MB, "
+                        f"p90 {rss['p90'] / 1e6:.1f}MB")
         logs.append(f"✅ Evaluation complete. Scores saved to {output_csv}")
     except Exception as e:
+        if parquet_writer is not None:
+            parquet_writer.abort()
+        if geometry_writer is not None:
+            geometry_writer.abort()
         logs.append(f"❌ Evaluation failed: {e}")
         logs.append(traceback.format_exc())
         return ("\n".join(logs), [])
+    finally:
+        # Left behind only when the run did not complete; the last complete results stay
+        if partial_csv and os.path.exists(partial_csv):
+            os.remove(partial_csv)
 
     try:
         logs.append("▶️ Creating summary...")
-        summary_data = summary.create_summary(output_csv)
-        print("DEBUG summary_data:", summary_data)  # Debug print
+        with metrics.stage("summary"):
+            summary_data = accumulator.result()
 
         if summary_data:
+            summary.print_summary(summary_data)
             logs.append(f"✅ Summary: Avg Score {summary_data['average_score']:.2f}, "
                         f"Max Score {summary_data['max_score']}, "
-                        f"Top Students {summary_data['top_students']}")
+                        f"Top Students {summary.format_top_students(summary_data)}")
         else:
             logs.append("❌ Summary creation skipped.")
     except Exception as e:
@@ -125,22 +225,395 @@ def run_full_pipeline(omr_sheets_folder, answer_key_path):
 
     try:
         logs.append("▶️ Generating report plots...")
-        csv_df = pd.read_csv(output_csv)
-        report_dir = STATIC_DIR
-        csv_report_path, plot_path = report.generate_report(csv_df, summary_data, report_dir, set_name="OMR Results")
-        if plot_path:
-            plot_filenames.append(os.path.basename(plot_path))
-            logs.append(f"✅ Report generated: {plot_path}")
+        plot_filenames.extend(_write_report(logs, summary_data, scores, output_dir, "OMR Results", output_csv,
+                                            workers, cache_dir))
+    except Exception as e:
+        logs.append(f"❌ Report generation failed: {e}")
+        logs.append(traceback.format_exc())
+        return ("\n".join(logs), [])
+
+    if metrics.is_enabled():
+        _log_metrics(logs, output_dir, metrics_mark, processed, eval_seconds, rss)
+
+    return "\n".join(logs), plot_filenames
+
+
+def _set_code(name):
+    """Normalise a set name for matching: "Set_A", "set A", "setA" and "A" all give "a"."""
+    code = re.sub(r'[\s_\-]+', '', str(name)).lower()
+    return code[3:] if code.startswith('set') and len(code) > 3 else code
+
+
+def discover_sets(root, exclude=()):
+    """
+    Find the exam sets under a folder: every subfolder holding sheet images or PDFs.
+
+    Hidden folders (starting with "." or "_") and the folders in ``exclude``, such as
+    a report output folder full of PNG plots, are never sets.
+
+    Returns:
+        dict: set name (the subfolder name, e.g. "Set_A") -> folder path, sorted by name.
+    """
+    from omr_core import sources
+
+    extensions = sources.IMAGE_EXTENSIONS + sources.PDF_EXTENSIONS
+    excluded = {os.path.realpath(path) for path in exclude if path}
+    sets = {}
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if name.startswith(('.', '_')) or os.path.realpath(folder) in excluded:
+            continue
+        if os.path.isdir(folder) and any(f.lower().endswith(extensions) for f in os.listdir(folder)):
+            sets[name] = folder
+    return sets
+
+
+def match_set_keys(sheet_sets, answer_keys):
+    """
+    Pair every exam set with its answer key.
+
+    Set and key names match exactly or after normalisation, so a "Set_A" folder finds
+    the key given for "A", "Set A" or "set_a".
+
+    Returns:
+        tuple: (list of (set_name, folder, key_path), list of set names without a key)
+    """
+    by_code = {_set_code(name): path for name, path in answer_keys.items()}
+    pairs, missing = [], []
+    for set_name, folder in sheet_sets.items():
+        key_path = answer_keys.get(set_name) or by_code.get(_set_code(set_name))
+        if key_path:
+            pairs.append((set_name, folder, key_path))
         else:
-            logs.append("❌ Report generation skipped.")
+            missing.append(set_name)
+    return pairs, missing
+
+
+def run_multi_set_pipeline(sheet_sets, answer_keys, workers=1, cache_dir=DEFAULT_CACHE_DIR, scoring_rules=None,
+                           output_dir=None, results_dir=None, progress=None, template_paths=None,
+                           write_parquet=True, write_geometry=True):
+    """
+    Evaluate several exam sets (e.g. Set A and Set B), each against its own key, in one run.
+
+    All sets go through one worker pool and share the fill and compiled key caches. Each
+    set gets the outputs of run_full_pipeline (``OMR_Scores.csv`` in its folder, a summary
+    and ``<set>_*`` report plots) and the run adds a combined CSV with a ``Set`` column,
+    a combined score report and one Parquet dataset partitioned by set.
+
+    Args:
+        sheet_sets (dict or str): set name -> sheets folder, or a folder whose subfolders
+            are the sets (see discover_sets).
+        answer_keys (dict): set name -> answer key file; names are matched as in
+            match_set_keys. Sets without a key are skipped.
+        workers (int, optional): Worker processes shared by all sets (None = all cores).
+        cache_dir (str, optional): Fill cache folder, None disables the caches.
+        scoring_rules (dict, optional): weights / negative / multi_mark for scoring.
+        output_dir (str, optional): Folder for report files, cleared first. Defaults to static/.
+        results_dir (str, optional): Folder for the combined CSV and the Parquet dataset;
+            defaults to the folder containing the sets.
+        progress (callable, optional): Called with the number of sheets evaluated so far.
+        template_paths (dict, optional): set name -> saved bubble layout, built from the
+            set's first sheet if missing.
+        write_parquet (bool): Also write ``OMR_Scores.parquet/exam_set=<set>/`` when
+            pyarrow is installed.
+        write_geometry (bool): Keep each set's detection geometry in ``OMR_Geometry.zip``
+            in its folder, for review overlays.
+
+    Returns:
+        tuple: (log text, list of report plot filenames inside output_dir)
+    """
+    from omr_core import evaluation, keys, metrics, overlay, report, results, summary
+    from omr_core.cache import FillCache
+
+    logs = []
+    plot_filenames = []
+    output_dir = output_dir or STATIC_DIR
+    metrics_mark = metrics.mark()
+    _clear_output_dir(output_dir)
+
+    if isinstance(sheet_sets, str):
+        sheet_sets = discover_sets(sheet_sets, exclude=(output_dir, cache_dir))
+    pairs, missing = match_set_keys(sheet_sets, answer_keys)
+    for set_name in missing:
+        logs.append(f"⚠️ No answer key for set {set_name}; skipped.")
+    if not pairs:
+        logs.append("❌ No exam set with an answer key to evaluate.")
+        return ("\n".join(logs), [])
+
+    sets = {}
+    key_cache_dir = os.path.join(cache_dir, 'keys') if cache_dir else None
+    for set_name, folder, key_path in pairs:
+        try:
+            with metrics.stage("answer_key"):
+                compiled_key, key_cached = keys.load_key(key_path, key_cache_dir)
+        except Exception as e:
+            logs.append(f"❌ Failed to load answer key of set {set_name}: {e}")
+            logs.append(traceback.format_exc())
+            return ("\n".join(logs), [])
+        logs.append(f"✅ Set {set_name}: answer key loaded ({compiled_key.num_questions} questions"
+                    f"{', compiled key from cache' if key_cached else ''}).")
+        for warning in compiled_key.warnings:
+            logs.append(f"⚠️ Set {set_name}: {warning}")
+        sets[set_name] = {'folder': folder, 'answer_key': compiled_key.to_dict(),
+                          'num_questions': compiled_key.num_questions}
+
+    results_dir = results_dir or os.path.commonpath([os.path.abspath(s['folder']) for s in sets.values()])
+    writers = []
+    try:
+        logs.append(f"▶️ Running evaluation on {len(sets)} exam sets...")
+        templates = {}
+        for set_name, template_path in (template_paths or {}).items():
+            if set_name not in sets:
+                continue
+            layout = load_or_build_template(template_path, sets[set_name]['folder'], sets[set_name]['num_questions'])
+            if layout is not None:
+                templates[set_name] = layout
+                logs.append(f"✅ Set {set_name}: using bubble template {template_path}.")
+            else:
+                logs.append(f"⚠️ Set {set_name}: could not build a bubble template, using contour detection.")
+
+        max_questions = max(s['num_questions'] for s in sets.values())
+        combined_csv = os.path.join(results_dir, COMBINED_CSV)
+        combined_file = open(combined_csv + ".part", 'w', newline='', encoding='utf-8')
+        writers.append(combined_file)
+        combined_writer = csv.DictWriter(combined_file, fieldnames=['Set', *evaluation.results_fieldnames(max_questions)])
+        combined_writer.writeheader()
+        # Questions differ between sets, so the combined summary only covers scores
+        combined = summary.SummaryAccumulator(num_questions=0)
+        combined_scores = []
+
+        for set_name, state in sets.items():
+            state['csv'] = os.path.join(state['folder'], "OMR_Scores.csv")
+            state['file'] = open(state['csv'] + ".part", 'w', newline='', encoding='utf-8')
+            writers.append(state['file'])
+            state['writer'] = csv.DictWriter(state['file'],
+                                             fieldnames=evaluation.results_fieldnames(state['num_questions']))
+            state['writer'].writeheader()
+            state['accumulator'] = summary.SummaryAccumulator(state['answer_key'], state['num_questions'])
+            state['scores'] = []
+            state['parquet'] = None
+            if write_parquet:
+                try:
+                    state['parquet'] = results.ResultsWriter(os.path.join(results_dir, RESULTS_DATASET), set_name,
+                                                             state['num_questions'])
+                except ImportError as e:
+                    logs.append(f"⚠️ {e}; writing CSV results only.")
+                    write_parquet = False
+            state['geometry'] = overlay.GeometryWriter(state['folder']) if write_geometry else None
+
+        cache = FillCache(cache_dir) if cache_dir else None
+        eval_stats = {}
+        processed = 0
+        eval_start = time.perf_counter()
+        with metrics.stage("evaluate"):
+            for set_name, entry in evaluation.iter_evaluate_sets(
+                    [(name, state['folder'], state['answer_key'], state['num_questions'])
+                     for name, state in sets.items()],
+                    templates=templates, workers=workers, cache=cache, stats=eval_stats,
+                    scoring_rules=scoring_rules,
+                    geometry_writers={name: state['geometry'] for name, state in sets.items()}):
+                state = sets[set_name]
+                state['writer'].writerow(entry)
+                combined_writer.writerow({'Set': set_name, **entry})
+                if state['parquet'] is not None:
+                    state['parquet'].write(entry)
+                state['accumulator'].update(entry)
+                student = f"{set_name}/{entry['Student_ID']}"
+                combined.update({'Student_ID': student, 'Total_Score': entry['Total_Score']})
+                if state['accumulator'].count <= report.MAX_BAR_STUDENTS:
+                    state['scores'].append((entry['Student_ID'], entry['Total_Score']))
+                if processed < report.MAX_BAR_STUDENTS:
+                    combined_scores.append((student, entry['Total_Score']))
+                processed += 1
+                if progress is not None:
+                    progress(processed)
+                if processed % PROGRESS_EVERY == 0:
+                    logs.append(f"   … {processed} sheets evaluated")
+        eval_seconds = time.perf_counter() - eval_start
+
+        for f in writers:
+            f.close()
+        for set_name, state in sets.items():
+            count = state['accumulator'].count
+            _log_preflight(logs, eval_stats[set_name], state['folder'], f"Set {set_name}: ")
+            if count == 0:
+                if state['parquet'] is not None:
+                    state['parquet'].abort()
+                if state['geometry'] is not None:
+                    state['geometry'].abort()
+                    state['geometry'] = None
+                logs.append(f"❌ Set {set_name}: no valid OMR sheets processed.")
+                continue
+            os.replace(state['csv'] + ".part", state['csv'])
+            if state['parquet'] is not None:
+                with metrics.stage("write_parquet"):
+                    state['parquet'].close()
+            if state['geometry'] is not None:
+                state['geometry'].close()
+                state['geometry'] = None
+            stats = eval_stats[set_name]
+            logs.append(f"✅ Set {set_name}: {count} sheets evaluated, scores saved to {state['csv']}")
+            if stats['review']:
+                logs.append(f"⚠️ Set {set_name}: {stats['review']} sheets have questions flagged for review.")
+            if cache is not None:
+                logs.append(f"   Cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses.")
+
+        if processed == 0:
+            logs.append("❌ No valid OMR sheets processed.")
+            return ("\n".join(logs), [])
+        os.replace(combined_csv + ".part", combined_csv)
+        if write_parquet:
+            logs.append(f"✅ Columnar results saved to {os.path.join(results_dir, RESULTS_DATASET)}")
+        logs.append(f"✅ Evaluation processed {processed} OMR sheets in {len(sets)} sets. "
+                    f"Combined scores saved to {combined_csv}")
+        rss = evaluation.rss_summary([v for stats in eval_stats.values() for v in stats['peak_rss']])
+    except Exception as e:
+        for f in writers:
+            f.close()
+        for state in sets.values():
+            if state.get('parquet') is not None:
+                state['parquet'].abort()
+            if state.get('geometry') is not None:
+                state['geometry'].abort()
+        logs.append(f"❌ Evaluation failed: {e}")
+        logs.append(traceback.format_exc())
+        return ("\n".join(logs), [])
+    finally:
+        # CSVs of a run that did not complete (or of sets without sheets); the last
+        # complete results stay
+        for f in writers:
+            if os.path.exists(f.name):
+                os.remove(f.name)
+
+    try:
+        logs.append("▶️ Creating summaries and reports...")
+        # The plots of every report are rendered together, in parallel when there are enough
+        deferred_plots = []
+        for set_name, state in sets.items():
+            summary_data = state['accumulator'].result()
+            if not summary_data:
+                continue
+            logs.append(f"✅ Set {set_name}: Avg Score {summary_data['average_score']:.2f}, "
+                        f"Max Score {summary_data['max_score']}, Top Students {summary.format_top_students(summary_data)}")
+            plot_filenames.extend(_write_report(logs, summary_data, state['scores'], output_dir, set_name,
+                                                state['csv'], workers, cache_dir, deferred_plots))
+
+        combined_summary = combined.result()
+        summary.print_summary(combined_summary)
+        logs.append(f"✅ All sets: Avg Score {combined_summary['average_score']:.2f}, "
+                    f"Max Score {combined_summary['max_score']}, "
+                    f"Top Students {summary.format_top_students(combined_summary)}")
+        plot_filenames.extend(_write_report(logs, combined_summary, combined_scores, output_dir, "All Sets",
+                                            combined_csv, workers, cache_dir, deferred_plots))
+        with metrics.stage("report"):
+            paths, hits = report.render_plots(deferred_plots, output_dir, workers, _plot_cache_dir(cache_dir))
+        logs.append(f"✅ Report generated: {len(paths)} plots in {output_dir} ({hits} from cache)")
     except Exception as e:
         logs.append(f"❌ Report generation failed: {e}")
         logs.append(traceback.format_exc())
         return ("\n".join(logs), [])
 
+    if metrics.is_enabled():
+        _log_metrics(logs, output_dir, metrics_mark, processed, eval_seconds, rss)
+
     return "\n".join(logs), plot_filenames
 
 
+def _clear_output_dir(output_dir):
+    """Empty the report folder (creating it if needed)."""
+    if os.path.exists(output_dir):
+        for f in os.listdir(output_dir):
+            file_path = os.path.join(output_dir, f)
+            try:
+                if os.path.isfile(file_path) or os.path.islink(file_path):
+                    os.unlink(file_path)
+                elif os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+            except Exception as e:
+                print(f"❌ Failed to delete {file_path}: {e}")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def _write_report(logs, summary_data, scores, output_dir, set_name, results_csv, workers, cache_dir,
+                  deferred_plots=None):
+    """
+    Render the report of one set of results and log it.
+
+    Args:
+        scores (list): (Student_ID, Total_Score) pairs of the first report.MAX_BAR_STUDENTS sheets.
+        deferred_plots (list, optional): Collects the plot specs instead of rendering them,
+            see report.generate_report.
+
+    Returns:
+        list: Plot filenames inside ``output_dir``.
+    """
+    from omr_core import metrics, report
+
+    scores_df = None
+    if summary_data and summary_data['total_students'] <= report.MAX_BAR_STUDENTS:
+        import pandas as pd
+
+        scores_df = pd.DataFrame(scores, columns=['Student_ID', 'Total_Score'])
+    plot_paths = []
+    with metrics.stage("report"):
+        report.generate_report(scores_df, summary_data, output_dir, set_name=set_name, results_csv=results_csv,
+                               workers=workers, cache_dir=_plot_cache_dir(cache_dir), plot_paths=plot_paths,
+                               deferred_plots=deferred_plots)
+    if plot_paths:
+        if deferred_plots is None:
+            logs.append(f"✅ Report generated: {len(plot_paths)} plots in {output_dir}")
+        return [os.path.basename(path) for path in plot_paths]
+    logs.append("❌ Report generation skipped.")
+    return []
+
+
+def _plot_cache_dir(cache_dir):
+    return os.path.join(cache_dir, 'plots') if cache_dir else None
+
+
+def _log_preflight(logs, stats, folder, prefix=""):
+    """
+    Write the sheets rejected by the pre-flight checks to REJECTED_CSV and log the compute saved.
+
+    A rejected-sheets list left in ``folder`` by an earlier run is removed first.
+    """
+    from omr_core import evaluation
+
+    rejected_csv = os.path.join(folder, REJECTED_CSV)
+    if os.path.exists(rejected_csv):
+        os.remove(rejected_csv)
+    checks = evaluation.preflight_summary(stats)
+    if checks is None:
+        return
+    if stats['rejected']:
+        with open(rejected_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Student_ID', 'Reasons'])
+            writer.writerows((name, "; ".join(reasons)) for name, reasons in stats['rejected'])
+        logs.append(f"🚫 {prefix}{checks['rejected']} sheets rejected by the pre-flight checks, "
+                    f"reasons in {rejected_csv}")
+    if checks['saved_seconds'] is None:
+        saved = "no sheet fully processed to estimate the savings"
+    else:
+        saved = f"~{checks['saved_seconds']:.2f}s of full processing skipped"
+    logs.append(f"   {prefix}Pre-flight checks: {checks['preflight_seconds']:.2f}s spent, {saved}.")
+
+
+def _log_metrics(logs, output_dir, metrics_mark, processed, eval_seconds, rss=None):
+    """Add per-stage timings of this run to the logs and write them to metrics.json."""
+    from omr_core import metrics
+
+    stats = metrics.summary(since=metrics_mark)
+    throughput = processed / eval_seconds if eval_seconds > 0 else 0.0
+    logs.append(f"⏱️ Throughput: {throughput:.1f} sheets/s ({processed} sheets in {eval_seconds:.2f}s)")
+    logs.extend(metrics.format_summary(stats))
+    metrics_path = os.path.join(output_dir, "metrics.json")
+    metrics.write_json(metrics_path, stats, sheets=processed, evaluate_seconds=eval_seconds,
+                       sheets_per_second=throughput, sheet_peak_rss_bytes=rss)
+    logs.append(f"✅ Metrics saved to {metrics_path}")
+
+
     
 
 
@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
 import os
+import struct
+import threading
+
+from . import metrics
 
 def order_points(pts):
     rect = np.zeros((4, 2), dtype="float32")
@@ -15,33 +19,177 @@ def order_points(pts):
 
     return rect
 
-def correct_perspective(img, debug=False):
+# Longest side (in pixels) of the copy used to find the document corners.
+# Corner detection does not need full resolution; None disables downscaling.
+DETECT_MAX_DIM = 1000
+
+# Global threshold separating pencil marks from paper (inverted binary)
+THRESHOLD_VALUE = 150
+
+# "adaptive" compares every pixel with the mean of its neighbourhood, which copes with
+# shadows and uneven lighting; "global" uses THRESHOLD_VALUE for the whole sheet.
+THRESHOLD_METHOD = os.environ.get('OMR_THRESHOLD', 'adaptive')
+# Adaptive neighbourhood as a fraction of the longer sheet side (kept larger than a
+# filled bubble so bubble interiors are compared with the surrounding paper)
+ADAPTIVE_BLOCK_FRACTION = 0.05
+# How much darker than its neighbourhood a pixel must be to count as a mark
+ADAPTIVE_OFFSET = 15
+
+# Side of the morphological opening that removes specks after thresholding, at full
+# resolution; scaled down with the decode factor so thin bubble outlines survive
+NOISE_KERNEL = 3
+
+# Images whose longest side is at least twice this size are decoded at half resolution
+# directly by the decoder. Off by default (full resolution); set OMR_DECODE_MAX_DIM to
+# opt in. The reduction is capped at 1/2 so bubbles stay large enough to detect.
+DECODE_MAX_DIM = int(os.environ.get('OMR_DECODE_MAX_DIM', 0)) or None
+
+_REDUCED_FLAGS = ((2, cv2.IMREAD_REDUCED_GRAYSCALE_2),)
+
+# JPEG start-of-frame markers that carry the image size
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_buffers = threading.local()
+
+
+def image_size(data):
+    """
+    Read (width, height) from the header of JPEG or PNG bytes without decoding.
+
+    Returns:
+        tuple or None: (width, height), or None for other formats or malformed headers.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode_image(data, max_dim=DECODE_MAX_DIM, info=None):
+    """
+    Decode encoded image bytes straight to a single-channel grayscale array.
+
+    When the header shows the image is at least twice ``max_dim`` on its longest
+    side, the decoder's reduced-size mode is used so the full-resolution buffer is
+    never allocated. An ``info`` dict receives the reduction ``factor`` (1 for a
+    full-resolution decode), e.g. to scale pixel sizes measured on the result.
+
+    Returns:
+        numpy array or None: Grayscale uint8 image, None if the bytes cannot be decoded.
+    """
+    flag = cv2.IMREAD_GRAYSCALE
+    factor = 1
+    size = image_size(data) if max_dim else None
+    if size:
+        longest = max(size)
+        for reduced_factor, reduced_flag in _REDUCED_FLAGS:
+            if longest >= reduced_factor * max_dim:
+                flag, factor = reduced_flag, reduced_factor
+                break
+    if info is not None:
+        info['factor'] = factor
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+
+
+def load_image(img_path, max_dim=DECODE_MAX_DIM, info=None):
+    """Read an image file with decode_image (grayscale, optionally reduced size for very large images)."""
+    try:
+        with open(img_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return decode_image(data, max_dim, info)
+
+
+def work_buffer(name, shape, dtype=np.uint8):
+    """
+    Return a reusable per-thread array for intermediate results.
+
+    The array is kept between calls and only reallocated when the requested shape
+    changes, so a worker processing similar sheets does not allocate fresh
+    full-size buffers for every sheet.
+    """
+    cache = getattr(_buffers, 'arrays', None)
+    if cache is None:
+        cache = _buffers.arrays = {}
+    buf = cache.get(name)
+    if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+        buf = cache[name] = np.empty(shape, dtype=dtype)
+    return buf
+
+
+def find_document_corners(img, detect_max_dim=DETECT_MAX_DIM):
+    """
+    Find the four corners of the OMR sheet in a photo or scan.
+
+    Edges and contours are computed on a copy downscaled so its longest side is
+    at most ``detect_max_dim`` pixels; the quadrilateral is scaled back to the
+    original resolution.
+
+    Returns:
+        numpy array or None: (4, 2) float32 corner points in original image
+        coordinates, or None when no four-sided contour is found.
+    """
     # Convert to grayscale and blur
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    scale = 1.0
+    longest = max(gray.shape[:2])
+    if detect_max_dim and longest > detect_max_dim:
+        scale = detect_max_dim / float(longest)
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
     blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    
+
     # Edge detection
     edges = cv2.Canny(blur, 75, 200)
 
-    # Find contours
+    # Find contours and keep the 5 largest (partial selection, no full sort)
     contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-    contours = sorted(contours, key=cv2.contourArea, reverse=True)[:5]
+    if len(contours) > 5:
+        areas = np.array([cv2.contourArea(c) for c in contours])
+        top = np.argpartition(areas, -5)[-5:]
+        top = top[np.argsort(-areas[top], kind="stable")]
+        contours = [contours[i] for i in top]
+    else:
+        contours = sorted(contours, key=cv2.contourArea, reverse=True)
 
     # Find a contour with 4 points
-    doc_cnt = None
     for cnt in contours:
         peri = cv2.arcLength(cnt, True)
         approx = cv2.approxPolyDP(cnt, 0.02 * peri, True)
         if len(approx) == 4:
-            doc_cnt = approx
-            break
+            return approx.reshape(4, 2).astype("float32") / scale
 
-    if doc_cnt is None:
-        print("No document contour found. Returning original image.")
-        return img
+    return None
+
+
+def perspective_transform(corners):
+    """
+    Homography mapping a photographed sheet onto its top-down view.
 
-    pts = doc_cnt.reshape(4, 2)
-    rect = order_points(pts)
+    Args:
+        corners (numpy array): (4, 2) document corners, e.g. from find_document_corners.
+
+    Returns:
+        tuple: (3x3 float matrix, (width, height) of the top-down view).
+    """
+    rect = order_points(corners)
     (tl, tr, br, bl) = rect
 
     # Compute width and height of new image
@@ -61,9 +209,36 @@ def correct_perspective(img, debug=False):
         [0, maxHeight - 1]
     ], dtype="float32")
 
+    return cv2.getPerspectiveTransform(rect, dst), (maxWidth, maxHeight)
+
+
+def correct_perspective(img, debug=False, detect_max_dim=DETECT_MAX_DIM, reuse_buffers=False, geometry=None):
+    """
+    Warp a photographed sheet to a top-down view of the document.
+
+    With a ``geometry`` dict, the ``homography`` from ``img`` to the returned image and
+    its ``size`` (width, height) are stored in it (the identity when no document
+    contour is found).
+    """
+    doc_pts = find_document_corners(img, detect_max_dim)
+
+    if doc_pts is None:
+        print("No document contour found. Returning original image.")
+        if geometry is not None:
+            geometry['homography'] = np.eye(3)
+            geometry['size'] = (img.shape[1], img.shape[0])
+        return img
+
     # Perspective transform
-    M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(img, M, (maxWidth, maxHeight))
+    M, (maxWidth, maxHeight) = perspective_transform(doc_pts)
+    if geometry is not None:
+        geometry['homography'] = M
+        geometry['size'] = (maxWidth, maxHeight)
+    if reuse_buffers:
+        out = work_buffer("warped", (maxHeight, maxWidth) + img.shape[2:])
+        warped = cv2.warpPerspective(img, M, (maxWidth, maxHeight), dst=out)
+    else:
+        warped = cv2.warpPerspective(img, M, (maxWidth, maxHeight))
 
     if debug:
         cv2.imshow("Warped Image", warped)
@@ -72,24 +247,78 @@ def correct_perspective(img, debug=False):
 
     return warped
 
-def preprocess_image(img_path):
-    """Preprocess a single OMR image: correct perspective, grayscale, threshold, noise removal."""
-    img = cv2.imread(img_path)
-    if img is None:
-        print("Error loading image:", img_path)
-        return None
+def threshold_sheet(gray, method=None, dst=None):
+    """
+    Binarise a grayscale sheet so marks and printing become white on black.
+
+    Args:
+        gray (numpy array): Grayscale sheet.
+        method (str, optional): "global" or "adaptive"; defaults to THRESHOLD_METHOD.
+        dst (numpy array, optional): Output buffer of the same shape.
+
+    Returns:
+        numpy array: Inverted binary image.
+    """
+    method = method or THRESHOLD_METHOD
+    if method == 'adaptive':
+        block = int(max(gray.shape[:2]) * ADAPTIVE_BLOCK_FRACTION) | 1
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV,
+                                     max(block, 3), ADAPTIVE_OFFSET, dst=dst)
+    if method != 'global':
+        raise ValueError(f"Unknown threshold method: {method}")
+    _, thresh = cv2.threshold(gray, THRESHOLD_VALUE, 255, cv2.THRESH_BINARY_INV, dst=dst)
+    return thresh
+
 
+def preprocess_array(img, reuse_buffers=False, geometry=None, decode_factor=1):
+    """
+    Preprocess a decoded OMR image (BGR or grayscale array): correct perspective, grayscale, threshold, noise removal.
+
+    With ``reuse_buffers`` the warped and thresholded images are written into
+    per-thread work buffers; the returned array is then only valid until the next
+    call in the same thread. A ``geometry`` dict receives the perspective correction
+    (see correct_perspective). ``decode_factor`` is the reduction applied by
+    decode_image and scales the noise removal.
+    """
     # Correct perspective distortion
-    corrected_img = correct_perspective(img)
+    with metrics.stage("correct_perspective"):
+        corrected_img = correct_perspective(img, reuse_buffers=reuse_buffers, geometry=geometry)
+
+    with metrics.stage("threshold"):
+        # Convert to grayscale
+        gray = corrected_img if corrected_img.ndim == 2 else cv2.cvtColor(corrected_img, cv2.COLOR_BGR2GRAY)
 
-    # Convert to grayscale
-    gray = cv2.cvtColor(corrected_img, cv2.COLOR_BGR2GRAY)
+        thresh = work_buffer("thresh", gray.shape) if reuse_buffers else None
+        thresh_clean = work_buffer("thresh_clean", gray.shape) if reuse_buffers else None
 
-    # Apply thresholding (invert binary)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
+        # Apply thresholding (invert binary)
+        thresh = threshold_sheet(gray, dst=thresh)
 
-    # Remove small noise using morphology
-    kernel = np.ones((3, 3), np.uint8)
-    thresh_clean = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
+        # Remove small noise using morphology
+        side = max(1, int(round(NOISE_KERNEL / float(decode_factor))))
+        kernel = np.ones((side, side), np.uint8)
+        thresh_clean = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, dst=thresh_clean)
 
     return thresh_clean
+
+
+def preprocess_image(img_path, max_dim=DECODE_MAX_DIM):
+    """Preprocess a single OMR image: correct perspective, grayscale, threshold, noise removal."""
+    info = {}
+    with metrics.stage("imread"):
+        img = load_image(img_path, max_dim, info)
+    if img is None:
+        print("Error loading image:", img_path)
+        return None
+
+    return preprocess_array(img, decode_factor=info['factor'])
+
+
+def preprocessing_params():
+    """Settings that change the preprocessed output, e.g. for cache keys."""
+    params = {'threshold': THRESHOLD_VALUE, 'detect_max_dim': DETECT_MAX_DIM,
+              'decode': 'grayscale', 'decode_max_dim': DECODE_MAX_DIM, 'noise_kernel': NOISE_KERNEL}
+    if THRESHOLD_METHOD != 'global':
+        params.update(threshold_method=THRESHOLD_METHOD, adaptive_block=ADAPTIVE_BLOCK_FRACTION,
+                      adaptive_offset=ADAPTIVE_OFFSET)
+    return params
@@ -0,0 +1,168 @@
+import os
+
+import cv2
+import numpy as np
+
+from .preprocessing import find_document_corners, perspective_transform, threshold_sheet
+
+# Every sheet is checked before the full pipeline; set OMR_PREFLIGHT=0 to score all sheets
+PREFLIGHT = os.environ.get('OMR_PREFLIGHT', '1') != '0'
+
+# Longest side (in pixels) of the thumbnail the pre-flight checks run on
+THUMBNAIL_MAX_DIM = 500
+
+# Variance of the thumbnail's Laplacian below which a sheet is too blurry to read
+# (sharp photos and scans measure several hundred to several thousand)
+MIN_SHARPNESS = 100
+
+# Mean gray level below which a sheet is too dark to separate marks from the paper
+MIN_BRIGHTNESS = 50
+# Share of pixels clipped to white above which the marks are washed out
+MAX_CLIPPED_WHITE = 0.95
+# Gray level standard deviation below which the image is blank
+MIN_CONTRAST = 10
+
+# A document outline covering less of the frame than this is a wrong contour (page cut
+# off, a box printed on the sheet, another object); the perspective warp would crop to it
+MIN_DOCUMENT_COVERAGE = 0.2
+
+# Share of the expected bubbles (questions x options) that must be visible on the thumbnail
+MIN_BUBBLE_FRACTION = 0.5
+# Bubbles are counted on a copy no smaller than this many pixels per smallest bubble side;
+# on the 500px thumbnail of a dense sheet they shrink to a few pixels and blur together
+BUBBLE_COUNT_MIN_SIZE = 10
+
+
+def preflight_params():
+    """Thresholds of the pre-flight checks; sheets cached after passing them are valid for these only."""
+    # Imported here: evaluation imports this module
+    from .evaluation import BUBBLE_MIN_SIZE
+
+    return {'thumbnail_max_dim': THUMBNAIL_MAX_DIM, 'min_sharpness': MIN_SHARPNESS,
+            'min_brightness': MIN_BRIGHTNESS, 'max_clipped_white': MAX_CLIPPED_WHITE,
+            'min_contrast': MIN_CONTRAST, 'min_document_coverage': MIN_DOCUMENT_COVERAGE,
+            'min_bubble_fraction': MIN_BUBBLE_FRACTION, 'bubble_min_size': BUBBLE_MIN_SIZE,
+            'bubble_count_min_size': BUBBLE_COUNT_MIN_SIZE}
+
+
+class SheetRejected(Exception):
+    """Raised for a sheet that failed the pre-flight checks; ``reasons`` lists every failed check."""
+
+    def __init__(self, reasons):
+        super().__init__("; ".join(reasons))
+        self.reasons = reasons
+
+
+def make_thumbnail(gray, max_dim=THUMBNAIL_MAX_DIM):
+    """
+    Downscale a sheet so its longest side is at most ``max_dim`` pixels.
+
+    Returns:
+        tuple: (thumbnail, scale) where ``scale`` maps full-resolution to thumbnail pixels.
+    """
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    longest = max(gray.shape[:2])
+    if longest <= max_dim:
+        return gray, 1.0
+    scale = max_dim / float(longest)
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+
+def _document_region(gray, corners):
+    # The same top-down warp as preprocessing.correct_perspective, at the size of ``gray``
+    matrix, (width, height) = perspective_transform(corners)
+    if width < 2 or height < 2:
+        return None
+    return cv2.warpPerspective(gray, matrix, (width, height))
+
+
+def count_bubbles(region, min_size):
+    """Count the roughly square blobs of at least ``min_size`` pixels in a grayscale sheet region."""
+    contours, _ = cv2.findContours(threshold_sheet(region), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    count = 0
+    for c in contours:
+        _, _, w, h = cv2.boundingRect(c)
+        if w >= min_size and h >= min_size and 0.8 <= w / float(h) <= 1.2:
+            count += 1
+    return count
+
+
+def check_sheet(img, num_questions, options_per_question=4, max_dim=THUMBNAIL_MAX_DIM, decode_factor=1):
+    """
+    Run the pre-flight quality checks of a decoded sheet on a thumbnail.
+
+    The checks cost a few milliseconds and catch sheets the full pipeline would spend
+    its time on only to produce garbage answers: blurry photos (Laplacian variance),
+    dark, washed-out or blank images (exposure), photos where the document outline
+    found is a small part of the frame (wrong page or cut off) and sheets where far
+    fewer bubbles are visible than the answer key expects. Bubbles are counted on a
+    larger copy when the thumbnail would shrink evaluation.BUBBLE_MIN_SIZE bubbles
+    below BUBBLE_COUNT_MIN_SIZE.
+
+    Args:
+        img (numpy array): Decoded sheet (grayscale or BGR) at the resolution the
+            pipeline would process.
+        num_questions (int): Number of questions on the sheet.
+        options_per_question (int): Number of options per question.
+        max_dim (int): Longest side of the thumbnail.
+        decode_factor (int): Reduction applied when decoding ``img`` (see
+            preprocessing.decode_image), so bubbles are that much smaller.
+
+    Returns:
+        dict: ``ok`` (all checks passed), ``reasons`` (one message per failed check) and
+        the measurements ``sharpness``, ``brightness``, ``contrast``, ``clipped_white``,
+        ``document_coverage`` (share of the frame inside the document outline, None when
+        no outline was found), ``bubbles`` and ``expected_bubbles``.
+    """
+    from .evaluation import BUBBLE_MIN_SIZE
+
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    thumb, scale = make_thumbnail(gray, max_dim)
+    reasons = []
+
+    sharpness = float(cv2.Laplacian(thumb, cv2.CV_64F).var())
+    brightness, contrast = (float(v[0][0]) for v in cv2.meanStdDev(thumb))
+    clipped_white = float(np.count_nonzero(thumb >= 250)) / thumb.size
+    if contrast < MIN_CONTRAST:
+        reasons.append(f"blank or uniform image (contrast {contrast:.1f} < {MIN_CONTRAST})")
+    elif sharpness < MIN_SHARPNESS:
+        reasons.append(f"blurry (sharpness {sharpness:.0f} < {MIN_SHARPNESS})")
+    if brightness < MIN_BRIGHTNESS:
+        reasons.append(f"underexposed (mean brightness {brightness:.0f} < {MIN_BRIGHTNESS})")
+    if clipped_white > MAX_CLIPPED_WHITE:
+        reasons.append(f"overexposed ({clipped_white:.0%} of the image is white)")
+
+    # Without an outline the pipeline reads the whole frame (e.g. flatbed scans)
+    bubble_size = BUBBLE_MIN_SIZE / float(decode_factor)
+    count_scale = min(1.0, max(scale, BUBBLE_COUNT_MIN_SIZE / bubble_size))
+    if count_scale == scale:
+        counted = thumb
+    else:
+        counted = cv2.resize(gray, None, fx=count_scale, fy=count_scale, interpolation=cv2.INTER_AREA)
+
+    region, coverage = counted, None
+    corners = find_document_corners(thumb, None)
+    if corners is not None:
+        coverage = float(cv2.contourArea(corners)) / thumb.size
+        if coverage < MIN_DOCUMENT_COVERAGE:
+            reasons.append(f"document outline covers only {coverage:.0%} of the image "
+                           f"(wrong page or sheet cut off)")
+        region = _document_region(counted, corners * (count_scale / scale))
+
+    expected = num_questions * options_per_question
+    bubbles = 0 if region is None else count_bubbles(region, max(2, int(bubble_size * count_scale)))
+    if bubbles < MIN_BUBBLE_FRACTION * expected:
+        reasons.append(f"found {bubbles} of {expected} expected bubbles")
+
+    return {
+        'ok': not reasons,
+        'reasons': reasons,
+        'sharpness': sharpness,
+        'brightness': brightness,
+        'contrast': contrast,
+        'clipped_white': clipped_white,
+        'document_coverage': coverage,
+        'bubbles': bubbles,
+        'expected_bubbles': expected,
+    }
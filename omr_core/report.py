@@ -1,31 +1,299 @@
+import hashlib
+import json
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
-sns.set(style="whitegrid")
+# Cohorts up to this size get one bar per student; larger ones only aggregate views
+MAX_BAR_STUDENTS = 50
 
-def generate_report(df, summary_data, output_dir, set_name="Set"):
-    if df.empty:
+# Score histograms with more distinct scores than this are re-binned
+MAX_HISTOGRAM_BARS = 60
+
+# Bump when the drawing code changes so cached plots are re-rendered
+PLOT_CACHE_VERSION = 1
+
+# Rendered plots kept in the plot cache; the oldest are removed beyond this
+MAX_CACHED_PLOTS = 500
+
+# Fewer uncached plots than this are drawn in-process: each plot takes ~0.2 s, while a
+# pool worker spends longer than that starting up and importing matplotlib. A single
+# report has at most three plots, so multi-set runs render every report's plots in one
+# render_plots call (see generate_report's ``deferred_plots``).
+PARALLEL_MIN_PLOTS = 8
+
+
+def _new_figure(width, height):
+    # The object-oriented Figure API needs no pyplot state or GUI backend, so it is
+    # safe in the web process and in pool workers; PNGs are written with Agg.
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(width, height))
+    return fig, fig.add_subplot()
+
+
+def _draw_scores(ax, data):
+    from matplotlib import colormaps
+
+    students, scores = data['students'], data['scores']
+    cmap = colormaps['viridis']
+    colors = [cmap(i / max(len(scores) - 1, 1)) for i in range(len(scores))]
+    ax.bar(range(len(scores)), scores, color=colors)
+    ax.set_xticks(range(len(scores)))
+    ax.set_xticklabels(students, rotation=45, ha='right')
+    ax.set_xlabel("Student_ID")
+    ax.set_ylabel("Total_Score")
+
+
+def _draw_histogram(ax, data):
+    import numpy as np
+
+    values = np.asarray(data['scores'], dtype=float)
+    counts = np.asarray(data['counts'], dtype=float)
+    if values.size > MAX_HISTOGRAM_BARS:
+        counts, edges = np.histogram(values, bins=MAX_HISTOGRAM_BARS, weights=counts)
+        values = (edges[:-1] + edges[1:]) / 2
+        width = edges[1] - edges[0]
+    else:
+        width = float(np.diff(values).min()) * 0.8 if values.size > 1 else 0.8
+    ax.bar(values, counts, width=width, color="#3b75af")
+    ax.axvline(data['mean'], color="#d62728", linestyle="--", label=f"mean {data['mean']:.2f}")
+    ax.legend()
+    ax.set_xlabel("Total_Score")
+    ax.set_ylabel("Students")
+
+
+def _draw_difficulty(ax, data):
+    from matplotlib import colormaps
+
+    rates = [r * 100 for r in data['rates']]
+    cmap = colormaps['RdYlGn']
+    ax.bar(range(1, len(rates) + 1), rates, color=[cmap(r / 100) for r in rates], width=1.0 if len(rates) > 60 else 0.8)
+    ax.set_ylim(0, 100)
+    ax.set_xlim(0.5, len(rates) + 0.5)
+    ax.set_xlabel("Question")
+    ax.set_ylabel("% correct")
+
+
+def _draw_options(ax, data):
+    import numpy as np
+
+    counts = np.asarray(data['counts'], dtype=float)
+    shares = counts / max(data['students'], 1) * 100
+    image = ax.imshow(shares.T, aspect='auto', cmap='Blues', vmin=0, vmax=100, interpolation='nearest',
+                      extent=(0.5, shares.shape[0] + 0.5, shares.shape[1] - 0.5, -0.5))
+    ax.set_yticks(range(len(data['labels'])))
+    ax.set_yticklabels(data['labels'])
+    ax.set_xlabel("Question")
+    ax.figure.colorbar(image, ax=ax, label="% of students")
+
+
+_DRAW = {
+    'scores': (_draw_scores, (12, 6)),
+    'histogram': (_draw_histogram, (10, 6)),
+    'difficulty': (_draw_difficulty, (12, 5)),
+    'options': (_draw_options, (12, 4)),
+}
+
+
+def plot_specs(summary_data, scores_df=None, set_name="Set"):
+    """
+    Choose the report plots for a cohort and collect the aggregates they are drawn from.
+
+    Cohorts of at most MAX_BAR_STUDENTS students (with their scores given) get a bar
+    per student; larger cohorts get a score histogram instead. Cohorts with per-question
+    aggregates also get the difficulty and option distribution plots.
+
+    Args:
+        summary_data (dict): Output of SummaryAccumulator.result(), or of
+            summary.create_summary (no aggregates; the histogram is counted from
+            ``scores_df`` and skipped without it).
+        scores_df (pandas.DataFrame, optional): Student_ID and Total_Score per student.
+        set_name (str): Prefix for the plot titles and file names.
+
+    Returns:
+        list: (kind, filename, data) tuples; ``data`` is JSON-serialisable.
+    """
+    specs = []
+    students = summary_data['total_students']
+    if scores_df is not None and not scores_df.empty and students <= MAX_BAR_STUDENTS:
+        specs.append(('scores', f"{set_name}_score_plot.png", {
+            'title': f"Total Scores - {set_name}",
+            'students': scores_df['Student_ID'].astype(str).tolist(),
+            'scores': [float(s) for s in scores_df['Total_Score']],
+        }))
+    else:
+        histogram = summary_data.get('histogram')
+        if histogram is None and scores_df is not None and not scores_df.empty:
+            histogram = scores_df['Total_Score'].value_counts().sort_index().to_dict()
+        if histogram:
+            specs.append(('histogram', f"{set_name}_score_histogram.png", {
+                'title': f"Score distribution - {set_name} ({students} students)",
+                'scores': [float(s) for s in histogram],
+                'counts': [int(c) for c in histogram.values()],
+                'mean': float(summary_data['average_score']),
+            }))
+
+    option_counts = summary_data.get('option_counts')
+    if option_counts is not None and len(option_counts):
+        specs.append(('difficulty', f"{set_name}_question_difficulty.png", {
+            'title': f"Question difficulty - {set_name}",
+            'rates': [float(r) for r in summary_data['question_correct_rate']],
+        }))
+        options = option_counts.shape[1] - 2
+        specs.append(('options', f"{set_name}_option_distribution.png", {
+            'title': f"Option distribution - {set_name}",
+            'counts': option_counts.tolist(),
+            'students': students,
+            'labels': [chr(ord('A') + i) for i in range(options)] + ["Multiple", "Blank/other"],
+        }))
+    return specs
+
+
+def plot_key(kind, data):
+    """Cache key of a plot: hash of its kind and input aggregates."""
+    payload = json.dumps({'version': PLOT_CACHE_VERSION, 'kind': kind, 'data': data}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_plot(kind, data, path, cache_path=None):
+    """Draw one plot to ``path`` and store a copy at ``cache_path`` when given."""
+    draw, size = _DRAW[kind]
+    fig, ax = _new_figure(*size)
+    draw(ax, data)
+    ax.set_title(data['title'])
+    if kind != 'options':
+        ax.grid(axis='y', alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, format='png')
+
+    if cache_path:
+        folder = os.path.dirname(cache_path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    return path
+
+
+def _render_task(args):
+    return render_plot(*args)
+
+
+def _prune_plot_cache(cache_dir, max_files=MAX_CACHED_PLOTS):
+    try:
+        entries = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith('.png')]
+    except OSError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda p: os.path.getmtime(p))
+    for path in entries[:len(entries) - max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def render_plots(specs, output_dir, workers=1, cache_dir=None):
+    """
+    Render plot specs into ``output_dir``, reusing cached renders.
+
+    Plots whose aggregates were rendered before are copied from ``cache_dir``; the
+    rest are drawn in-process, or in a process pool of up to ``workers`` processes
+    when at least PARALLEL_MIN_PLOTS of them are left.
+
+    Returns:
+        tuple: (plot paths in spec order, number of plots served from the cache)
+    """
+    paths, pending, hits = [], [], 0
+    for kind, filename, data in specs:
+        path = os.path.join(output_dir, filename)
+        paths.append(path)
+        cache_path = os.path.join(cache_dir, plot_key(kind, data) + '.png') if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                shutil.copyfile(cache_path, path)
+                os.utime(cache_path)
+                hits += 1
+                continue
+            except OSError:
+                pass
+        pending.append((kind, data, path, cache_path))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(pending) >= PARALLEL_MIN_PLOTS:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            list(executor.map(_render_task, pending))
+    else:
+        for task in pending:
+            _render_task(task)
+
+    if cache_dir and pending:
+        _prune_plot_cache(cache_dir)
+    return paths, hits
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def generate_report(df, summary_data, output_dir, set_name="Set", results_csv=None, workers=1, cache_dir=None,
+                    plot_paths=None, deferred_plots=None):
+    """
+    Save the results CSV and the report plots.
+
+    Args:
+        df (pandas.DataFrame or None): Student_ID and Total_Score per student; only used
+            for the per-student bar plot of small cohorts (and the CSV when
+            ``results_csv`` is not given).
+        summary_data (dict): Output of SummaryAccumulator.result().
+        output_dir (str): Folder for the report files.
+        set_name (str): Prefix for the report file names.
+        results_csv (str, optional): Existing results CSV to hard-link (or copy) instead
+            of writing ``df``, so the results are neither reloaded nor stored twice.
+        workers (int): Processes used to render plots in parallel.
+        cache_dir (str, optional): Folder caching rendered plots by their input aggregates.
+        plot_paths (list, optional): Extended with the paths of every plot rendered.
+        deferred_plots (list, optional): When given, the plot specs are appended to it
+            instead of being rendered, so the plots of several reports can be drawn by
+            one render_plots call; the returned paths are where they will be written.
+
+    Returns:
+        tuple: (csv_path, plot_path) where ``plot_path`` is the score plot (per-student
+        bars or histogram, None when neither could be drawn), or None when there is
+        nothing to report.
+    """
+    if not summary_data:
         print("Report skipped: empty data")
         return
 
     os.makedirs(output_dir, exist_ok=True)
 
     csv_path = os.path.join(output_dir, f"{set_name}_OMR_Scores.csv")
-    df.to_csv(csv_path, index=False)
+    if results_csv:
+        _link_or_copy(results_csv, csv_path)
+    else:
+        df.to_csv(csv_path, index=False)
     print(f"Report CSV saved to: {csv_path}")
 
-    # Plot Total_Score
-    plt.figure(figsize=(12, 6))
-    sns.barplot(x='Student_ID', y='Total_Score', data=df, palette="viridis")
-    plt.title(f"Total Scores - {set_name}")
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-
-    plot_path = os.path.join(output_dir, f"{set_name}_score_plot.png")
-    plt.savefig(plot_path)
-    plt.close()
-    print(f"Score plot saved to: {plot_path}")
+    specs = plot_specs(summary_data, df, set_name)
+    if deferred_plots is not None:
+        deferred_plots.extend(specs)
+        paths = [os.path.join(output_dir, filename) for _, filename, _ in specs]
+    else:
+        paths, hits = render_plots(specs, output_dir, workers, cache_dir)
+        print(f"Plots saved to: {output_dir} ({len(paths)} plots, {hits} from cache)")
+    if plot_paths is not None:
+        plot_paths.extend(paths)
 
-    return csv_path, plot_path
+    score_plot = paths[0] if specs and specs[0][0] in ('scores', 'histogram') else None
+    return csv_path, score_plot
@@ -0,0 +1,214 @@
+import os
+import shutil
+import tempfile
+
+from .scoring import parse_options
+
+# Rows buffered before a row group is written; bounds memory for any batch size
+ROW_GROUP_SIZE = 1024
+
+RESULTS_FILENAME = "results.parquet"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet results need pyarrow: pip install pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+def question_column(q):
+    """Name of the column holding question ``q``."""
+    return f"Q{q}"
+
+
+def encode_answer(value, options_per_question=4):
+    """
+    Encode an answer as an option bitmask: bit ``i`` set when option ``i`` is marked.
+
+    Blank answers are 0 and multi-marks have several bits set, e.g. "AC" -> 0b101.
+    """
+    code = 0
+    for idx in parse_options(value, options_per_question):
+        code |= 1 << idx
+    return code
+
+
+def decode_answer(code):
+    """Turn an option bitmask back into letters ("A", "AC"), or None for blank."""
+    code = int(code)
+    letters = "".join(chr(ord('A') + i) for i in range(code.bit_length()) if (code >> i) & 1)
+    return letters or None
+
+
+def partition_dir(root, exam_set):
+    """Folder holding one exam set's results inside a results dataset."""
+    return os.path.join(root, f"exam_set={exam_set}")
+
+
+class ResultsWriter:
+    """
+    Stream result rows into a Parquet file, one row group per ROW_GROUP_SIZE sheets.
+
+    The file is written to ``<root>/exam_set=<exam_set>/results.parquet`` (Hive-style
+    partitioning, so several exam sets form one dataset). Answers are stored as one
+    option-bitmask column per question (uint8, uint16 above 8 options), Student_ID
+    is dictionary-encoded by Parquet (and loaded as categorical) and scores are
+    float32. The partition is written to a hidden sibling folder (ignored when the
+    dataset is read) that replaces the previous partition once close() succeeds, so
+    an aborted run keeps the last complete results.
+
+    Args:
+        root (str): Dataset folder.
+        exam_set (str): Partition value for these results.
+        num_questions (int): Number of question columns.
+        options_per_question (int): Number of options per question.
+        row_group_size (int): Rows per row group.
+    """
+
+    def __init__(self, root, exam_set, num_questions, options_per_question=4, row_group_size=ROW_GROUP_SIZE):
+        import numpy as np
+
+        pa, pq = _require_pyarrow()
+        self._pa = pa
+        self.num_questions = num_questions
+        self.options_per_question = options_per_question
+        self.row_group_size = row_group_size
+        self.rows = 0
+
+        self.folder = partition_dir(root, exam_set)
+        self.path = os.path.join(self.folder, RESULTS_FILENAME)
+        os.makedirs(root, exist_ok=True)
+        self._staging = tempfile.mkdtemp(prefix=f".{os.path.basename(self.folder)}.", dir=root)
+
+        code_type = pa.uint8() if options_per_question <= 8 else pa.uint16()
+        self._dtype = np.uint8 if options_per_question <= 8 else np.uint16
+        self.schema = pa.schema(
+            # A plain string column keeps row-group min/max statistics usable for
+            # Student_ID filters; Parquet still dictionary-encodes it on disk
+            [('Student_ID', pa.string())]
+            + [(question_column(q), code_type) for q in range(1, num_questions + 1)]
+            + [('Total_Score', pa.float32()), ('Confidence', pa.float32()), ('Review', pa.string())]
+        )
+        self._writer = pq.ParquetWriter(os.path.join(self._staging, RESULTS_FILENAME), self.schema,
+                                        compression='zstd')
+
+        # Question-major buffer so every column is a contiguous slice
+        self._codes = np.zeros((num_questions, row_group_size), dtype=self._dtype)
+        self._code_of = {}
+        self._ids, self._scores, self._confidence, self._review = [], [], [], []
+
+    def write(self, entry):
+        """Add one result row ({'Student_ID': ..., 1: 'A', ..., 'Total_Score': ...})."""
+        n = len(self._ids)
+        for q in range(1, self.num_questions + 1):
+            value = entry.get(q)
+            code = self._code_of.get(value)
+            if code is None:
+                code = self._code_of[value] = encode_answer(value, self.options_per_question)
+            self._codes[q - 1, n] = code
+        self._ids.append(str(entry['Student_ID']))
+        self._scores.append(entry['Total_Score'])
+        self._confidence.append(entry.get('Confidence'))
+        self._review.append(entry.get('Review') or "")
+        if len(self._ids) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        n = len(self._ids)
+        if n == 0:
+            return
+        pa = self._pa
+        arrays = [pa.array(self._ids, pa.string())]
+        arrays += [pa.array(self._codes[q, :n]) for q in range(self.num_questions)]
+        arrays += [pa.array(self._scores, pa.float32()), pa.array(self._confidence, pa.float32()),
+                   pa.array(self._review, pa.string())]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += n
+        self._codes[:, :n] = 0
+        self._ids, self._scores, self._confidence, self._review = [], [], [], []
+
+    def close(self):
+        """Write the last row group and replace the partition with the new one."""
+        self._flush()
+        self._writer.close()
+        previous = None
+        if os.path.isdir(self.folder):
+            # A directory cannot be renamed over a non-empty one: move the old one aside first
+            previous = self._staging + ".old"
+            os.replace(self.folder, previous)
+        os.replace(self._staging, self.folder)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return self.path
+
+    def abort(self):
+        """Discard the partially written partition; the previous one is left untouched."""
+        self._writer.close()
+        shutil.rmtree(self._staging, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def load_results(path, questions=None, students=None, exam_sets=None, letters=False):
+    """
+    Load results written by ResultsWriter, reading only what is asked for.
+
+    Only the requested question columns are read, exam sets are selected by
+    partition folder and the Student_ID filter is checked against each row group's
+    statistics, so unrelated row groups are skipped (sheets are written in filename
+    order, so each row group covers a narrow ID range).
+
+    Args:
+        path (str): Dataset folder (or a single results file).
+        questions (iterable, optional): Question numbers to load; None loads all.
+        students (iterable, optional): Student_IDs to keep; None keeps all.
+        exam_sets (iterable, optional): Exam sets to keep; None keeps all.
+        letters (bool): Decode option bitmasks into letters ("A", "AC", None).
+
+    Returns:
+        pandas.DataFrame: Student_ID (categorical), exam_set (when reading a dataset
+        folder), the selected Q<n> columns, Total_Score, Confidence and Review.
+        Questions an exam set does not have are empty (NaN) for its students.
+    """
+    pa, _ = _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    # Exam set names stay strings even when they look like numbers
+    partitioning = ds.partitioning(pa.schema([('exam_set', pa.string())]), flavor='hive')
+    dataset = ds.dataset(path, format='parquet', partitioning=partitioning)
+    # Exam sets can have different question counts; read every set with the union of columns
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in dataset.get_fragments()]
+                              + [dataset.schema])
+    dataset = ds.dataset(path, format='parquet', partitioning=partitioning, schema=schema)
+    names = dataset.schema.names
+    if questions is None:
+        question_cols = sorted((c for c in names if c.startswith('Q') and c[1:].isdigit()), key=lambda c: int(c[1:]))
+    else:
+        question_cols = [question_column(int(q)) for q in questions]
+    columns = ['Student_ID'] + (['exam_set'] if 'exam_set' in names else []) + question_cols
+    columns += ['Total_Score', 'Confidence', 'Review']
+
+    expr = None
+    if students is not None:
+        expr = ds.field('Student_ID').isin([str(s) for s in students])
+    if exam_sets is not None:
+        set_expr = ds.field('exam_set').isin([str(s) for s in exam_sets])
+        expr = set_expr if expr is None else expr & set_expr
+
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    df['Student_ID'] = df['Student_ID'].astype('category')
+    if letters:
+        for col in question_cols:
+            df[col] = df[col].map(decode_answer, na_action='ignore')
+    return df
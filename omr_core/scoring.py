@@ -1,4 +1,7 @@
-import pandas as pd
+import numpy as np
+
+# Separators accepted between options of a multiple-correct key entry, e.g. "A,C" or "A/C"
+_KEY_SEPARATORS = ",/;|& "
 
 def load_answer_key(file_path, sheet_name=0):
     """
@@ -15,6 +18,8 @@ def load_answer_key(file_path, sheet_name=0):
         ValueError: If the answer key does not contain required columns.
         RuntimeError: For file read errors or other exceptions.
     """
+    import pandas as pd
+
     try:
         # Read the specified sheet (use openpyxl engine for .xlsx files)
         df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
@@ -55,3 +60,185 @@ def score_omr_sheets(answer_sheets_dir, answer_key_df):
     summary = "Scoring completed successfully."
     plots = []  # Add generated plot file paths if applicable
     return summary, plots
+
+
+def parse_options(value, options_per_question=4):
+    """
+    Convert an answer or key cell into a list of option indexes.
+
+    Accepts letters in any case ("a", "B"), several letters for multiple marks or
+    multiple-correct keys ("AC", "A,C", "a/c") and lists of letters.
+    Blank or unreadable values give an empty list.
+    """
+    if value is None:
+        return []
+    if isinstance(value, float) and np.isnan(value):
+        return []
+    if isinstance(value, (list, tuple, set)):
+        letters = [str(v) for v in value]
+    else:
+        text = str(value).strip().upper()
+        for sep in _KEY_SEPARATORS:
+            text = text.replace(sep, "")
+        letters = list(text)
+
+    indexes = []
+    for letter in letters:
+        letter = letter.strip().upper()
+        if len(letter) != 1:
+            return []
+        idx = ord(letter) - ord('A')
+        if not 0 <= idx < options_per_question:
+            return []
+        if idx not in indexes:
+            indexes.append(idx)
+    return sorted(indexes)
+
+
+def encode_answer_key(answer_key, num_questions=None, options_per_question=4):
+    """
+    Encode an answer key as one bitmask per question.
+
+    Bit ``i`` of entry ``q - 1`` is set when option ``i`` is a correct answer to
+    question ``q``, so multiple-correct questions are supported. Questions without a
+    usable key entry get 0 and are not scored.
+
+    Args:
+        answer_key (dict): question_number -> correct option(s), e.g. {1: 'A', 2: 'B,D'}.
+        num_questions (int, optional): Number of questions; defaults to the highest key question.
+        options_per_question (int): Number of options per question.
+
+    Returns:
+        numpy.ndarray: uint16 array of shape (num_questions,).
+    """
+    if num_questions is None:
+        num_questions = max((int(q) for q in answer_key), default=0)
+
+    key_mask = np.zeros(num_questions, dtype=np.uint16)
+    for q, value in answer_key.items():
+        q = int(q)
+        if 1 <= q <= num_questions:
+            for idx in parse_options(value, options_per_question):
+                key_mask[q - 1] |= 1 << idx
+    return key_mask
+
+
+def encode_marks(marked):
+    """
+    Encode marked bubbles as option bitmasks, the response codes scored by score_responses.
+
+    Args:
+        marked (array-like): Booleans of shape (..., options), True where a bubble is
+            marked, e.g. the ``marked`` matrix of decision.decide.
+
+    Returns:
+        numpy.ndarray: uint16 array of shape (...); bit ``i`` is set when option ``i``
+        is marked, so 0 is a blank question and several bits a multi-mark.
+    """
+    marked = np.asarray(marked, dtype=bool)
+    bits = np.left_shift(1, np.arange(marked.shape[-1], dtype=np.uint16)).astype(np.uint16)
+    return (marked * bits).sum(axis=-1, dtype=np.uint16)
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(str(v) for v in value))
+    return value
+
+
+def encode_responses(responses, num_questions, options_per_question=4):
+    """
+    Encode student answers as an option bitmask matrix.
+
+    Each distinct answer value is parsed once; the cells are filled with C-level
+    dict lookups, so no Python code runs per answer.
+
+    Args:
+        responses (iterable): One dict per student, question_number -> answer
+            (letter, several letters for a multi-mark, or None for blank). Keys that
+            are not question numbers (e.g. Student_ID) are ignored.
+        num_questions (int): Number of questions.
+        options_per_question (int): Number of options per question.
+
+    Returns:
+        numpy.ndarray: uint16 array (students x questions) as from encode_marks.
+    """
+    questions = range(1, num_questions + 1)
+    values = [list(map(answers.get, questions)) for answers in responses]
+    distinct = set()
+    try:
+        for row in values:
+            distinct.update(row)
+    except TypeError:
+        # Lists of letters are not hashable; key them by their sorted letters
+        values = [[_hashable(v) for v in row] for row in values]
+        distinct = set().union(*values)
+    code_of = {value: sum(1 << idx for idx in parse_options(value, options_per_question)) for value in distinct}
+    lookup = code_of.__getitem__
+    codes = np.array([list(map(lookup, row)) for row in values], dtype=np.uint16)
+    return codes.reshape(len(values), num_questions)
+
+
+def score_responses(codes, key_mask, weights=None, negative=0.0, multi_mark="wrong"):
+    """
+    Score every student in one vectorized operation.
+
+    Args:
+        codes (numpy.ndarray): Option bitmasks (students x questions) from encode_marks
+            or encode_responses.
+        key_mask (numpy.ndarray): Encoded key from encode_answer_key.
+        weights (array-like, optional): Marks per question, default 1 for every question.
+        negative (float): Fraction of a question's weight deducted for a wrong answer,
+            e.g. 0.25 for "minus one quarter".
+        multi_mark (str): How several marks on one question count: "wrong" (penalised
+            like a wrong answer) or "zero" (no marks, no penalty).
+
+    Returns:
+        numpy.ndarray: One score per student; int64 for the default rules, float64
+        once weights or negative marking are used.
+    """
+    if multi_mark not in ("wrong", "zero"):
+        raise ValueError(f"Unknown multi_mark rule: {multi_mark}")
+
+    codes = np.atleast_2d(np.asarray(codes, dtype=np.uint16))
+    key_mask = np.asarray(key_mask, dtype=np.uint16)
+    scored = key_mask > 0
+
+    # One bit set: a single answer; clearing the lowest bit leaves the other marks
+    multi = (codes & (codes - np.uint16(1))) != 0
+    answered = (codes != 0) & ~multi
+    correct = answered & ((codes & key_mask) != 0) & scored
+    wrong = answered & ~correct & scored
+    if multi_mark == "wrong":
+        wrong |= multi & scored
+
+    if weights is None and not negative:
+        return correct.sum(axis=1, dtype=np.int64)
+
+    w = np.ones(codes.shape[1]) if weights is None else np.asarray(weights, dtype=np.float64)
+    return correct @ w - negative * (wrong @ w)
+
+
+def answer_key_to_dict(df):
+    """
+    Convert an answer key DataFrame into a question_number -> answer dict.
+
+    Uses the Question column when present (else row order) and the CorrectOption or
+    Answer column (else the second column).
+    """
+    import pandas as pd
+
+    if 'CorrectOption' in df.columns:
+        answers = df['CorrectOption']
+    elif 'Answer' in df.columns:
+        answers = df['Answer']
+    else:
+        answers = df.iloc[:, 1]
+
+    if 'Question' in df.columns:
+        questions = pd.to_numeric(df['Question'], errors='coerce')
+    else:
+        questions = pd.Series(np.arange(1, len(df) + 1), index=df.index)
+
+    valid = questions.notna() & answers.notna()
+    return dict(zip(questions[valid].astype(int).tolist(), answers[valid].astype(str).str.strip().tolist()))
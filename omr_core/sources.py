@@ -0,0 +1,144 @@
+import os
+import threading
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+PDF_EXTENSIONS = (".pdf",)
+
+# Resolution used to rasterise scanned PDF pages
+PDF_DPI = 200
+
+# Open PDF documents kept per process, so consecutive pages do not re-parse the file
+_MAX_OPEN_PDFS = 2
+_open_pdfs = {}
+# PDFium is not thread-safe; serialise all access within a process
+_pdf_lock = threading.RLock()
+
+
+class MemorySheet:
+    """
+    An image sheet held in memory, e.g. a member of an uploaded archive.
+
+    Args:
+        name (str): Student_ID of the sheet (the member path inside the archive).
+        data (bytes): Encoded image file content.
+    """
+
+    __slots__ = ('name', 'data')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+
+def is_in_memory(source):
+    """True for a MemorySheet source."""
+    return isinstance(source, MemorySheet)
+
+
+def is_pdf_page(source):
+    """True for a (pdf_path, page_index) sheet source."""
+    return isinstance(source, tuple)
+
+
+def source_name(source):
+    """
+    Student_ID of a sheet source: the image filename, ``<pdf name>#p<page>`` for PDF
+    pages, or the member path for sheets from an archive.
+    """
+    if is_in_memory(source):
+        return source.name
+    if is_pdf_page(source):
+        pdf_path, page_index = source
+        return f"{os.path.basename(pdf_path)}#p{page_index + 1:04d}"
+    return os.path.basename(source)
+
+
+def _open_pdf(pdf_path):
+    import pypdfium2 as pdfium
+
+    pdf = _open_pdfs.get(pdf_path)
+    if pdf is None:
+        while len(_open_pdfs) >= _MAX_OPEN_PDFS:
+            _open_pdfs.pop(next(iter(_open_pdfs))).close()
+        pdf = _open_pdfs[pdf_path] = pdfium.PdfDocument(pdf_path)
+    return pdf
+
+
+def forget_open_pdfs():
+    """Drop PDF handles inherited from a parent process (called in freshly forked workers)."""
+    _open_pdfs.clear()
+
+
+def pdf_page_count(pdf_path):
+    """Number of pages in a PDF file."""
+    with _pdf_lock:
+        return len(_open_pdf(pdf_path))
+
+
+def render_pdf_page(pdf_path, page_index, dpi=PDF_DPI):
+    """
+    Rasterise one PDF page straight into a grayscale uint8 array.
+
+    Only this page is rendered, so memory use does not depend on the page count.
+    """
+    import numpy as np
+
+    with _pdf_lock:
+        page = _open_pdf(pdf_path)[page_index]
+        try:
+            bitmap = page.render(scale=dpi / 72.0, grayscale=True)
+            img = bitmap.to_numpy()
+            if img.ndim == 3:
+                img = img[:, :, 0]
+            # Copy out of the PDFium buffer before the bitmap is released
+            img = np.array(img, dtype=np.uint8, copy=True)
+            bitmap.close()
+        finally:
+            page.close()
+    return img
+
+
+def iter_sheet_sources(folder):
+    """
+    Yield the OMR sheets in a folder in filename order.
+
+    Images are yielded as paths and every page of a PDF as a (pdf_path, page_index)
+    tuple, so multi-page scanner PDFs are evaluated page by page without writing
+    intermediate image files.
+    """
+    for filename in sorted(os.listdir(folder)):
+        path = os.path.join(folder, filename)
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            yield path
+        elif ext in PDF_EXTENSIONS:
+            try:
+                pages = pdf_page_count(path)
+            except Exception as e:
+                print(f"❌ Could not open PDF {filename}: {e}")
+                continue
+            for page_index in range(pages):
+                yield (path, page_index)
+
+
+def count_sheets(folder):
+    """Number of sheets in a folder, counting every PDF page."""
+    return sum(1 for _ in iter_sheet_sources(folder))
+
+
+def load_sheet(source, dpi=PDF_DPI):
+    """
+    Decode a sheet source into an image array.
+
+    Returns:
+        numpy array or None: Grayscale image (reduced resolution for very large
+        image files, see preprocessing.load_image), None if the image cannot be read.
+    """
+    # Imported here so listing and counting sheets (e.g. in the web process) does not load OpenCV
+    from .preprocessing import decode_image, load_image
+
+    if is_pdf_page(source):
+        return render_pdf_page(source[0], source[1], dpi)
+    if is_in_memory(source):
+        return decode_image(source.data)
+    return load_image(source)
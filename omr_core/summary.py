@@ -1,11 +1,159 @@
-import pandas as pd
+import heapq
+import math
 import os
+from collections import Counter
+
+import numpy as np
+
+from .scoring import encode_answer_key
+
+# Students tied for the best score that are listed by name; the rest are only counted
+TOP_STUDENTS_SAMPLE = 10
+
+
+class SummaryAccumulator:
+    """
+    Running score statistics, updated once per evaluated sheet.
+
+    Keeps O(questions x options) state regardless of how many sheets are added, so
+    the pipeline can summarise a batch without re-reading the results CSV.
+
+    Args:
+        answer_key (dict, optional): Correct answers, used for per-question correct rates.
+        num_questions (int, optional): Number of questions; defaults to the answer key size.
+        options_per_question (int): Number of options per question.
+        top_k (int): Number of best students to keep.
+        top_sample (int): Number of students tied for the best score kept by name.
+    """
+
+    def __init__(self, answer_key=None, num_questions=None, options_per_question=4, top_k=5,
+                 top_sample=TOP_STUDENTS_SAMPLE):
+        self.answer_key = answer_key or {}
+        self.num_questions = num_questions if num_questions is not None else len(self.answer_key)
+        self.options_per_question = options_per_question
+        self.top_k = top_k
+        self.top_sample = top_sample
+
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min_score = None
+        self.max_score = None
+        self.top_students = []  # first top_sample students with the best score
+        self.top_count = 0  # all students with the best score
+        self.histogram = Counter()
+        self._top = []  # min-heap of (score, -order, student_id)
+
+        self._key_mask = encode_answer_key(self.answer_key, self.num_questions, options_per_question)
+        self.correct_counts = np.zeros(self.num_questions, dtype=np.int64)
+        # One column per option, then multi-marked answers, then blank or unreadable ones
+        self.option_counts = np.zeros((self.num_questions, options_per_question + 2), dtype=np.int64)
+
+    def update(self, entry):
+        """Add one result row ({'Student_ID': ..., 1: 'A', ..., 'Total_Score': ...})."""
+        student_id = entry['Student_ID']
+        score = entry['Total_Score']
+
+        self.count += 1
+        self.total += score
+        self.total_sq += score * score
+        self.histogram[score] += 1
+
+        if self.min_score is None or score < self.min_score:
+            self.min_score = score
+        if self.max_score is None or score > self.max_score:
+            self.max_score = score
+            self.top_students = [student_id]
+            self.top_count = 1
+        elif score == self.max_score:
+            self.top_count += 1
+            if len(self.top_students) < self.top_sample:
+                self.top_students.append(student_id)
+
+        item = (score, -self.count, student_id)
+        if len(self._top) < self.top_k:
+            heapq.heappush(self._top, item)
+        elif item > self._top[0]:
+            heapq.heapreplace(self._top, item)
+
+        for q in range(1, self.num_questions + 1):
+            ans = entry.get(q)
+            opt_idx = _option_index(ans, self.options_per_question)
+            self.option_counts[q - 1, opt_idx] += 1
+            if opt_idx < self.options_per_question and (int(self._key_mask[q - 1]) >> opt_idx) & 1:
+                self.correct_counts[q - 1] += 1
+
+    def result(self):
+        """
+        Return the summary dict, or None when no sheet has been added.
+
+        Contains the keys produced by create_summary plus ``top_students_count``
+        (students with the best score; ``top_students`` lists at most ``top_sample``
+        of them), ``std_score``, ``top_k`` (list of (student_id, score) best first),
+        ``histogram`` (score -> count), ``question_correct_rate`` and ``option_counts``
+        (questions x (options, multi-marked, blank)).
+        """
+        if self.count == 0:
+            return None
+
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        correct_rate = self.correct_counts / self.count
+
+        return {
+            'average_score': mean,
+            'max_score': self.max_score,
+            'min_score': self.min_score,
+            'top_students': list(self.top_students),
+            'top_students_count': self.top_count,
+            'total_students': self.count,
+            'std_score': math.sqrt(variance),
+            'top_k': [(sid, score) for score, _, sid in sorted(self._top, reverse=True)],
+            'histogram': dict(sorted(self.histogram.items())),
+            'question_correct_rate': correct_rate,
+            'option_counts': self.option_counts.copy(),
+        }
+
+
+def _option_index(ans, options_per_question):
+    """
+    Column of option_counts for an answer: the option of a single letter, the
+    multi-mark column for several valid letters (e.g. "AC") and the last column for
+    blank or unreadable answers.
+    """
+    if isinstance(ans, str) and ans:
+        indexes = {ord(letter) - ord('A') for letter in ans.upper()}
+        if all(0 <= idx < options_per_question for idx in indexes):
+            return next(iter(indexes)) if len(indexes) == 1 else options_per_question
+    return options_per_question + 1
+
+
+def format_top_students(summary_data):
+    """Top students as listed in logs, e.g. "['s01', 's07'] (+12 more)" when the list is a sample."""
+    text = str(summary_data['top_students'])
+    more = summary_data.get('top_students_count', 0) - len(summary_data['top_students'])
+    return f"{text} (+{more} more)" if more > 0 else text
+
+
+def print_summary(summary_data):
+    """Print a nicely formatted summary."""
+    print("\n" + "="*40)
+    print("           📊 Student Score Summary")
+    print("="*40)
+    print(f"👥 Total Students : {summary_data['total_students']}")
+    print(f"📈 Average Score  : {summary_data['average_score']:.2f}")
+    print(f"🏆 Maximum Score  : {summary_data['max_score']}")
+    print(f"📉 Minimum Score  : {summary_data['min_score']}")
+    print(f"🎯 Top Students   : {format_top_students(summary_data)}")
+    print("="*40 + "\n")
 
 def create_summary(csv_file):
     if not os.path.exists(csv_file) or os.path.getsize(csv_file) == 0:
         print(f"⚠️  Summary skipped: {csv_file} not found or is empty.")
         return None
 
+    import pandas as pd
+
     df = pd.read_csv(csv_file)
     if 'Student_ID' not in df.columns or 'Total_Score' not in df.columns:
         print(f"⚠️  Summary skipped: required columns missing in {csv_file}")
@@ -24,15 +172,6 @@ def create_summary(csv_file):
         'total_students': len(df)
     }
 
-    # Print nicely formatted summary
-    print("\n" + "="*40)
-    print("           📊 Student Score Summary")
-    print("="*40)
-    print(f"👥 Total Students : {len(df)}")
-    print(f"📈 Average Score  : {avg_score:.2f}")
-    print(f"🏆 Maximum Score  : {max_score}")
-    print(f"📉 Minimum Score  : {min_score}")
-    print(f"🎯 Top Students   : {top_students}")
-    print("="*40 + "\n")
+    print_summary(summary_data)
 
     return summary_data
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import cv2
+import numpy as np
+
+
+def build_template(thresh_img, num_questions, options_per_question=4):
+    """
+    Detect the bubble grid once on a reference sheet and store it as a fixed layout.
+
+    Args:
+        thresh_img (numpy array): Thresholded, perspective-corrected reference sheet.
+        num_questions (int): Number of questions expected.
+        options_per_question (int): Number of options per question.
+
+    Returns:
+        dict: Layout with the reference image ``shape``, bubble ``centres`` of shape
+            (questions, options, 2) and ``radii`` of shape (questions, options).
+            Missing bubbles have a radius of 0.
+    """
+    # Imported here because evaluation imports this module for template sampling
+    from .evaluation import find_bubble_rows
+
+    rows = find_bubble_rows(thresh_img, num_questions, options_per_question)
+
+    centres = np.zeros((len(rows), options_per_question, 2), dtype=np.float32)
+    radii = np.zeros((len(rows), options_per_question), dtype=np.float32)
+
+    for q, row in enumerate(rows):
+        for o, c in enumerate(row):
+            (cx, cy), r = cv2.minEnclosingCircle(c)
+            centres[q, o] = (cx, cy)
+            radii[q, o] = r
+
+    return {
+        'shape': tuple(thresh_img.shape[:2]),
+        'centres': centres,
+        'radii': radii,
+    }
+
+
+def build_template_from_image(img_path, num_questions, options_per_question=4):
+    """Preprocess a reference OMR image and build its bubble layout."""
+    from .preprocessing import preprocess_image
+
+    # The reference layout is always measured at full resolution
+    thresh_img = preprocess_image(img_path, max_dim=None)
+    if thresh_img is None:
+        return None
+    return build_template(thresh_img, num_questions, options_per_question)
+
+
+def save_template(template, path):
+    """Save a bubble layout to a ``.npz`` file."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez(f, shape=np.array(template['shape']), centres=template['centres'], radii=template['radii'])
+
+
+def load_template(path):
+    """Load a bubble layout saved with save_template."""
+    with np.load(path) as data:
+        return {
+            'shape': tuple(int(v) for v in data['shape']),
+            'centres': data['centres'],
+            'radii': data['radii'],
+        }
+
+
+def template_digest(template):
+    """Short content hash of a layout, used to key cached results sampled with it."""
+    if '_digest' not in template:
+        h = hashlib.sha256()
+        h.update(np.asarray(template['shape'], dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(template['centres'], dtype=np.float32).tobytes())
+        h.update(np.ascontiguousarray(template['radii'], dtype=np.float32).tobytes())
+        template['_digest'] = h.hexdigest()[:16]
+    return template['_digest']
+
+
+def _compile_template(template):
+    """
+    Precompute the flat pixel indices covered by every bubble.
+
+    The result is stored on the template so each later sheet only needs one
+    fancy-indexing lookup and one ``np.bincount``.
+    """
+    if '_pixel_index' in template:
+        return template['_pixel_index'], template['_bubble_index']
+
+    h, w = template['shape']
+    centres = template['centres'].reshape(-1, 2)
+    radii = template['radii'].ravel()
+
+    pixel_index = []
+    bubble_index = []
+    for b, ((cx, cy), r) in enumerate(zip(centres, radii)):
+        if r <= 0:
+            continue
+        x0, x1 = max(int(cx - r), 0), min(int(np.ceil(cx + r)), w - 1)
+        y0, y1 = max(int(cy - r), 0), min(int(np.ceil(cy + r)), h - 1)
+        ys, xs = np.mgrid[y0:y1 + 1, x0:x1 + 1]
+        inside = (xs - cx) ** 2 + (ys - cy) ** 2 <= r * r
+        flat = (ys[inside] * w + xs[inside]).astype(np.int64)
+        pixel_index.append(flat)
+        bubble_index.append(np.full(flat.size, b, dtype=np.int32))
+
+    if pixel_index:
+        pixel_index = np.concatenate(pixel_index)
+        bubble_index = np.concatenate(bubble_index)
+    else:
+        pixel_index = np.zeros(0, dtype=np.int64)
+        bubble_index = np.zeros(0, dtype=np.int32)
+
+    template['_pixel_index'] = pixel_index
+    template['_bubble_index'] = bubble_index
+    return pixel_index, bubble_index
+
+
+def sample_template(thresh_img, template):
+    """
+    Measure bubble fills at the fixed template coordinates.
+
+    Sheets whose warped size differs from the reference are resized to the
+    template shape first, so bubbles always map to the same questions.
+
+    Args:
+        thresh_img (numpy array): Thresholded, perspective-corrected sheet.
+        template (dict): Layout from build_template or load_template.
+
+    Returns:
+        tuple: (filled, area) int32 arrays of shape (questions, options), in the
+            same format as evaluation.measure_bubble_fills.
+    """
+    h, w = template['shape']
+    if thresh_img.shape[:2] != (h, w):
+        thresh_img = cv2.resize(thresh_img, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    pixel_index, bubble_index = _compile_template(template)
+    n = template['radii'].size
+
+    marked = thresh_img.reshape(-1)[pixel_index] > 0
+    filled = np.bincount(bubble_index, weights=marked, minlength=n).astype(np.int32)
+    area = np.bincount(bubble_index, minlength=n).astype(np.int32)
+
+    shape = template['radii'].shape
+    filled = filled.reshape(shape)
+    area = area.reshape(shape)
+
+    missing = template['radii'] <= 0
+    filled[missing] = -1
+    area[missing] = -1
+    return filled, area
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from omr_core.cache import FillCache
+
+FILLS = (np.arange(8, dtype=np.int32).reshape(2, 4), np.full((2, 4), 100, dtype=np.int32))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FillCache(str(tmp_path))
+
+
+def test_hit_returns_the_stored_fills_and_geometry(cache):
+    key = cache.make_key(b"image", {'threshold': 150})
+    assert cache.get(key) is None
+    cache.put(key, *FILLS, geometry={'size': (10, 20), 'circles': np.ones((2, 4, 3), np.float32)})
+
+    geometry = {}
+    filled, area = cache.get(key, geometry)
+    assert (filled == FILLS[0]).all() and (area == FILLS[1]).all()
+    assert geometry['size'].tolist() == [10, 20] and 'homography' not in geometry
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_other_parameters_or_image_miss(cache):
+    key = cache.make_key(b"image", {'threshold': 150})
+    cache.put(key, *FILLS)
+    assert cache.make_key(b"image", {'threshold': 150}) == key
+    assert cache.get(cache.make_key(b"image", {'threshold': 140})) is None
+    assert cache.get(cache.make_key(b"other image", {'threshold': 150})) is None
+
+
+@pytest.mark.parametrize("damage", [lambda data: data[:len(data) // 2], lambda data: b"", lambda data: b"junk" * 50])
+def test_corrupt_entry_is_a_miss_and_removed(cache, damage):
+    key = cache.make_key(b"image", {})
+    cache.put(key, *FILLS)
+    path = cache._path(key)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(damage(data))
+
+    assert cache.get(key) is None and cache.misses == 1
+    assert not os.path.exists(path)
+    cache.put(key, *FILLS)
+    assert cache.get(key) is not None
+
+
+def test_prune_evicts_least_recently_used(cache):
+    keys = [cache.make_key(bytes([i]), {}) for i in range(4)]
+    for age, key in enumerate(keys):
+        cache.put(key, *FILLS)
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    cache.get(keys[0])  # a hit makes the oldest entry the most recent
+    entry_size = os.path.getsize(cache._path(keys[0]))
+
+    cache.max_bytes = 2 * entry_size
+    assert cache.prune() == 2
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+    assert cache.stats()['entries'] == 2
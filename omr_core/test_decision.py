@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from omr_core import decision
+
+
+def _fills(rows):
+    # rows of fill percentages; None for a bubble that was not found
+    filled = np.array([[-1 if v is None else v for v in row] for row in rows], dtype=np.int32)
+    area = np.where(filled >= 0, 100, -1).astype(np.int32)
+    return filled, area
+
+
+def test_levels_split_blank_and_filled_bubbles():
+    blank, filled = decision.estimate_levels(np.array([0.50, 0.52, 0.54, 0.90, 0.92, np.nan]))
+    assert blank == pytest.approx(0.52)
+    assert filled == pytest.approx(0.91)
+
+
+def test_levels_of_a_single_group_fall_back_to_the_defaults():
+    assert decision.estimate_levels(np.array([])) == (decision.DEFAULT_BLANK_LEVEL, decision.DEFAULT_FILLED_LEVEL)
+
+    blank, filled = decision.estimate_levels(np.full(8, 0.5))
+    assert blank == pytest.approx(0.5) and filled == decision.DEFAULT_FILLED_LEVEL
+
+    blank, filled = decision.estimate_levels(np.full(8, 0.98))
+    assert blank == decision.DEFAULT_BLANK_LEVEL and filled == pytest.approx(0.98)
+
+
+def test_decide_states():
+    result = decision.decide(*_fills([
+        [55, 95, 55, 55],    # single B
+        [55, 55, 55, 55],    # blank
+        [95, 55, 95, 55],    # multi AC
+        [55, 76, 55, 55],    # barely over the mark level
+        [95, 55, 55, None],  # a bubble was not found
+    ]))
+
+    assert result['levels'] == (pytest.approx(0.55), pytest.approx(0.95))
+    assert result['answers'] == {1: 'B', 2: None, 3: 'AC', 4: 'B', 5: 'A'}
+    assert result['states'] == {1: decision.SINGLE, 2: decision.BLANK, 3: decision.MULTI,
+                                4: decision.AMBIGUOUS, 5: decision.AMBIGUOUS}
+    assert result['review'] == [4, 5]
+    assert result['confidence'][1] == 1.0 and result['confidence'][5] == 0.0
+    assert result['marked'].tolist()[2] == [True, False, True, False]
+    assert decision.sheet_confidence(result) == 0.0
+
+
+def test_blank_sheet_has_no_marks():
+    result = decision.decide(*_fills([[54, 56, 55, 55]] * 3))
+    assert result['answers'] == {1: None, 2: None, 3: None}
+    assert set(result['states'].values()) == {decision.BLANK}
+    assert result['review'] == []
+
+
+def test_empty_sheet():
+    result = decision.decide(np.zeros((0, 4), np.int32), np.zeros((0, 4), np.int32))
+    assert result['answers'] == {} and not result['marked'].any()
+    assert decision.sheet_confidence(result) == 1.0
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_sheet
+from omr_core import decision, evaluation, preprocessing
+
+
+def _threshold(img):
+    return preprocessing.preprocess_array(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+
+def test_single_pass_fills_match_per_contour_masks():
+    img, _ = make_sheet(num_questions=12, seed=1)
+    thresh = _threshold(img)
+    rows = evaluation.find_bubble_rows(thresh, 12)
+    filled, area = evaluation.measure_bubble_fills(thresh, rows)
+
+    # The per-contour full-frame masks the labelled pass replaced
+    for q, row in enumerate(rows):
+        for o, c in enumerate(row):
+            mask = np.zeros(thresh.shape, dtype=np.uint8)
+            cv2.drawContours(mask, [c], -1, 255, -1)
+            assert filled[q, o] == cv2.countNonZero(cv2.bitwise_and(thresh, thresh, mask=mask))
+            assert area[q, o] == cv2.countNonZero(mask)
+
+
+def test_missing_options_are_marked():
+    img, _ = make_sheet(num_questions=3, seed=2)
+    thresh = _threshold(img)
+    rows = evaluation.find_bubble_rows(thresh, 3)
+    rows[1] = rows[1][:2]
+    filled, area = evaluation.measure_bubble_fills(thresh, rows)
+
+    assert filled.shape == (3, 4)
+    assert (filled[1, 2:] == -1).all() and (area[1, 2:] == -1).all()
+    assert (area[0] > 0).all()
+
+
+def test_no_bubbles_gives_empty_fills():
+    filled, area = evaluation.measure_bubble_fills(np.zeros((50, 50), np.uint8), [])
+    assert filled.shape == area.shape == (0, 4)
+
+
+def test_synthetic_sheet_is_read_correctly():
+    img, truth = make_sheet(num_questions=20, seed=3, rotation=2.0, skew=0.02, noise=4.0)
+    filled, area = evaluation.measure_fills(_threshold(img), 20)
+    assert decision.decide(filled, area)['answers'] == truth
+
+
+def test_dense_sheet_detects_every_question_after_reduced_decode():
+    img, truth = make_sheet(num_questions=100, width=1200, seed=4)
+    ok, encoded = cv2.imencode('.png', img)
+    info = {}
+    gray = preprocessing.decode_image(encoded.tobytes(), max_dim=2000, info=info)
+    assert info['factor'] == 2 and max(gray.shape) < max(img.shape[:2])
+
+    thresh = preprocessing.preprocess_array(gray, decode_factor=info['factor'])
+    filled, area = evaluation.measure_fills(thresh, 100,
+                                            min_size=evaluation.bubble_min_size(info['factor']))
+    assert filled.shape == (100, 4) and (area > 0).all()
+    assert decision.decide(filled, area)['answers'] == truth
+
+
+def test_evaluate_sheet_prints_decisions_in_debug(tmp_path, capsys):
+    img, truth = make_sheet(num_questions=5, seed=5)
+    path = str(tmp_path / "sheet.png")
+    cv2.imwrite(path, img)
+
+    assert evaluation.evaluate_sheet(path, 5, debug=True) == truth
+    out = capsys.readouterr().out
+    assert "Fill levels: blank" in out and "Question 5:" in out
+
+
+def test_parallel_evaluation_matches_the_serial_order(tmp_path):
+    truths = {}
+    for seed in range(7):
+        img, truths[f"sheet_{seed}.png"] = make_sheet(num_questions=6, seed=seed, noise=3.0)
+        cv2.imwrite(str(tmp_path / f"sheet_{seed}.png"), img)
+    (tmp_path / "sheet_7.png").write_bytes(b"not an image")
+    sheets = [str(tmp_path / f"sheet_{i}.png") for i in (3, 7, 0, 6, 1, 5, 2, 4)]
+    key = truths["sheet_0.png"]
+
+    serial = list(evaluation.iter_evaluate(sheets, 6, key))
+    parallel = list(evaluation.iter_evaluate(sheets, 6, key, workers=3, chunksize=2))
+
+    assert parallel == serial
+    assert [row['Student_ID'] for row in serial] == [f"sheet_{i}.png" for i in (3, 0, 6, 1, 5, 2, 4)]
+    assert all({q: row[q] or None for q in range(1, 7)} == truths[row['Student_ID']] for row in serial)
+
+
+def test_iter_evaluate_consumes_sheets_as_it_yields(tmp_path, monkeypatch):
+    monkeypatch.setattr(evaluation, 'SCORE_BATCH', 2)
+    img, truth = make_sheet(num_questions=4, seed=6)
+    path = str(tmp_path / "sheet.png")
+    cv2.imwrite(path, img)
+    pulled = []
+
+    def sheets():
+        for i in range(10):
+            pulled.append(i)
+            yield path
+
+    rows = evaluation.iter_evaluate(sheets(), 4, truth)
+    first = next(rows)
+    assert first['Total_Score'] == sum(1 for answer in truth.values() if answer)
+    assert len(pulled) < 10
+    assert len(list(rows)) == 9 and len(pulled) == 10
+
+
+def test_pool_tasks_print_decisions_in_debug(tmp_path, capsys):
+    img, truth = make_sheet(num_questions=5, seed=6)
+    cv2.imwrite(str(tmp_path / "sheet.png"), img)
+
+    rows = list(evaluation.iter_evaluate(str(tmp_path), 5, truth, debug=True))
+    assert rows[0]['Total_Score'] == sum(1 for answer in truth.values() if answer)
+    out = capsys.readouterr().out
+    assert "Decisions for sheet.png:" in out and "Question 5:" in out
@@ -0,0 +1,111 @@
+import io
+import tarfile
+import zipfile
+import zlib
+
+import pytest
+
+from omr_core import ingest, sources
+
+MEMBERS = {'a/sheet1.png': b'\x89PNG' + bytes(range(256)) * 40, 'sheet2.jpg': b'\xff\xd8' + b'x' * 5000}
+
+
+class _Chunked:
+    """A non-seekable upload body returning at most ``size`` bytes per read, like a socket."""
+
+    def __init__(self, data, size=7):
+        self._data = io.BytesIO(data)
+        self._size = size
+
+    def read(self, n=-1):
+        return self._data.read(self._size if n is None or n < 0 else min(n, self._size))
+
+
+class _WriteOnly:
+    """An unseekable output, so zipfile writes data descriptors after deflated members."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _read_all(data):
+    return {name: member.read() for name, member in ingest.iter_archive(_Chunked(data))}
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip_members_are_streamed(compression):
+    assert _read_all(_zip(MEMBERS, compression)) == MEMBERS
+
+
+def test_zip_with_data_descriptors():
+    out = _WriteOnly()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in MEMBERS.items():
+            with archive.open(name, 'w') as f:
+                f.write(data)
+    data = out.buffer.getvalue()
+    assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].flag_bits & 0x08
+    assert _read_all(data) == MEMBERS
+
+
+def test_unread_members_are_skipped():
+    names = [name for name, _ in ingest.iter_archive(_Chunked(_zip(MEMBERS)))]
+    assert names == list(MEMBERS)
+
+
+def test_corrupt_zip_member_fails_the_crc_check():
+    data = bytearray(_zip(MEMBERS, zipfile.ZIP_STORED))
+    data[data.index(b'\x89PNG') + 100] ^= 0xFF
+    with pytest.raises(ValueError, match="CRC mismatch"):
+        _read_all(bytes(data))
+
+
+def test_truncated_zip():
+    data = _zip(MEMBERS)
+    with pytest.raises(ValueError, match="truncated"):
+        _read_all(data[:len(data) // 2])
+
+
+@pytest.mark.parametrize("mode", ["w|", "w|gz"])
+def test_tar_members_are_streamed(mode):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    assert _read_all(buffer.getvalue()) == MEMBERS
+
+
+def test_not_an_archive():
+    with pytest.raises(ValueError, match="Empty upload"):
+        _read_all(b'')
+    with pytest.raises(ValueError, match="tar"):
+        _read_all(zlib.compress(b'plain text') * 100)
+
+
+def test_archive_sheets_skip_metadata_and_other_files(tmp_path):
+    data = _zip({**MEMBERS, '__MACOSX/a/._sheet1.png': b'meta', 'a/.hidden.png': b'x', 'notes.txt': b'hello',
+                 'folder/': b''})
+    sheets = list(ingest.iter_archive_sheets(_Chunked(data), str(tmp_path)))
+    assert all(isinstance(s, sources.MemorySheet) for s in sheets)
+    assert {s.name: s.data for s in sheets} == MEMBERS
+
+
+def test_oversized_image_member_fails(tmp_path):
+    with pytest.raises(ValueError, match="larger than"):
+        list(ingest.iter_archive_sheets(_Chunked(_zip(MEMBERS)), str(tmp_path), max_image_bytes=1000))
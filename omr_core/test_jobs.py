@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+
+from omr_core import jobs
+
+
+@pytest.fixture
+def queues(tmp_path, monkeypatch):
+    """Two queues on one jobs folder, like two web processes; jobs are recorded instead of run."""
+    dispatched = []
+    monkeypatch.setattr(jobs.JobQueue, '_dispatch', lambda self, job_id: dispatched.append((self, job_id)))
+    monkeypatch.setattr(jobs.JobQueue, '_run', lambda self, job_id: None)
+    return jobs.JobQueue(str(tmp_path)), jobs.JobQueue(str(tmp_path)), dispatched
+
+
+def _submit(queue, **kwargs):
+    job_id, _, job_dir = queue.create_job()
+    queue.submit(job_id, os.path.join(job_dir, 'key.csv'), **kwargs)
+    return job_id
+
+
+def _set(queue, job_id, **fields):
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with queue._connect() as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+def test_a_job_is_claimed_by_one_process(queues):
+    first, second, _ = queues
+    job_id = _submit(first)
+
+    assert first._claim(job_id)
+    assert not second._claim(job_id)
+    job = first.get(job_id)
+    assert job['status'] == jobs.RUNNING and job['owner'] == first.owner
+
+
+def test_a_job_with_an_expired_lease_is_taken_over(queues):
+    first, second, dispatched = queues
+    job_id = _submit(first)
+    assert first._claim(job_id)
+    _set(first, job_id, lease=time.time() - 1)
+
+    second.start()
+    assert (second, job_id) in dispatched
+    assert second._claim(job_id)
+    assert second.get(job_id)['owner'] == second.owner
+
+    # The first process no longer owns the job, so its late writes are ignored
+    first._update(job_id, first.owner, status=jobs.DONE)
+    assert second.get(job_id)['status'] == jobs.RUNNING
+
+
+def test_live_jobs_are_left_alone(queues):
+    first, second, dispatched = queues
+    job_id = _submit(first)
+    assert first._claim(job_id)
+    streamed_id = _submit(first, sheets=[])
+    dispatched.clear()
+
+    second.start()
+    assert dispatched == []
+    assert second.get(streamed_id)['status'] == jobs.RUNNING
+
+
+def test_streamed_jobs_of_a_dead_process_fail(queues):
+    first, second, _ = queues
+    job_id = _submit(first, sheets=[])
+    _set(first, job_id, lease=time.time() - 1)
+
+    second.start()
+    job = second.get(job_id)
+    assert job['status'] == jobs.FAILED
+    assert "upload the archive again" in job['summary']
+
+
+def test_start_checks_the_database_once_per_lease(queues):
+    first, _, dispatched = queues
+    first.start()
+    job_id = _submit(first)
+    dispatched.clear()
+    first.start()
+    assert dispatched == []
+
+    first._last_sweep -= jobs.LEASE_SECONDS
+    first.start()
+    assert dispatched == [(first, job_id)]
+
+
+def test_expire_deletes_old_finished_jobs_and_orphan_folders(queues):
+    first, _, _ = queues
+    old_done, recent_done, old_running = _submit(first), _submit(first), _submit(first)
+    old = time.time() - 3600
+    _set(first, old_done, status=jobs.DONE, updated=old)
+    _set(first, recent_done, status=jobs.FAILED)
+    _set(first, old_running, status=jobs.RUNNING, updated=old)
+    orphan, _, _ = first.create_job()
+    os.utime(os.path.join(first.jobs_dir, orphan), (old, old))
+
+    assert first.expire(max_age=60) == 1
+    assert first.get(old_done) is None
+    assert not os.path.exists(os.path.join(first.jobs_dir, old_done))
+    assert not os.path.exists(os.path.join(first.jobs_dir, orphan))
+    for job_id in (recent_done, old_running):
+        assert first.get(job_id) is not None
+        assert os.path.isdir(os.path.join(first.jobs_dir, job_id))
+
+
+def test_no_retention_keeps_every_job(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path), max_age=None)
+    assert queue.expire() == 0
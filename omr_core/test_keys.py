@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from omr_core import keys
+
+
+def _write_key(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Question,Answer\n")
+        f.writelines(f"{q},{answer}\n" for q, answer in rows)
+    return str(path)
+
+
+def test_compile_key_masks():
+    key = keys.compile_key({1: 'A', 2: 'b,d', 4: 'C'})
+    assert key.key_mask.tolist() == [0b0001, 0b1010, 0, 0b0100]
+    assert key.to_dict() == {1: 'A', 2: 'BD', 4: 'C'}
+    assert key.warnings == ["No answer for question(s) 3; they are not scored."]
+
+
+def test_compile_key_rejects_invalid_entries():
+    with pytest.raises(ValueError, match=r"options A-D\): question 2: 'E', question 0"):
+        keys.compile_key({1: 'A', 2: 'E', 0: 'B'})
+    with pytest.raises(ValueError, match="empty"):
+        keys.compile_key({})
+    assert keys.compile_key({1: 'E'}, options_per_question=5).key_mask.tolist() == [0b10000]
+
+
+def test_compiled_key_is_cached_by_content(tmp_path, monkeypatch):
+    path = _write_key(tmp_path / "key.csv", [(1, 'A'), (2, 'C')])
+    cache_dir = str(tmp_path / "keys")
+
+    key, cached = keys.load_key(path, cache_dir)
+    assert not cached and key.to_dict() == {1: 'A', 2: 'C'}
+
+    # A cache hit never parses the file again
+    monkeypatch.setattr(keys, 'parse_key_file', lambda path: pytest.fail("key file parsed again"))
+    key, cached = keys.load_key(path, cache_dir)
+    assert cached and key.to_dict() == {1: 'A', 2: 'C'} and key.digest == keys.file_digest(path)
+
+
+def test_changed_key_file_is_compiled_again(tmp_path):
+    path = _write_key(tmp_path / "key.csv", [(1, 'A'), (2, 'C')])
+    cache_dir = str(tmp_path / "keys")
+    keys.load_key(path, cache_dir)
+
+    _write_key(path, [(1, 'B'), (2, 'C')])
+    key, cached = keys.load_key(path, cache_dir)
+    assert not cached and key.to_dict() == {1: 'B', 2: 'C'}
+
+    # Same file, other option count: a separate entry
+    key, cached = keys.load_key(path, cache_dir, options_per_question=5)
+    assert not cached and key.options_per_question == 5
+    assert len(os.listdir(cache_dir)) == 3
+
+
+@pytest.mark.parametrize("damage", ["junk", "truncated"])
+def test_unreadable_cache_entry_is_replaced(tmp_path, damage):
+    path = _write_key(tmp_path / "key.csv", [(1, 'D')])
+    cache_dir = str(tmp_path / "keys")
+    keys.load_key(path, cache_dir)
+    (entry,) = os.listdir(cache_dir)
+    entry = os.path.join(cache_dir, entry)
+    with open(entry, 'rb') as f:
+        data = f.read()
+    with open(entry, 'wb') as f:
+        f.write(b'not a key' if damage == "junk" else data[:len(data) // 2])
+
+    key, cached = keys.load_key(path, cache_dir)
+    assert not cached and key.to_dict() == {1: 'D'}
+    assert keys.load_key(path, cache_dir)[1]
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported answer key format"):
+        keys.load_key(str(tmp_path / "key.txt"))
@@ -0,0 +1,119 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_sheet
+from omr_core import evaluation, jobs, overlay, preprocessing
+from omr_core.results import decode_answer
+
+QUESTIONS = 6
+
+
+def _record(folder, seeds=(0, 1)):
+    """Evaluate synthetic sheets in ``folder`` with a GeometryWriter; returns the truths."""
+    truths = {}
+    for seed in seeds:
+        img, truths[f"sheet_{seed}.png"] = make_sheet(num_questions=QUESTIONS, seed=seed)
+        cv2.imwrite(os.path.join(folder, f"sheet_{seed}.png"), img)
+    with overlay.GeometryWriter(folder) as writer:
+        list(evaluation.iter_evaluate(folder, QUESTIONS, truths["sheet_0.png"], geometry_writer=writer))
+    return truths
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    truths = _record(str(tmp_path))
+    return str(tmp_path / overlay.GEOMETRY_FILENAME), truths
+
+
+def _green_pixels(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    b, g, r = cv2.split(img.astype(np.int16))
+    return img, int(np.count_nonzero((g > 110) & (g - r > 60) & (g - b > 60)))
+
+
+def test_geometry_is_recorded_for_every_sheet(recorded):
+    path, truths = recorded
+    assert list(overlay.load_index(path)) == ["sheet_0.png", "sheet_1.png"]
+    assert not os.path.exists(path + ".part")
+
+    for name, truth in truths.items():
+        geometry = overlay.load_geometry(path, name)
+        assert geometry['circles'].shape == (QUESTIONS, 4, 3) and geometry['ratios'].shape == (QUESTIONS, 4)
+        assert {q: decode_answer(code) for q, code in enumerate(geometry['chosen'], 1)} == truth
+        assert geometry['source'] == os.path.join(os.path.dirname(path), name)
+
+    with pytest.raises(LookupError):
+        overlay.load_geometry(path, "missing.png")
+    with pytest.raises(LookupError):
+        overlay.get_overlay(os.path.join(os.path.dirname(path), "none.zip"), "sheet_0.png")
+
+
+def test_overlay_is_rendered_from_the_recorded_geometry(recorded, monkeypatch):
+    path, _ = recorded
+
+    def no_detection(*args, **kwargs):
+        pytest.fail("the overlay ran the detection again")
+
+    monkeypatch.setattr(preprocessing, 'preprocess_array', no_detection)
+    img, green = _green_pixels(overlay.get_overlay(path, "sheet_0.png", max_dim=400))
+    assert max(img.shape[:2]) == 400 and green > 0
+
+    # Without its image the sheet is drawn on a blank page
+    os.remove(os.path.join(os.path.dirname(path), "sheet_1.png"))
+    img, green = _green_pixels(overlay.get_overlay(path, "sheet_1.png", max_dim=400))
+    assert green > 0 and np.median(img) == 255
+
+
+def test_cached_overlays_are_not_rendered_again(recorded, tmp_path, monkeypatch):
+    path, _ = recorded
+    cache = overlay.OverlayCache(str(tmp_path / "overlays"))
+    data = overlay.get_overlay(path, "sheet_0.png", cache=cache)
+
+    monkeypatch.setattr(overlay, 'render_overlay', lambda *args: pytest.fail("rendered again"))
+    assert overlay.get_overlay(path, "sheet_0.png", cache=cache) == data
+
+
+def test_overlay_cache_evicts_least_recently_used_at_the_byte_limit(tmp_path):
+    cache = overlay.OverlayCache(str(tmp_path), max_bytes=3000)
+    keys = [f"{i:02d}".ljust(64, "0") for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, bytes(1000))
+        os.utime(cache._path(key), (i, i))
+    assert cache.get(keys[0]) == bytes(1000)  # now the most recently used
+
+    cache.put(keys[3], bytes(1000))
+    # Over the limit: evicted down to 80% of it, oldest first
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('OMR_JOBS_DIR', str(tmp_path / "jobs"))
+    import frontend
+
+    monkeypatch.setattr(jobs.JobQueue, '_dispatch', lambda self, job_id: None)
+    queue = jobs.JobQueue(str(tmp_path / "jobs"))
+    monkeypatch.setattr(frontend, 'job_queue', queue)
+    monkeypatch.setattr(frontend, 'OVERLAY_CACHE_DIR', str(tmp_path / "overlays"))
+    monkeypatch.setattr(frontend, '_overlay_cache', None)
+    return frontend.app.test_client(), queue
+
+
+def test_overlay_route(client):
+    client, queue = client
+    job_id, sheets_dir, job_dir = queue.create_job()
+    queue.submit(job_id, os.path.join(job_dir, "key.csv"))
+
+    response = client.get(f"/jobs/{job_id}/overlay?sheet=sheet_0.png")
+    assert response.status_code == 404  # no geometry recorded yet
+
+    _record(sheets_dir, seeds=(0,))
+    response = client.get(f"/jobs/{job_id}/overlay?sheet=sheet_0.png&size=300")
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+
+    response = client.get(f"/jobs/{job_id}/overlay?sheet=unknown.png")
+    assert response.status_code == 404 and response.get_json() == {'error': "Unknown sheet: unknown.png"}
+    assert client.get("/jobs/no-such-job/overlay?sheet=sheet_0.png").status_code == 404
@@ -0,0 +1,144 @@
+import csv
+import os
+
+import cv2
+import pytest
+
+from benchmarks.synthetic import make_sheet
+from omr_core import evaluation, pipeline
+
+QUESTIONS = 5
+
+
+def _write_key(path, truth):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Question,Answer\n")
+        f.writelines(f"{q},{answer or 'A'}\n" for q, answer in truth.items())
+    return str(path)
+
+
+@pytest.fixture
+def sheets(tmp_path):
+    folder = tmp_path / "sheets"
+    folder.mkdir()
+    for seed in range(3):
+        img, truth = make_sheet(num_questions=QUESTIONS, seed=seed)
+        cv2.imwrite(str(folder / f"sheet_{seed}.png"), img)
+    return str(folder), _write_key(tmp_path / "key.csv", truth)
+
+
+def _run(folder, key, tmp_path):
+    return pipeline.run_full_pipeline(folder, key, cache_dir=None, output_dir=str(tmp_path / "report"),
+                                      write_parquet=False, write_geometry=False)
+
+
+def test_scores_are_streamed_into_the_csv(sheets, tmp_path):
+    folder, key = sheets
+    log, plots = _run(folder, key, tmp_path)
+
+    assert "Evaluation processed 3 OMR sheets" in log and plots
+    with open(os.path.join(folder, "OMR_Scores.csv"), newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['Student_ID'] for row in rows] == [f"sheet_{i}.png" for i in range(3)]
+    # The key is sheet_2's answers with its blank questions keyed as A
+    blanks = sum(1 for q in range(1, QUESTIONS + 1) if not rows[2][str(q)])
+    assert float(rows[2]['Total_Score']) == QUESTIONS - blanks
+    assert not os.path.exists(os.path.join(folder, "OMR_Scores.csv.part"))
+
+
+def test_failed_run_keeps_the_previous_results(sheets, tmp_path, monkeypatch):
+    folder, key = sheets
+    _run(folder, key, tmp_path)
+    with open(os.path.join(folder, "OMR_Scores.csv"), 'rb') as f:
+        previous = f.read()
+
+    def failing(*args, **kwargs):
+        yield from list(iter_evaluate(*args, **kwargs))[:1]
+        raise RuntimeError("worker crashed")
+
+    iter_evaluate = evaluation.iter_evaluate
+    monkeypatch.setattr(evaluation, 'iter_evaluate', failing)
+    log, plots = _run(folder, key, tmp_path)
+
+    assert "Evaluation failed: worker crashed" in log and plots == []
+    assert not os.path.exists(os.path.join(folder, "OMR_Scores.csv.part"))
+    with open(os.path.join(folder, "OMR_Scores.csv"), 'rb') as f:
+        assert f.read() == previous
+
+
+@pytest.fixture
+def exam_sets(tmp_path):
+    root = tmp_path / "exam"
+    answer_keys = {}
+    for set_name, seeds in (("Set_A", (0, 1)), ("Set_B", (2, 3, 4))):
+        (root / set_name).mkdir(parents=True)
+        for seed in seeds:
+            img, truth = make_sheet(num_questions=QUESTIONS, seed=seed)
+            cv2.imwrite(str(root / set_name / f"sheet_{seed}.png"), img)
+        answer_keys[set_name[-1]] = _write_key(tmp_path / f"key_{set_name}.csv", truth)
+    return root, answer_keys
+
+
+def test_discover_sets_skips_folders_that_are_not_sets(exam_sets):
+    root, _ = exam_sets
+    for name in ("report", ".thumbnails", "notes"):
+        (root / name).mkdir()
+    cv2.imwrite(str(root / "report" / "Set_A_score_plot.png"), make_sheet(num_questions=1)[0])
+    cv2.imwrite(str(root / ".thumbnails" / "sheet_0.png"), make_sheet(num_questions=1)[0])
+    (root / "notes" / "readme.txt").write_text("not a set")
+    (root / "OMR_Scores_All_Sets.csv").write_text("")
+
+    assert list(pipeline.discover_sets(str(root))) == ["Set_A", "Set_B", "report"]
+    assert pipeline.discover_sets(str(root), exclude=[str(root / "report")]) == \
+        {"Set_A": str(root / "Set_A"), "Set_B": str(root / "Set_B")}
+
+
+def test_match_set_keys_normalises_set_names():
+    sets = {"Set_A": "a", "set b": "b", "Set-C": "c"}
+    pairs, missing = pipeline.match_set_keys(sets, {"A": "key_a.csv", "Set_B": "key_b.csv", "set_d": "key_d.csv"})
+    assert pairs == [("Set_A", "a", "key_a.csv"), ("set b", "b", "key_b.csv")]
+    assert missing == ["Set-C"]
+
+
+def _run_sets(root, answer_keys, **kwargs):
+    return pipeline.run_multi_set_pipeline(str(root), answer_keys, cache_dir=None,
+                                           output_dir=str(root / "report"), write_geometry=False, **kwargs)
+
+
+def test_multi_set_run_writes_per_set_and_combined_results(exam_sets):
+    root, answer_keys = exam_sets
+    log, plots = _run_sets(root, answer_keys)
+    # Running again, with the report folder inside the exam folder, finds the same two sets
+    log, plots = _run_sets(root, answer_keys)
+
+    assert "Evaluation processed 5 OMR sheets in 2 sets" in log and "No answer key" not in log
+    assert {p.split("_")[0] for p in plots} == {"Set", "All Sets"}
+    with open(root / "OMR_Scores_All_Sets.csv", newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['Set'], row['Student_ID']) for row in rows] == \
+        [("Set_A", "sheet_0.png"), ("Set_A", "sheet_1.png"),
+         ("Set_B", "sheet_2.png"), ("Set_B", "sheet_3.png"), ("Set_B", "sheet_4.png")]
+    for set_name in ("Set_A", "Set_B"):
+        assert os.path.exists(root / set_name / "OMR_Scores.csv")
+        assert os.path.isdir(root / "OMR_Scores.parquet" / f"exam_set={set_name}")
+    assert not [p for p in root.rglob("*.part")]
+
+
+def test_failed_multi_set_run_leaves_no_partial_files(exam_sets, monkeypatch):
+    root, answer_keys = exam_sets
+    _run_sets(root, answer_keys, write_parquet=False)
+    with open(root / "OMR_Scores_All_Sets.csv", 'rb') as f:
+        previous = f.read()
+
+    def failing(*args, **kwargs):
+        yield from list(iter_evaluate_sets(*args, **kwargs))[:3]
+        raise RuntimeError("worker crashed")
+
+    iter_evaluate_sets = evaluation.iter_evaluate_sets
+    monkeypatch.setattr(evaluation, 'iter_evaluate_sets', failing)
+    log, plots = _run_sets(root, answer_keys, write_parquet=False)
+
+    assert "Evaluation failed: worker crashed" in log and plots == []
+    assert not [p for p in root.rglob("*.part")]
+    with open(root / "OMR_Scores_All_Sets.csv", 'rb') as f:
+        assert f.read() == previous
@@ -1,9 +1,44 @@
-from preprocessing import preprocess_image
 import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_sheet
+from omr_core import decision, evaluation, preprocessing
+
+
+def test_corners_found_on_a_downscaled_copy_map_back_to_full_resolution():
+    img, _ = make_sheet(num_questions=30, width=2000, rotation=3.0, skew=0.02, seed=1)
+    full = preprocessing.find_document_corners(img, None)
+    assert full is not None
+
+    for detect_max_dim in (1000, 500):
+        assert max(img.shape[:2]) > detect_max_dim
+        corners = preprocessing.find_document_corners(img, detect_max_dim)
+        # One downscaled pixel spans several full-resolution ones
+        tolerance = 2.0 * max(img.shape[:2]) / detect_max_dim
+        assert np.abs(preprocessing.order_points(corners) - preprocessing.order_points(full)).max() <= tolerance
+
+
+def _read(gray, num_questions, method, monkeypatch):
+    monkeypatch.setattr(preprocessing, 'THRESHOLD_METHOD', method)
+    filled, area = evaluation.measure_fills(preprocessing.preprocess_array(gray), num_questions)
+    return decision.decide(filled, area)['answers']
+
+
+def test_adaptive_threshold_reads_an_unevenly_lit_sheet(monkeypatch):
+    img, truth = make_sheet(num_questions=30, seed=2, noise=3.0)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    assert _read(gray, 30, 'global', monkeypatch) == _read(gray, 30, 'adaptive', monkeypatch) == truth
+
+    # A shadow darkening the left of the page: its paper falls below the global threshold
+    shade = np.linspace(0.45, 1.0, gray.shape[1])[None, :] * np.linspace(1.0, 0.8, gray.shape[0])[:, None]
+    shaded = (gray * shade).astype(np.uint8)
+    assert _read(shaded, 30, 'global', monkeypatch) != truth
+    assert _read(shaded, 30, 'adaptive', monkeypatch) == truth
+
 
 if __name__ == "__main__":
     img_path = r"C:\Users\enugu sarika reddy\OneDrive\Desktop\omr_system\uploads\OMR-CTET-SHEET-Sample.jpg"  # Change this to your actual OMR image file path
-    processed_img = preprocess_image(img_path)
+    processed_img = preprocessing.preprocess_image(img_path)
     
     if processed_img is not None:
         cv2.imshow("Processed OMR Image", processed_img)
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_sheet
+from omr_core import evaluation, quality, sources
+from omr_core.cache import FillCache
+
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+@pytest.mark.parametrize("width", [800, 1200])
+def test_dense_sheet_passes(width):
+    img, _ = make_sheet(num_questions=100, width=width, seed=1, rotation=1.5, noise=4.0)
+    check = quality.check_sheet(_gray(img), 100)
+    assert check['ok'], check['reasons']
+    assert check['bubbles'] == check['expected_bubbles'] == 400
+
+
+def test_half_size_decode_passes():
+    img, _ = make_sheet(num_questions=100, width=1200, seed=2)
+    half = cv2.resize(_gray(img), None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    check = quality.check_sheet(half, 100, decode_factor=2)
+    assert check['ok'], check['reasons']
+
+
+def test_missing_bubbles_are_rejected():
+    img, _ = make_sheet(num_questions=20, seed=3)
+    check = quality.check_sheet(_gray(img), 100)
+    assert not check['ok']
+    assert check['reasons'] == [f"found {check['bubbles']} of 400 expected bubbles"]
+
+
+def test_blank_and_blurry_images_are_rejected():
+    blank = np.full((1200, 900), 200, np.uint8)
+    assert quality.check_sheet(blank, 10)['reasons'][0].startswith("blank or uniform image")
+
+    img, _ = make_sheet(num_questions=20, seed=4)
+    blurry = cv2.GaussianBlur(_gray(img), (0, 0), 12)
+    assert any(r.startswith("blurry") for r in quality.check_sheet(blurry, 20)['reasons'])
+
+
+def test_cache_hits_passed_the_same_checks(tmp_path):
+    cache = FillCache(str(tmp_path))
+    img, _ = make_sheet(num_questions=20, seed=5)
+    sheet = sources.MemorySheet("sheet.png", cv2.imencode('.png', img)[1].tobytes())
+
+    # Cached without the checks: a run with the checks on does not reuse the entry
+    evaluation.measure_sheet(sheet, 20, cache=cache, preflight=False)
+    timings = {}
+    _, cached = evaluation.measure_sheet(sheet, 20, cache=cache, preflight=True, timings=timings)
+    assert not cached and 'preflight' in timings
+
+    _, cached = evaluation.measure_sheet(sheet, 20, cache=cache, preflight=True)
+    assert cached
+
+    # Rejected sheets are never cached, so they are rejected on every run
+    for _ in range(2):
+        with pytest.raises(quality.SheetRejected):
+            evaluation.measure_sheet(sheet, 100, cache=cache, preflight=True)
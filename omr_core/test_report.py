@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from omr_core import report
+
+
+def _scores(students):
+    return pd.DataFrame({'Student_ID': [f"s{i}" for i in range(students)],
+                         'Total_Score': [i % 7 for i in range(students)]})
+
+
+def _legacy_summary(df):
+    # The shape summary.create_summary returns: no histogram or per-question aggregates
+    return {'average_score': df['Total_Score'].mean(), 'max_score': df['Total_Score'].max(),
+            'min_score': df['Total_Score'].min(), 'top_students': [], 'total_students': len(df)}
+
+
+def test_legacy_summary_of_a_large_cohort_gets_a_histogram():
+    df = _scores(report.MAX_BAR_STUDENTS + 10)
+    specs = report.plot_specs(_legacy_summary(df), df)
+    assert [kind for kind, _, _ in specs] == ['histogram']
+    data = specs[0][2]
+    assert data['scores'] == [float(s) for s in range(7)]
+    assert sum(data['counts']) == len(df)
+
+    assert report.plot_specs(_legacy_summary(df)) == []
+
+
+def test_generate_report_returns_csv_and_score_plot(tmp_path):
+    df = _scores(5)
+    summary_data = {**_legacy_summary(df), 'question_correct_rate': np.array([0.5, 1.0]),
+                    'option_counts': np.array([[2, 1, 0, 0, 1, 1], [5, 0, 0, 0, 0, 0]])}
+    plot_paths = []
+    csv_path, plot_path = report.generate_report(df, summary_data, str(tmp_path), plot_paths=plot_paths)
+
+    assert os.path.exists(csv_path)
+    assert plot_path == str(tmp_path / "Set_score_plot.png")
+    assert plot_paths[0] == plot_path and len(plot_paths) == 3
+    assert all(os.path.exists(p) for p in plot_paths)
+
+
+def test_few_plots_render_in_process(tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        pytest.fail("a process pool was started for a handful of plots")
+
+    monkeypatch.setattr(report, 'ProcessPoolExecutor', no_pool)
+    df = _scores(report.MAX_BAR_STUDENTS + 10)
+    paths, hits = report.render_plots(report.plot_specs(_legacy_summary(df), df), str(tmp_path), workers=4)
+    assert hits == 0 and os.path.exists(paths[0])
+
+
+def test_deferred_reports_render_together_in_a_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class InlinePool:
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        map = staticmethod(map)
+
+    monkeypatch.setattr(report, 'ProcessPoolExecutor', InlinePool)
+    deferred, plot_paths = [], []
+    for name in ("Set_A", "Set_B", "All Sets"):
+        df = _scores(5)
+        summary_data = {**_legacy_summary(df), 'question_correct_rate': np.array([0.5, 1.0]),
+                        'option_counts': np.array([[2, 1, 0, 0, 1, 1], [5, 0, 0, 0, 0, 0]])}
+        report.generate_report(df, summary_data, str(tmp_path), set_name=name, plot_paths=plot_paths,
+                               deferred_plots=deferred)
+    assert len(deferred) == len(plot_paths) == 9 >= report.PARALLEL_MIN_PLOTS
+    assert not any(os.path.exists(p) for p in plot_paths)
+
+    paths, hits = report.render_plots(deferred, str(tmp_path), workers=4)
+    assert pools == [4] and paths == plot_paths and hits == 0
+    assert all(os.path.exists(p) for p in paths)
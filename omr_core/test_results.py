@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from omr_core import results
+
+pytest.importorskip("pyarrow")
+
+
+def _row(student, answers, score):
+    return {'Student_ID': student, **dict(enumerate(answers, 1)), 'Total_Score': score,
+            'Confidence': 0.5, 'Review': "2" if score < 1 else ""}
+
+
+def _write(root, exam_set, rows, num_questions=3):
+    with results.ResultsWriter(root, exam_set, num_questions, row_group_size=2) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer
+
+
+def test_results_round_trip(tmp_path):
+    root = str(tmp_path / "OMR_Scores.parquet")
+    writer = _write(root, "A", [_row("s1", ["A", "AC", None], 2.0), _row("s2", ["D", None, "B"], 0.5),
+                                _row("s3", ["B", "B", "B"], 3.0)])
+    assert writer.rows == 3 and os.path.exists(writer.path)
+    _write(root, "B", [_row("t1", ["C", "D"], 1.0)], num_questions=2)
+
+    df = results.load_results(root, letters=True)
+    assert list(df.columns) == ['Student_ID', 'exam_set', 'Q1', 'Q2', 'Q3', 'Total_Score', 'Confidence', 'Review']
+    df = df.sort_values('Student_ID').reset_index(drop=True)
+    assert list(df['Student_ID']) == ["s1", "s2", "s3", "t1"]
+    assert list(df['exam_set']) == ["A", "A", "A", "B"]
+    # Blank answers and questions a set does not have are both empty
+    assert df['Q2'].fillna("").tolist() == ["AC", "", "B", "D"]
+    assert df['Q3'].fillna("").tolist() == ["", "B", "B", ""]
+    assert df['Total_Score'].tolist() == [2.0, 0.5, 3.0, 1.0]
+    assert df['Review'].tolist() == ["", "2", "", ""]
+
+    subset = results.load_results(root, questions=[1], students=["s2", "t1"], exam_sets=["A"])
+    assert list(subset['Student_ID']) == ["s2"] and subset['Q1'].tolist() == [0b1000]
+    assert 'Q2' not in subset.columns
+
+
+def test_aborted_run_keeps_the_previous_partition(tmp_path):
+    root = str(tmp_path / "OMR_Scores.parquet")
+    _write(root, "A", [_row("s1", ["A", "B", "C"], 3.0)])
+
+    writer = results.ResultsWriter(root, "A", 3, row_group_size=1)
+    writer.write(_row("new", ["D", "D", "D"], 0.0))
+    # The partition being written is not visible to readers
+    assert list(results.load_results(root)['Student_ID']) == ["s1"]
+    writer.abort()
+
+    assert list(results.load_results(root)['Student_ID']) == ["s1"]
+    assert os.listdir(root) == ["exam_set=A"]
+
+    # A completed run replaces the partition
+    _write(root, "A", [_row("s2", ["A", "A", "A"], 1.0)])
+    assert list(results.load_results(root)['Student_ID']) == ["s2"]
+    assert os.listdir(root) == ["exam_set=A"]
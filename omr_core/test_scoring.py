@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from omr_core import decision, evaluation, scoring
+
+
+def test_encode_marks_sets_one_bit_per_marked_option():
+    marked = np.array([[1, 0, 0, 0], [0, 0, 0, 0], [1, 0, 1, 0]], dtype=bool)
+    codes = scoring.encode_marks(marked)
+    assert codes.dtype == np.uint16
+    assert codes.tolist() == [0b0001, 0, 0b0101]
+
+
+def test_encode_responses_matches_encode_marks():
+    rng = np.random.default_rng(0)
+    marked = rng.random((50, 30, 5)) < 0.3
+    responses = [{'Student_ID': f"s{i}",
+                  **{q + 1: "".join("ABCDE"[o] for o in range(5) if m[q, o]) or None for q in range(30)}}
+                 for i, m in enumerate(marked)]
+    assert (scoring.encode_responses(responses, 30, 5) == scoring.encode_marks(marked)).all()
+
+
+def test_encode_responses_accepts_key_style_values():
+    codes = scoring.encode_responses([{1: 'a', 2: 'A,C', 3: ['b', 'd'], 4: float('nan'), 5: 'Z', 9: 'A'}], 5)
+    assert codes.tolist() == [[0b0001, 0b0101, 0b1010, 0, 0]]
+
+
+def test_score_responses_default_rules():
+    key_mask = scoring.encode_answer_key({1: 'A', 2: 'B', 3: 'A,C', 4: 'D'}, 5)
+    codes = scoring.encode_responses([
+        {1: 'A', 2: 'B', 3: 'C', 4: 'D', 5: 'A'},  # all correct; question 5 has no key
+        {1: 'B', 2: None, 3: 'AC', 4: 'D'},       # wrong, blank, multi-mark, correct
+    ], 5)
+    assert scoring.score_responses(codes, key_mask).tolist() == [4, 1]
+
+
+@pytest.mark.parametrize("multi_mark, expected", [("wrong", -0.5), ("zero", 0.25)])
+def test_score_responses_negative_marking(multi_mark, expected):
+    key_mask = scoring.encode_answer_key({1: 'A', 2: 'B', 3: 'C'}, 3)
+    codes = scoring.encode_responses([{1: 'A', 2: 'C', 3: 'AC'}], 3)
+    score = scoring.score_responses(codes, key_mask, negative=0.75, multi_mark=multi_mark)
+    assert score.tolist() == [expected]
+
+
+def test_score_responses_weights():
+    key_mask = scoring.encode_answer_key({1: 'A', 2: 'B'}, 2)
+    codes = scoring.encode_responses([{1: 'A', 2: 'B'}, {1: 'A', 2: 'A'}], 2)
+    assert scoring.score_responses(codes, key_mask, weights=[2, 3]).tolist() == [5.0, 2.0]
+
+
+def test_unknown_multi_mark_rule():
+    with pytest.raises(ValueError):
+        scoring.score_responses(np.zeros((1, 1), np.uint16), np.ones(1, np.uint16), multi_mark="half")
+
+
+def test_decision_codes_score_like_letters():
+    # The pipeline scores the decision's marked matrix directly; it must agree with its letters
+    rng = np.random.default_rng(1)
+    area = np.full((40, 4), 400)
+    filled = np.where(rng.random((40, 4)) < 0.3, 390, 40)
+    result = decision.decide(filled, area)
+    key_mask = scoring.encode_answer_key({q: 'ABCD'[q % 4] for q in range(1, 41)}, 40)
+    from_marks = scoring.score_responses(scoring.encode_marks(result['marked']), key_mask)
+    from_letters = scoring.score_responses(scoring.encode_responses([result['answers']], 40), key_mask)
+    assert from_marks.tolist() == from_letters.tolist()
+    assert evaluation.score_omr(result['answers'], {q: 'ABCD'[q % 4] for q in range(1, 41)}) == from_marks[0]
@@ -0,0 +1,49 @@
+import cv2
+import pytest
+from PIL import Image
+
+from benchmarks.synthetic import make_sheet
+from omr_core import evaluation, sources
+
+QUESTIONS = 5
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """A folder with one image sheet and a two-page scanned PDF."""
+    truths = {}
+    pages = []
+    for seed in range(3):
+        img, truths[seed] = make_sheet(num_questions=QUESTIONS, seed=seed)
+        pages.append(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)))
+    pages[0].save(tmp_path / "a_sheet.png")
+    pages[1].save(tmp_path / "batch.pdf", save_all=True, append_images=pages[2:], resolution=sources.PDF_DPI)
+    (tmp_path / "notes.txt").write_text("not a sheet")
+    return tmp_path, truths
+
+
+def test_pdf_pages_are_separate_sheets(folder):
+    path, _ = folder
+    pdf = str(path / "batch.pdf")
+    assert list(sources.iter_sheet_sources(str(path))) == [str(path / "a_sheet.png"), (pdf, 0), (pdf, 1)]
+    assert sources.count_sheets(str(path)) == 3
+    assert [sources.source_name(s) for s in sources.iter_sheet_sources(str(path))] == \
+        ["a_sheet.png", "batch.pdf#p0001", "batch.pdf#p0002"]
+
+
+def test_pdf_pages_are_rendered_and_evaluated(folder):
+    path, truths = folder
+    page = sources.load_sheet((str(path / "batch.pdf"), 1))
+    assert page.ndim == 2 and page.shape == cv2.imread(str(path / "a_sheet.png"), cv2.IMREAD_GRAYSCALE).shape
+
+    rows = list(evaluation.iter_evaluate(str(path), QUESTIONS, truths[2]))
+    assert [row['Student_ID'] for row in rows] == ["a_sheet.png", "batch.pdf#p0001", "batch.pdf#p0002"]
+    for row, seed in zip(rows, range(3)):
+        assert {q: row[q] or None for q in range(1, QUESTIONS + 1)} == truths[seed]
+
+
+def test_unreadable_pdf_is_skipped(folder, capsys):
+    path, _ = folder
+    (path / "broken.pdf").write_bytes(b"%PDF-1.4 truncated")
+    assert sources.count_sheets(str(path)) == 3
+    assert "Could not open PDF broken.pdf" in capsys.readouterr().out
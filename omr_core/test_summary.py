@@ -0,0 +1,52 @@
+import numpy as np
+
+from omr_core import summary
+
+
+def _row(student_id, score, answers=None):
+    return {'Student_ID': student_id, 'Total_Score': score, **(answers or {})}
+
+
+def test_scores_and_top_k():
+    acc = summary.SummaryAccumulator({1: 'A'}, top_k=2)
+    for i, score in enumerate([3, 7, 5, 7]):
+        acc.update(_row(f"s{i}", score))
+    result = acc.result()
+
+    assert result['total_students'] == 4
+    assert result['average_score'] == 5.5
+    assert (result['min_score'], result['max_score']) == (3, 7)
+    assert result['top_students'] == ['s1', 's3']
+    assert result['top_k'] == [('s1', 7), ('s3', 7)]
+    assert result['histogram'] == {3: 1, 5: 1, 7: 2}
+    assert np.isclose(result['std_score'], np.std([3, 7, 5, 7]))
+
+
+def test_tied_top_students_are_counted_not_stored():
+    acc = summary.SummaryAccumulator({1: 'A'}, top_sample=3)
+    for i in range(1000):
+        acc.update(_row(f"s{i}", 10))
+    result = acc.result()
+
+    assert result['top_students'] == ['s0', 's1', 's2']
+    assert result['top_students_count'] == 1000
+    assert summary.format_top_students(result) == "['s0', 's1', 's2'] (+997 more)"
+
+    acc.update(_row("best", 11))
+    result = acc.result()
+    assert result['top_students'] == ['best'] and result['top_students_count'] == 1
+    assert summary.format_top_students(result) == "['best']"
+
+
+def test_multi_marks_are_counted_apart_from_blanks():
+    acc = summary.SummaryAccumulator({1: 'A', 2: 'B'})
+    acc.update(_row("s0", 1, {1: 'A', 2: 'AC'}))
+    acc.update(_row("s1", 0, {1: None, 2: 'CA'}))
+    acc.update(_row("s2", 1, {1: 'a', 2: 'B'}))
+    acc.update(_row("s3", 0, {1: 'Z', 2: 'AZ'}))
+    result = acc.result()
+
+    # Columns: A, B, C, D, multi-marked, blank/unreadable
+    assert result['option_counts'][0].tolist() == [2, 0, 0, 0, 0, 2]
+    assert result['option_counts'][1].tolist() == [0, 1, 0, 0, 2, 1]
+    assert result['question_correct_rate'].tolist() == [0.5, 0.25]
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import make_sheet
+from omr_core import decision, preprocessing, template
+
+
+def _thresh(**kwargs):
+    img, truth = make_sheet(**kwargs)
+    return preprocessing.preprocess_array(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)), truth
+
+
+def test_build_template_from_image_finds_the_bubble_grid(tmp_path):
+    img, _ = make_sheet(num_questions=10, seed=1)
+    path = str(tmp_path / "reference.png")
+    cv2.imwrite(path, img)
+
+    layout = template.build_template_from_image(path, 10)
+    centres, radii = layout['centres'], layout['radii']
+    assert centres.shape == (10, 4, 2) and radii.shape == (10, 4)
+
+    # The synthetic page puts options 60px apart and questions 40px apart, radius 13px + outline
+    assert np.allclose(np.diff(centres[..., 0], axis=1), 60, atol=2)
+    assert np.allclose(np.diff(centres[..., 1], axis=0), 40, atol=2)
+    assert np.allclose(radii, radii.mean(), atol=1.5) and 12 <= radii.mean() <= 17
+
+
+def test_sample_template_reads_other_sheets():
+    reference, _ = _thresh(num_questions=10, seed=1)
+    layout = template.build_template(reference, 10)
+
+    for seed in (2, 3):
+        thresh, truth = _thresh(num_questions=10, seed=seed)
+        assert decision.decide(*template.sample_template(thresh, layout))['answers'] == truth
+
+    # A sheet scanned at another size is resized to the layout first
+    thresh, truth = _thresh(num_questions=10, width=1300, seed=4)
+    assert thresh.shape != layout['shape']
+    assert decision.decide(*template.sample_template(thresh, layout))['answers'] == truth
+
+
+def test_missing_template_bubbles_and_saved_layouts(tmp_path):
+    reference, _ = _thresh(num_questions=4, seed=5)
+    layout = template.build_template(reference, 4)
+    layout['radii'][2, 3] = 0
+
+    path = str(tmp_path / "layout.npz")
+    template.save_template(layout, path)
+    loaded = template.load_template(path)
+    assert template.template_digest(loaded) == template.template_digest(layout)
+
+    filled, area = template.sample_template(reference, loaded)
+    assert filled[2, 3] == area[2, 3] == -1
+    assert (area[area != -1] > 0).all()
@@ -0,0 +1,112 @@
+import csv
+import os
+
+import cv2
+import pytest
+
+from benchmarks.synthetic import make_sheet
+from omr_core import watch
+
+QUESTIONS = 5
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "sheets"
+    folder.mkdir()
+    for seed in range(3):
+        _add_sheet(folder, seed)
+    _, truth = make_sheet(num_questions=QUESTIONS, seed=0)
+    with open(tmp_path / "key.csv", 'w', encoding='utf-8') as f:
+        f.write("Question,Answer\n")
+        f.writelines(f"{q},{answer or 'A'}\n" for q, answer in truth.items())
+    return str(folder)
+
+
+def _add_sheet(folder, seed):
+    img, _ = make_sheet(num_questions=QUESTIONS, seed=seed)
+    cv2.imwrite(os.path.join(str(folder), f"sheet_{seed}.png"), img)
+
+
+def _watcher(folder):
+    return watch.FolderWatcher(folder, os.path.join(os.path.dirname(folder), "key.csv"), cache_dir=None,
+                               settle_seconds=0)
+
+
+def _csv_ids(folder):
+    with open(os.path.join(folder, watch.RESULTS_FILENAME), newline='', encoding='utf-8') as f:
+        return [row['Student_ID'] for row in csv.DictReader(f)]
+
+
+def _catch_up(watcher):
+    files, _ = watcher.scan()
+    if files:
+        watcher.process(files)
+    return files
+
+
+def test_restart_resumes_without_evaluating_again(folder):
+    watcher = _watcher(folder)
+    assert len(_catch_up(watcher)) == 3
+    watcher.close()
+
+    watcher = _watcher(folder)
+    try:
+        assert watcher.accumulator.count == 3
+        assert watcher.scan() == ([], 0)
+
+        _add_sheet(folder, 3)
+        files = _catch_up(watcher)
+        assert [name for name, _, _, _ in files] == ["sheet_3.png"]
+        assert sorted(_csv_ids(folder)) == [f"sheet_{i}.png" for i in range(4)]
+    finally:
+        watcher.close()
+
+
+def test_rows_written_after_the_last_commit_are_not_duplicated(folder):
+    watcher = _watcher(folder)
+    _catch_up(watcher)
+    # A crash after a CSV append whose checkpoint transaction never committed
+    watcher.checkpoint.conn.execute("DELETE FROM sheets WHERE name = 'sheet_2.png'")
+    watcher.checkpoint.conn.execute("DELETE FROM files WHERE name = 'sheet_2.png'")
+    watcher.checkpoint.commit()
+    watcher.close()
+
+    watcher = _watcher(folder)
+    try:
+        assert sorted(_csv_ids(folder)) == ["sheet_0.png", "sheet_1.png"]
+        assert [name for name, _, _, _ in _catch_up(watcher)] == ["sheet_2.png"]
+        assert sorted(_csv_ids(folder)) == [f"sheet_{i}.png" for i in range(3)]
+    finally:
+        watcher.close()
+
+
+def test_replaced_file_is_evaluated_again(folder):
+    watcher = _watcher(folder)
+    try:
+        _catch_up(watcher)
+        path = os.path.join(folder, "sheet_1.png")
+        img, _ = make_sheet(num_questions=QUESTIONS, seed=9)
+        cv2.imwrite(path, img)
+        os.utime(path, (1, 1))
+
+        assert [name for name, _, _, _ in _catch_up(watcher)] == ["sheet_1.png"]
+        assert sorted(_csv_ids(folder)) == [f"sheet_{i}.png" for i in range(3)]
+        assert watcher.accumulator.count == 3
+    finally:
+        watcher.close()
+
+
+def test_changed_answer_key_scores_every_sheet_again(folder):
+    watcher = _watcher(folder)
+    _catch_up(watcher)
+    watcher.close()
+
+    with open(os.path.join(os.path.dirname(folder), "key.csv"), 'a', encoding='utf-8') as f:
+        f.write(f"{QUESTIONS + 1},B\n")
+    watcher = _watcher(folder)
+    try:
+        assert watcher.accumulator.count == 0
+        assert len(_catch_up(watcher)) == 3
+    finally:
+        watcher.close()
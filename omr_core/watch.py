@@ -0,0 +1,387 @@
+"""Watch a folder for new OMR sheets and evaluate each one once."""
+import argparse
+import csv
+import json
+import os
+import signal
+import sqlite3
+import tempfile
+import time
+
+from . import evaluation, keys, report, sources, summary
+from .cache import DEFAULT_CACHE_DIR, FillCache
+
+CHECKPOINT_FILENAME = ".omr_checkpoint.sqlite3"
+RESULTS_FILENAME = "OMR_Scores.csv"
+SUMMARY_FILENAME = "OMR_Summary.json"
+
+POLL_INTERVAL = 5.0  # seconds between two scans of an idle folder
+SETTLE_SECONDS = 2.0  # files modified more recently than this may still be copying
+MAX_BATCH = 500  # sheets per evaluation round; whole files are never split
+COMMIT_EVERY = 50  # results per checkpoint transaction
+
+DONE = 'done'
+FAILED = 'failed'
+REJECTED = 'rejected'  # failed the pre-flight checks; the row holds the reasons
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS sheets (
+        name TEXT PRIMARY KEY,
+        file TEXT NOT NULL,
+        status TEXT NOT NULL,
+        row TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS files (
+        name TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    )""",
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+class Checkpoint:
+    """
+    Completion records of a watched folder in a local SQLite database.
+
+    ``sheets`` holds one row per evaluated sheet (an image or a PDF page) with its
+    result row, ``files`` the size and modification time of every file whose sheets
+    are all recorded, so unchanged files are skipped without being opened.
+
+    Args:
+        path (str): Database file.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        for statement in _SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def get_meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+        self.conn.commit()
+
+    def files(self):
+        """Return filename -> (size, mtime) of completely evaluated files."""
+        return {name: (size, mtime) for name, size, mtime in self.conn.execute("SELECT name, size, mtime FROM files")}
+
+    def sheet_names(self, filename):
+        """Names of the sheets already recorded for a file."""
+        return {row[0] for row in self.conn.execute("SELECT name FROM sheets WHERE file = ?", (filename,))}
+
+    def forget_file(self, filename):
+        """Drop the records of a file that changed since it was evaluated."""
+        self.conn.execute("DELETE FROM sheets WHERE file = ?", (filename,))
+        self.conn.execute("DELETE FROM files WHERE name = ?", (filename,))
+
+    def record_sheet(self, name, filename, status, row=None):
+        self.conn.execute("INSERT OR REPLACE INTO sheets (name, file, status, row) VALUES (?, ?, ?, ?)",
+                          (name, filename, status, json.dumps(row) if row is not None else None))
+
+    def record_file(self, filename, size, mtime):
+        self.conn.execute("INSERT OR REPLACE INTO files (name, size, mtime) VALUES (?, ?, ?)",
+                          (filename, size, mtime))
+
+    def commit(self):
+        self.conn.commit()
+
+    def rows(self):
+        """Yield the result rows of evaluated sheets in completion order."""
+        for (text,) in self.conn.execute("SELECT row FROM sheets WHERE status = ? ORDER BY rowid", (DONE,)):
+            # JSON object keys are strings; question numbers become ints again
+            yield {int(k) if k.isdigit() else k: v for k, v in json.loads(text).items()}
+
+    def count(self, status):
+        return self.conn.execute("SELECT COUNT(*) FROM sheets WHERE status = ?", (status,)).fetchone()[0]
+
+    def reset(self):
+        self.conn.execute("DELETE FROM sheets")
+        self.conn.execute("DELETE FROM files")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def _write_json(path, data):
+    folder = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+class FolderWatcher:
+    """
+    Evaluate the sheets of a folder incrementally, resuming from its checkpoint.
+
+    The results CSV is rebuilt from the checkpoint once at start-up (so sheets whose
+    results were committed right before a crash are neither lost nor duplicated) and
+    then only appended to. The summary is written after every evaluation round and
+    the report plots whenever the folder has been caught up with.
+
+    Args:
+        folder (str): Folder receiving sheet images and PDFs.
+        answer_key_path (str): Answer key file (.pdf, .xlsx, .xls, .csv).
+        workers (int, optional): Worker processes per evaluation round (None = all cores).
+        cache_dir (str, optional): Fill cache folder, None disables the caches.
+        output_dir (str, optional): Folder for the report plots; defaults to ``<folder>/report``.
+        scoring_rules (dict, optional): weights / negative / multi_mark for scoring.
+        settle_seconds (float): Minimum age of a file's last modification before it is read.
+    """
+
+    def __init__(self, folder, answer_key_path, workers=1, cache_dir=DEFAULT_CACHE_DIR, output_dir=None,
+                 scoring_rules=None, settle_seconds=SETTLE_SECONDS):
+        self.folder = folder
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.output_dir = output_dir or os.path.join(folder, 'report')
+        self.scoring_rules = scoring_rules
+        self.settle_seconds = settle_seconds
+        self.results_csv = os.path.join(folder, RESULTS_FILENAME)
+        self.summary_path = os.path.join(folder, SUMMARY_FILENAME)
+        self.cache = FillCache(cache_dir) if cache_dir else None
+        self.stopped = False
+        self._report_due = False
+
+        compiled_key, _ = keys.load_key(answer_key_path, os.path.join(cache_dir, 'keys') if cache_dir else None)
+        for warning in compiled_key.warnings:
+            print(f"⚠️ {warning}")
+        self.answer_key = compiled_key.to_dict()
+        self.num_questions = compiled_key.num_questions
+
+        self.checkpoint = Checkpoint(os.path.join(folder, CHECKPOINT_FILENAME))
+        # Results are only valid for the key and rules they were scored with
+        scoring_id = json.dumps({'key': compiled_key.digest, 'rules': scoring_rules or {}}, sort_keys=True)
+        if self.checkpoint.get_meta('scoring') != scoring_id:
+            if any(self.checkpoint.count(status) for status in (DONE, FAILED, REJECTED)):
+                print("🔁 Answer key or scoring rules changed: re-scoring every sheet (fills come from the cache).")
+            self.checkpoint.reset()
+            self.checkpoint.set_meta('scoring', scoring_id)
+
+        self._csv_file = None
+        self._rebuild()
+        if self.accumulator.count:
+            print(f"🔁 Resuming with {self.accumulator.count} evaluated sheets from the checkpoint.")
+
+    def _rebuild(self):
+        """Rewrite the results CSV and the running summary from the checkpoint."""
+        if self._csv_file is not None:
+            self._csv_file.close()
+        self.accumulator = summary.SummaryAccumulator(self.answer_key, self.num_questions)
+        self.scores = []
+        fieldnames = evaluation.results_fieldnames(self.num_questions)
+        partial_csv = self.results_csv + ".part"
+        with open(partial_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in self.checkpoint.rows():
+                writer.writerow(row)
+                self._add(row)
+        os.replace(partial_csv, self.results_csv)
+        self._csv_file = open(self.results_csv, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._csv_file, fieldnames=fieldnames)
+
+    def _add(self, row):
+        self.accumulator.update(row)
+        if len(self.scores) < report.MAX_BAR_STUDENTS:
+            self.scores.append((row['Student_ID'], row['Total_Score']))
+
+    def scan(self):
+        """
+        Find files with sheets that have not been evaluated yet.
+
+        Returns:
+            tuple: (list of (filename, size, mtime, sources) for settled new or changed
+            files, in filename order; number of files still being written)
+        """
+        done_files = self.checkpoint.files()
+        new, unsettled = [], 0
+        now = time.time()
+        for entry in sorted(os.scandir(self.folder), key=lambda e: e.name):
+            ext = os.path.splitext(entry.name)[1].lower()
+            if not entry.is_file() or ext not in sources.IMAGE_EXTENSIONS + sources.PDF_EXTENSIONS:
+                continue
+            stat = entry.stat()
+            version = (stat.st_size, stat.st_mtime)
+            if done_files.get(entry.name) == version:
+                continue
+            if now - stat.st_mtime < self.settle_seconds:
+                unsettled += 1
+                continue
+            if entry.name in done_files:
+                # Replaced since it was evaluated: its old results are dropped
+                self.checkpoint.forget_file(entry.name)
+                self.checkpoint.commit()
+                self._rebuild()
+
+            if ext in sources.PDF_EXTENSIONS:
+                try:
+                    file_sources = [(entry.path, i) for i in range(sources.pdf_page_count(entry.path))]
+                except Exception as e:
+                    print(f"❌ Could not open PDF {entry.name}: {e}")
+                    continue
+            else:
+                file_sources = [entry.path]
+            # Pages recorded before an interruption are not evaluated again
+            recorded = self.checkpoint.sheet_names(entry.name)
+            file_sources = [s for s in file_sources if sources.source_name(s) not in recorded]
+            new.append((entry.name, stat.st_size, stat.st_mtime, file_sources))
+        return new, unsettled
+
+    def process(self, files):
+        """Evaluate the sheets of ``files`` (from scan()) and record every result."""
+        batch = [source for _, _, _, file_sources in files for source in file_sources]
+        file_of = {sources.source_name(source): filename
+                   for filename, _, _, file_sources in files for source in file_sources}
+        print(f"▶️ Evaluating {len(batch)} new sheets...")
+
+        finished, stats = set(), {}
+        for entry in evaluation.iter_evaluate(batch, self.num_questions, self.answer_key, workers=self.workers,
+                                              cache=self.cache, stats=stats, scoring_rules=self.scoring_rules):
+            name = entry['Student_ID']
+            # After a crash, CSV rows appended since the last commit are dropped by
+            # _rebuild() and their sheets evaluated again, so none is lost or doubled
+            self.checkpoint.record_sheet(name, file_of[name], DONE, entry)
+            finished.add(name)
+            if len(finished) % COMMIT_EVERY == 0:
+                self.checkpoint.commit()
+                self._csv_file.flush()
+            self._writer.writerow(entry)
+            self._add(entry)
+
+        rejected = dict(stats['rejected'])
+        for name, reasons in rejected.items():
+            self.checkpoint.record_sheet(name, file_of[name], REJECTED,
+                                         {'Student_ID': name, 'Reasons': "; ".join(reasons)})
+        failed = [name for name in file_of if name not in finished and name not in rejected]
+        for name in failed:
+            # Unreadable sheets are not retried until their file changes
+            self.checkpoint.record_sheet(name, file_of[name], FAILED)
+        for filename, size, mtime, _ in files:
+            self.checkpoint.record_file(filename, size, mtime)
+        self.checkpoint.commit()
+        self._csv_file.flush()
+
+        print(f"✅ {len(finished)} sheets evaluated"
+              f"{f', {len(rejected)} rejected by the pre-flight checks' if rejected else ''}"
+              f"{f', {len(failed)} could not be read' if failed else ''}; "
+              f"{self.accumulator.count} in total.")
+        checks = evaluation.preflight_summary(stats)
+        if checks and checks['saved_seconds']:
+            print(f"   Pre-flight checks: {checks['preflight_seconds']:.2f}s spent, "
+                  f"~{checks['saved_seconds']:.2f}s of full processing skipped.")
+        self.write_summary()
+        self._report_due = True
+
+    def write_summary(self):
+        """Write the running summary as JSON next to the results."""
+        data = self.accumulator.result()
+        if not data:
+            return
+        _write_json(self.summary_path, {
+            'total_students': data['total_students'],
+            'failed_sheets': self.checkpoint.count(FAILED),
+            'rejected_sheets': self.checkpoint.count(REJECTED),
+            'average_score': data['average_score'],
+            'std_score': data['std_score'],
+            'max_score': data['max_score'],
+            'min_score': data['min_score'],
+            'top_students': data['top_students'],
+            'top_students_count': data['top_students_count'],
+            'top_k': data['top_k'],
+            'histogram': {str(score): count for score, count in data['histogram'].items()},
+            'question_correct_rate': data['question_correct_rate'].tolist(),
+            'updated': time.time(),
+        })
+
+    def write_report(self):
+        """Render the report plots for everything evaluated so far."""
+        data = self.accumulator.result()
+        if not data:
+            return
+        scores_df = None
+        if data['total_students'] <= report.MAX_BAR_STUDENTS:
+            import pandas as pd
+
+            scores_df = pd.DataFrame(self.scores, columns=['Student_ID', 'Total_Score'])
+        os.makedirs(self.output_dir, exist_ok=True)
+        report.generate_report(scores_df, data, self.output_dir, set_name="OMR Results",
+                               results_csv=self.results_csv, workers=self.workers,
+                               cache_dir=os.path.join(self.cache_dir, 'plots') if self.cache_dir else None)
+        summary.print_summary(data)
+
+    def run(self, once=False, interval=POLL_INTERVAL):
+        """
+        Evaluate new sheets until stop() is called.
+
+        Args:
+            once (bool): Return once every file in the folder has been evaluated.
+            interval (float): Seconds between scans while the folder is idle.
+        """
+        print(f"👀 Watching {self.folder}")
+        while not self.stopped:
+            files, unsettled = self.scan()
+            if files:
+                # Whole files per round, at least one even when it alone exceeds MAX_BATCH
+                batch, size = [], 0
+                for item in files:
+                    if batch and size + len(item[3]) > MAX_BATCH:
+                        break
+                    batch.append(item)
+                    size += len(item[3])
+                self.process(batch)
+                continue
+            if self._report_due:
+                self.write_report()
+                self._report_due = False
+            if once and not unsettled:
+                break
+            time.sleep(min(interval, self.settle_seconds) if unsettled else interval)
+
+    def stop(self):
+        """Ask run() to return after the current round."""
+        self.stopped = True
+
+    def close(self):
+        self.checkpoint.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Folder receiving OMR sheet images and PDFs")
+    parser.add_argument("answer_key", help="Answer key file (.pdf, .xlsx, .xls, .csv)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 = all cores)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between folder scans")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="Seconds a file must be unchanged before it is read")
+    parser.add_argument("--output-dir", help="Folder for the report plots (default: <folder>/report)")
+    parser.add_argument("--once", action="store_true", help="Exit once the folder has been caught up with")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the fill and compiled key caches")
+    args = parser.parse_args(argv)
+
+    watcher = FolderWatcher(args.folder, args.answer_key, workers=args.workers or None,
+                            cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR,
+                            output_dir=args.output_dir, settle_seconds=args.settle)
+    # Finish the current round on SIGTERM like on Ctrl+C; the checkpoint covers the rest
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    try:
+        watcher.run(once=args.once, interval=args.interval)
+    except KeyboardInterrupt:
+        print("⏹️ Stopped; the next run resumes from the checkpoint.")
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())